@@ -0,0 +1,152 @@
+# Admission control under a burst, against a local fake LLM with a fixed upstream capacity.
+#
+# Usage (from backend/):  python -m benchmarks.bench_admission --burst 200 --capacity 20 --latency 0.2
+#
+# The fake upstream fails with a 429 once more than --capacity calls are in flight, like a
+# provider's concurrency limit. Each scenario fires --burst concurrent /chat requests:
+#   unprotected  admission limits off: every request hits the upstream at once
+#   admitted     LLM_MAX_CONCURRENCY below the upstream capacity, bounded queue with fast 503s
+#   duplicates   the same question from every client: coalesced into one upstream call
+#   one client   a single client bursting past its token bucket (429s)
+# Reported: HTTP status counts, latency of successful requests, peak upstream concurrency,
+# upstream calls and upstream 429s, and the controller's queue/rejection counters.
+
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+# Clients are told apart by X-Forwarded-For, as behind a proxy
+os.environ.setdefault("RATE_LIMIT_TRUST_FORWARDED", "true")
+
+import httpx
+
+from benchmarks.common import percentile, temp_workdir
+from benchmarks.fakes import FakeChatModel, HashEmbeddings
+from services.admission import admission
+from services.registry import registry
+
+
+class Upstream:
+    """Shared state of the fake provider."""
+
+    capacity = 20
+    in_flight = 0
+    peak = 0
+    calls = 0
+    throttled = 0
+
+    @classmethod
+    def reset(cls, capacity):
+        cls.capacity, cls.in_flight, cls.peak, cls.calls, cls.throttled = capacity, 0, 0, 0, 0
+
+
+class CappedChatModel(FakeChatModel):
+    """FakeChatModel that answers 429 beyond Upstream.capacity concurrent calls."""
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        Upstream.calls += 1
+        Upstream.in_flight += 1
+        Upstream.peak = max(Upstream.peak, Upstream.in_flight)
+        try:
+            if Upstream.in_flight > Upstream.capacity:
+                Upstream.throttled += 1
+                await asyncio.sleep(0.01)
+                raise RuntimeError("Fake upstream rate limit exceeded (429)")
+            return await super()._agenerate(messages, stop, run_manager, **kwargs)
+        finally:
+            Upstream.in_flight -= 1
+
+
+def configure(limited: bool, args):
+    """Rebuilds the controller's limits; semaphores are recreated on the next call."""
+    admission.max_concurrency = args.max_concurrency if limited else 1_000_000
+    admission.model_concurrency = {}
+    admission.max_queue = args.max_queue if limited else 1_000_000
+    admission.queue_timeout_seconds = args.queue_timeout
+    admission.coalesce = limited
+    admission.rate_per_minute = args.rate if limited else 0
+    admission.burst = args.rate_burst
+    admission._buckets.clear()
+    admission._loop = None
+    admission.max_waiting = 0
+    for name in admission.counters:
+        admission.counters[name] = 0
+
+
+async def burst(client, count, question, clients):
+    statuses, latencies = Counter(), []
+
+    async def one(i):
+        t0 = time.perf_counter()
+        response = await client.post(
+            "/chat",
+            json={"question": question(i), "history": []},
+            headers={"X-Forwarded-For": f"10.0.{(i % clients) // 250}.{(i % clients) % 250}"},
+        )
+        statuses[response.status_code] += 1
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return statuses, latencies, time.perf_counter() - t0
+
+
+async def run(args):
+    from main import app
+
+    registry.llm_factory = lambda model_name: CappedChatModel(latency=args.latency)
+    registry.embeddings_factory = HashEmbeddings
+    registry.start()
+    scenarios = [
+        # Distinct questions per scenario keep the response cache out of the measurement
+        ("unprotected", False, lambda i: f"What are Olajide's Python skills? (u{i})", args.clients),
+        ("admitted", True, lambda i: f"What are Olajide's Python skills? (a{i})", args.clients),
+        ("duplicates", True, lambda i: "Which projects use FastAPI?", args.clients),
+        ("one client", True, lambda i: f"Tell me about RAG ({i})", 1),
+    ]
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            print(f"burst={args.burst} upstream capacity={args.capacity} latency={args.latency * 1000:.0f}ms "
+                  f"LLM_MAX_CONCURRENCY={args.max_concurrency} LLM_MAX_QUEUE={args.max_queue}")
+            for name, limited, question, clients in scenarios:
+                configure(limited, args)
+                Upstream.reset(args.capacity)
+                statuses, latencies, elapsed = await burst(client, args.burst, question, clients)
+                stats = admission.stats()
+                ok = (f"p50={percentile(latencies, 50) * 1000:7.1f}ms p99={percentile(latencies, 99) * 1000:7.1f}ms"
+                      if latencies else "no successes")
+                print(
+                    f"  {name:<12} {elapsed:6.2f}s statuses={dict(sorted(statuses.items()))} {ok} "
+                    f"upstream: peak={Upstream.peak} calls={Upstream.calls} 429s={Upstream.throttled} | "
+                    f"max waiting={stats['max_waiting']} rejected={stats['rejected_queue_full']}+"
+                    f"{stats['rejected_timeout']} rate limited={stats['rate_limited']} "
+                    f"coalesced={stats['coalesced']}"
+                )
+    finally:
+        await registry.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--burst", type=int, default=200, help="concurrent requests per scenario")
+    parser.add_argument("--clients", type=int, default=100, help="distinct client IPs in the burst")
+    parser.add_argument("--capacity", type=int, default=20, help="upstream concurrent-call limit")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--queue-timeout", type=float, default=10.0)
+    parser.add_argument("--rate", type=float, default=60, help="RATE_LIMIT_PER_MINUTE")
+    parser.add_argument("--rate-burst", type=int, default=20, help="RATE_LIMIT_BURST")
+    args = parser.parse_args()
+
+    with temp_workdir():
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Concurrency load test for the async routers, driven by a local fake LLM.
+#
+# Usage (from backend/):  python -m benchmarks.bench_concurrency --latency 0.2 --levels 1 4 16
+#
+# Each fake LLM call sleeps for --latency seconds. With a fully async path,
+# throughput should grow roughly linearly with the number of concurrent clients
+# until CPU work (retrieval, DOCX rendering) saturates; a blocking path stays flat.
+
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+# All load comes from one client; per-client rate limits would throttle the benchmark itself
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+# Every client sends the same payload: coalescing would measure one call instead of the async path
+os.environ.setdefault("LLM_COALESCE", "false")
+
+import httpx
+
+from benchmarks.common import percentile, temp_workdir
+from benchmarks.fakes import HashEmbeddings, fake_llm_factory
+from services.registry import registry
+
+ENDPOINTS = {
+    "/chat": {"question": "What are Olajide's Python skills?", "history": []},
+    "/generate-cv": {"job_description": "Senior Python Backend Engineer, FastAPI, RAG, LLMs"},
+}
+
+
+async def run_level(client, path, payload, concurrency, requests_per_client):
+    latencies = []
+
+    async def worker():
+        for _ in range(requests_per_client):
+            t0 = time.perf_counter()
+            response = await client.post(path, json=payload)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return len(latencies) / elapsed, latencies
+
+
+async def run(args):
+    from main import app
+
+    registry.llm_factory = fake_llm_factory(latency=args.latency)
+    registry.embeddings_factory = HashEmbeddings
+    registry.start()
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for path in args.endpoints:
+                print(f"\n{path} (fake LLM latency {args.latency * 1000:.0f}ms)")
+                baseline = None
+                for level in args.levels:
+                    rps, latencies = await run_level(client, path, ENDPOINTS[path], level, args.requests)
+                    baseline = baseline or rps
+                    print(
+                        f"  clients={level:<4} throughput={rps:7.2f} req/s "
+                        f"scaling={rps / baseline:5.2f}x p50={percentile(latencies, 50) * 1000:7.1f}ms "
+                        f"p95={percentile(latencies, 95) * 1000:7.1f}ms"
+                    )
+    finally:
+        await registry.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=5, help="requests per client")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS))
+    args = parser.parse_args()
+
+    with temp_workdir():
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
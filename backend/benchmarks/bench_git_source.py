@@ -0,0 +1,119 @@
+# Incremental git ingestion against a local bare repository fixture, with fake embeddings.
+#
+# Usage (from backend/):  python -m benchmarks.bench_git_source --files 500
+#
+# Runs ingest.py four times against the same repository: the first run clones
+# the mirror and reads everything, the second finds no new commits, the third
+# follows a commit that edits one file and deletes another, and the fourth a
+# commit that only touches a filtered file (the index stays as it is, but the
+# manifest must record the new commit). The fixture also holds vendored,
+# minified, oversized and notebook files to exercise the filters.
+
+import argparse
+import json
+import os
+import subprocess
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import ingest
+from benchmarks.common import temp_workdir
+from benchmarks.corpus import synthetic_chunks
+from benchmarks.fakes import HashEmbeddings
+from services.sources import GitHubSource
+
+NOTEBOOK = {
+    "metadata": {"kernelspec": {"language": "python"}},
+    "cells": [
+        {"cell_type": "markdown", "source": ["# Loan prediction\n", "Model training notebook."]},
+        {"cell_type": "code", "source": ["model.fit(X, y)"],
+         "outputs": [{"output_type": "stream", "text": ["epoch 1 loss 0.42\n"] * 2000}]},
+    ],
+}
+# Must never reach the index: vendored, minified (by name and by content) and oversized
+FILTERED = ("node_modules/lib/index.js", "static/app.min.js", "static/bundle.js", "docs/huge.md")
+
+
+def git(*args, cwd):
+    subprocess.run(["git", "-c", "user.name=bench", "-c", "user.email=bench@example.com", *args],
+                   cwd=cwd, check=True, capture_output=True)
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def make_fixture(root, files):
+    """A bare repository at root/origin.git, pushed from a working copy at root/work."""
+    work, bare = os.path.join(root, "work"), os.path.join(root, "origin.git")
+    git("init", "--bare", "--initial-branch=main", bare, cwd=root)
+    git("init", "--initial-branch=main", work, cwd=root)
+    chunks = synthetic_chunks(files * 3)
+    for i in range(files):
+        write(os.path.join(work, "docs", f"note-{i:05d}.md"), "\n\n".join(next(chunks).page_content for _ in range(3)))
+    write(os.path.join(work, "notebooks", "train.ipynb"), json.dumps(NOTEBOOK))
+    write(os.path.join(work, "node_modules", "lib", "index.js"), "module.exports = {};\n" * 100)
+    write(os.path.join(work, "static", "app.min.js"), "var a=1;" * 5000)
+    write(os.path.join(work, "static", "bundle.js"), "var a=1;" * 5000)  # minified without the suffix
+    write(os.path.join(work, "docs", "huge.md"), "x" * 500_000)
+    git("add", "-A", cwd=work)
+    git("commit", "-m", "initial", cwd=work)
+    git("push", bare, "main", cwd=work)
+    return work, bare
+
+
+def run(label, source, embeddings):
+    embeddings.calls = 0
+    t0 = time.perf_counter()
+    report = ingest.asyncio.run(ingest.build([source]))
+    elapsed = time.perf_counter() - t0
+    changed = sum(1 for entry in (report or {}).values() if entry["status"] != "unchanged")
+    print(f"{label:<22} {elapsed:7.2f}s  sources changed={changed:<5} embedding batches={embeddings.calls}")
+    return report
+
+
+class CountingEmbeddings(HashEmbeddings):
+    calls = 0
+
+    async def aembed_documents(self, texts):
+        self.calls += 1
+        return await super().aembed_documents(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=500)
+    args = parser.parse_args()
+
+    with temp_workdir(copy_db=False) as workdir:
+        work, bare = make_fixture(workdir, args.files)
+        url = f"file://{bare}"
+        embeddings = CountingEmbeddings()
+        ingest.get_embeddings = lambda: embeddings
+
+        report = run("first run (clone)", GitHubSource(url), embeddings)
+        skipped = [label for label in report if label.endswith(FILTERED)]
+        print(f"  files indexed: {len(report)}, filtered files indexed: {skipped or 'none'}")
+
+        run("no new commits", GitHubSource(url), embeddings)
+
+        write(os.path.join(work, "docs", "note-00000.md"), "Edited: Olajide shipped a FastAPI RAG backend.")
+        os.remove(os.path.join(work, "docs", "note-00001.md"))
+        git("commit", "-am", "edit one, delete one", cwd=work)
+        git("push", bare, "main", cwd=work)
+        run("one edit, one delete", GitHubSource(url), embeddings)
+
+        write(os.path.join(work, "static", "app.min.js"), "var b=2;" * 5000)
+        git("commit", "-am", "touch a filtered file", cwd=work)
+        git("push", bare, "main", cwd=work)
+        source = GitHubSource(url)
+        run("unindexed change", source, embeddings)
+        recorded = ingest.load_manifest(ingest.read_generation()["persist_directory"])["source_state"]
+        print(f"  manifest records the new commit: {recorded[source.name] == source.state}")
+
+
+if __name__ == "__main__":
+    main()
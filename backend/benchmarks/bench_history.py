@@ -0,0 +1,97 @@
+# Prompt history tokens per turn for a long recruiter session, with and without compaction.
+#
+# Usage (from backend/):  python -m benchmarks.bench_history --turns 40
+#
+# Runs HistoryManager directly against the fake LLM (no network). "raw" is the
+# old behaviour of sending every message; "compacted" is summary + window.
+# Then a frontend-style session (greeting first, question appended to the history)
+# counts the query-rewrite LLM calls made before retrieval, and the time they add.
+
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from benchmarks.fakes import fake_llm_factory
+from models.schemas import ChatRequest, Message
+from services import history_service
+from services.history_service import HistoryManager, message_tokens
+from services.registry import registry
+
+SUMMARY = (
+    "The recruiter is hiring an AI Engineer for a fintech team and asked about RAG projects, "
+    "FastAPI backends, evaluation practice and availability. The assistant covered Nelfund "
+    "Navigator, xplainify-ai and Fiscal Sentinel with sources."
+)
+ANSWER = (
+    "According to the 'Nelfund Navigator' README, Olajide built a retrieval-augmented assistant with "
+    "FastAPI, LangChain and ChromaDB, including ingestion, hybrid retrieval and an evaluation harness. "
+) * 4
+
+
+GREETING = Message(role="assistant", content="Hi! I'm Olajide's AI assistant. Ask me about his work.")
+SESSION = [
+    "What are Olajide's strongest technical skills?",
+    "Which projects use FastAPI?",
+    "How did that project handle evaluation?",
+    "And Django?",
+    "What is the tech stack of Fiscal Sentinel?",
+    "Tell me more about the second one.",
+    "Has Olajide deployed anything to production?",
+    "What certifications does Olajide hold?",
+]
+
+
+def question(turn: int) -> str:
+    return f"Follow-up {turn}: how did that project handle evaluation, latency and deployment in production?"
+
+
+async def run(args):
+    registry.llm_factory = fake_llm_factory(latency=0.0, response=SUMMARY)
+    manager = HistoryManager(token_budget=args.budget)
+    history = []
+
+    print(f"{'turn':>5} {'raw tokens':>11} {'compacted':>10} {'summarized':>11}")
+    for turn in range(1, args.turns + 1):
+        request = ChatRequest(question=question(turn), history=history, conversation_id="bench")
+        compacted, stats = await manager.compact(request.history, request.conversation_id)
+        raw = sum(message_tokens(msg) for msg in history)
+        if turn % args.every == 0 or turn == 1:
+            print(f"{turn:>5} {raw:>11} {stats['tokens_after']:>10} {stats['summarized']:>11}")
+        history = history + [Message(role="user", content=request.question), Message(role="assistant", content=ANSWER)]
+
+    counters = manager.stats()
+    print(f"\nsummary calls: {counters['summaries_built']} over {args.turns} turns, "
+          f"reused: {counters['summaries_reused']}")
+
+    registry.llm_factory = fake_llm_factory(latency=args.rewrite_latency, response=SESSION[0])
+    registry._llms = {}
+    manager = HistoryManager(token_budget=args.budget)
+    history, waited = [GREETING], 0.0
+    for text in SESSION:
+        history = history + [Message(role="user", content=text)]
+        t0 = time.perf_counter()
+        await manager.rewrite_query(text, history)
+        waited += time.perf_counter() - t0
+        history = history + [Message(role="assistant", content=ANSWER)]
+    counters = manager.stats()
+    print(f"rewrite calls: {counters['rewrites'] + counters['rewrite_timeouts']} of {len(SESSION)} questions "
+          f"(skipped {counters['rewrites_skipped']}, timed out {counters['rewrite_timeouts']} "
+          f"at {history_service.HISTORY_REWRITE_TIMEOUT_SECONDS}s), "
+          f"{waited * 1000:.0f}ms added before retrieval")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--budget", type=int, default=1200, help="history token budget")
+    parser.add_argument("--every", type=int, default=5, help="print every N turns")
+    parser.add_argument("--rewrite-latency", type=float, default=0.5, help="fake LLM latency of a rewrite")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
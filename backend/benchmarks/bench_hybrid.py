@@ -0,0 +1,94 @@
+# Recall@k and latency of vector-only vs hybrid (BM25 + vector, RRF) retrieval.
+#
+# Usage (from backend/):  python -m benchmarks.bench_hybrid --k 6
+#                         python -m benchmarks.bench_hybrid --embeddings openai   (needs OPENAI_API_KEY)
+#
+# Runs over the chunks in ./chroma_db. A chunk counts as relevant to a query when it
+# contains the query's key term, which is exactly the exact-term case BM25 targets.
+# With the default hashed fake embeddings the vector side is effectively random, so
+# use --embeddings openai for a realistic vector baseline.
+
+import argparse
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_chroma import Chroma
+
+from benchmarks.common import percentile, temp_workdir
+from benchmarks.fakes import HashEmbeddings
+from core.config import EMBEDDING_MODEL, PERSIST_DIRECTORY
+from services.lexical_index import BM25Index, HybridRetriever
+
+# (query, key term a relevant chunk must contain)
+QUERIES = [
+    ("Tell me about Fiscal Sentinel", "fiscal sentinel"),
+    ("What is xplainify-ai?", "xplainify"),
+    ("Nelfund Navigator project", "nelfund"),
+    ("Has he used LangGraph?", "langgraph"),
+    ("USSD marketplace simulation", "ussd"),
+    ("Experience with Streamlit", "streamlit"),
+    ("Loan Repayment Prediction model", "loan repayment"),
+    ("TIIDELab internship", "tiidelab"),
+    ("FastAPI backends", "fastapi"),
+    ("Which projects use MySQL?", "mysql"),
+]
+
+
+def recall_at_k(docs, term, relevant_total, k):
+    hits = sum(1 for doc in docs if term in doc.page_content.lower())
+    return hits / min(relevant_total, k) if relevant_total else None
+
+
+def evaluate(label, retriever, corpus, k, repeats):
+    recalls, latencies = [], []
+    for query, term in QUERIES:
+        relevant_total = sum(1 for text in corpus if term in text.lower())
+        docs = None
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            docs = retriever.invoke(query)
+            latencies.append(time.perf_counter() - t0)
+        recall = recall_at_k(docs, term, relevant_total, k)
+        if recall is not None:
+            recalls.append(recall)
+    print(
+        f"{label:<12} recall@{k}={sum(recalls) / len(recalls):.3f} "
+        f"p50={percentile(latencies, 50) * 1000:.2f}ms p95={percentile(latencies, 95) * 1000:.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--fetch-k", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--embeddings", choices=["hash", "openai"], default="hash")
+    args = parser.parse_args()
+
+    if args.embeddings == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+    else:
+        embeddings = HashEmbeddings()
+
+    with temp_workdir():
+        vectorstore = Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=embeddings)
+        t0 = time.perf_counter()
+        lexical_index = BM25Index.from_chroma(vectorstore)
+        print(f"BM25 index over {len(lexical_index)} chunks built in {(time.perf_counter() - t0) * 1000:.1f}ms")
+        corpus = lexical_index.contents
+
+        vector_only = HybridRetriever(vectorstore=vectorstore, k=args.k, fetch_k=args.k, lexical_weight=0)
+        hybrid = HybridRetriever(vectorstore=vectorstore, lexical_index=lexical_index, k=args.k, fetch_k=args.fetch_k)
+        lexical_only = HybridRetriever(
+            vectorstore=vectorstore, lexical_index=lexical_index, k=args.k, fetch_k=args.fetch_k, vector_weight=0
+        )
+        evaluate("vector", vector_only, corpus, args.k, args.repeats)
+        evaluate("bm25", lexical_only, corpus, args.k, args.repeats)
+        evaluate("hybrid", hybrid, corpus, args.k, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# End-to-end ingest.py throughput over a synthetic directory of text files, with fake embeddings.
+#
+# Usage (from backend/):  python -m benchmarks.bench_ingest --files 200 2000 --latency 0.05
+#
+# "first embed" is when the first embedding batch was sent: with the streaming
+# pipeline it comes well before loading finishes instead of after it.
+
+import argparse
+import os
+import resource
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import ingest
+from benchmarks.common import temp_workdir
+from benchmarks.corpus import synthetic_chunks
+from benchmarks.fakes import HashEmbeddings
+from services.sources import DirectorySource
+
+
+class TimedEmbeddings(HashEmbeddings):
+    first_call = None
+
+    async def aembed_documents(self, texts):
+        if self.first_call is None:
+            self.first_call = time.perf_counter()
+        return await super().aembed_documents(texts)
+
+
+def write_files(directory, count, chunks_per_file):
+    os.makedirs(directory)
+    chunks = synthetic_chunks(count * chunks_per_file)
+    for i in range(count):
+        with open(os.path.join(directory, f"doc-{i:06d}.md"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(next(chunks).page_content for _ in range(chunks_per_file)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, nargs="+", default=[200, 2000])
+    parser.add_argument("--chunks-per-file", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake latency per embedding batch")
+    args = parser.parse_args()
+
+    for count in args.files:
+        with temp_workdir(copy_db=False):
+            write_files("./bench_data", count, args.chunks_per_file)
+            embeddings = TimedEmbeddings(latency=args.latency)
+            ingest.get_embeddings = lambda: embeddings
+
+            t0 = time.perf_counter()
+            ingest.asyncio.run(ingest.build([DirectorySource("./bench_data")], full=True))
+            elapsed = time.perf_counter() - t0
+            chunks = ingest.read_generation()["chunks"]
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            first = (embeddings.first_call - t0) if embeddings.first_call else float("nan")
+            print(
+                f"files={count:<6} chunks={chunks:<7} {chunks / elapsed:8.1f} chunks/s "
+                f"first embed after {first:6.2f}s of {elapsed:6.2f}s  peak RSS {peak:.0f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
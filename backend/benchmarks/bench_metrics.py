@@ -0,0 +1,89 @@
+# Overhead of tracing: cost per span, and /chat latency with metrics on vs off.
+#
+# Usage (from backend/):  python -m benchmarks.bench_metrics --requests 200
+#
+# The fake LLM answers instantly so any instrumentation cost is not hidden
+# behind model latency.
+
+import argparse
+import asyncio
+import itertools
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+# All load comes from one client; per-client rate limits would throttle the benchmark itself
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+
+import httpx
+
+import services.metrics as metrics_module
+from benchmarks.common import summarize, temp_workdir
+from benchmarks.fakes import HashEmbeddings, fake_llm_factory
+from services.metrics import span
+from services.registry import registry
+
+PAYLOAD = {"question": "Tell me about Nelfund Navigator", "history": []}
+_question_ids = itertools.count()
+
+
+def span_cost(iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with span("bench"):
+            pass
+    return (time.perf_counter() - start) / iterations
+
+
+async def chat_latencies(client, requests: int):
+    samples = []
+    for _ in range(requests):
+        # Unique questions so the response cache never answers
+        payload = dict(PAYLOAD, question=f"{PAYLOAD['question']} #{next(_question_ids)}")
+        t0 = time.perf_counter()
+        (await client.post("/chat", json=payload)).raise_for_status()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+async def run(args):
+    from main import app
+
+    registry.llm_factory = fake_llm_factory(latency=0.0)
+    registry.embeddings_factory = HashEmbeddings
+    registry.start()
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            await chat_latencies(client, 5)  # warm-up
+            for enabled in (False, True, False, True):
+                metrics_module.METRICS_ENABLED = enabled
+                results.setdefault(enabled, []).extend(await chat_latencies(client, args.requests // 2))
+    finally:
+        metrics_module.METRICS_ENABLED = True
+        await registry.aclose()
+
+    off = summarize("off", results[False])
+    on = summarize("on", results[True])
+    print(f"overhead per /chat: {(on - off) * 1000:+.3f}ms ({(on - off) / off * 100:+.2f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--spans", type=int, default=200_000)
+    args = parser.parse_args()
+
+    metrics_module.METRICS_ENABLED = True
+    print(f"span cost (metrics on):  {span_cost(args.spans) * 1e6:.2f}us")
+    metrics_module.METRICS_ENABLED = False
+    print(f"span cost (metrics off): {span_cost(args.spans) * 1e6:.2f}us")
+    metrics_module.METRICS_ENABLED = True
+
+    with temp_workdir():
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Per-request retriever/LLM setup cost: rebuild-per-request vs the shared ServiceRegistry.
+#
+# Usage (from backend/):  python -m benchmarks.bench_registry --requests 50
+#
+# Runs against a temporary copy of ./chroma_db with hashed fake embeddings, so no
+# OpenAI calls are made. ChatOpenAI objects are still constructed for real since
+# building their HTTP clients is part of the cost being measured.
+
+import argparse
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_chroma import Chroma
+from langchain_openai import ChatOpenAI
+
+from benchmarks.common import summarize, temp_workdir
+from benchmarks.fakes import HashEmbeddings
+from core.config import PERSIST_DIRECTORY, RETRIEVER_K
+from services.registry import ServiceRegistry
+
+QUESTION = "What are Olajide's Python skills?"
+
+
+def per_request_setup():
+    # Mirrors the original LLMService.get_retriever()/get_llm() bodies
+    embeddings = HashEmbeddings()
+    vectorstore = Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=embeddings)
+    retriever = vectorstore.as_retriever(search_kwargs={"k": RETRIEVER_K})
+    ChatOpenAI(model="gpt-4o-mini", temperature=0.3)
+    return retriever.invoke(QUESTION)
+
+
+def registry_setup(registry):
+    retriever = registry.get_vectorstore().as_retriever(search_kwargs={"k": RETRIEVER_K})
+    registry.get_llm("gpt-4o-mini")
+    return retriever.invoke(QUESTION)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    with temp_workdir():
+        before = []
+        for _ in range(args.requests):
+            t0 = time.perf_counter()
+            per_request_setup()
+            before.append(time.perf_counter() - t0)
+
+        registry = ServiceRegistry(embeddings_factory=HashEmbeddings)
+        t0 = time.perf_counter()
+        registry.start()
+        startup = time.perf_counter() - t0
+
+        after = []
+        for _ in range(args.requests):
+            t0 = time.perf_counter()
+            registry_setup(registry)
+            after.append(time.perf_counter() - t0)
+
+        print(f"{args.requests} requests, registry startup {startup * 1000:.2f}ms (paid once)")
+        mean_before = summarize("before", before)
+        mean_after = summarize("registry", after)
+        print(f"speedup    {mean_before / mean_after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
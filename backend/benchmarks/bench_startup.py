@@ -0,0 +1,140 @@
+# Cold start of the API process: import-time profile and time to first healthcheck.
+#
+# Usage (from backend/):  python -m benchmarks.bench_startup --runs 5 --output benchmark-results/startup.json
+#
+# import profile   `python -X importtime -c "import main"` in a fresh interpreter, summed per
+#                  top-level package (self time) plus the slowest first-party modules (cumulative)
+# serve            a real `uvicorn main:app` process, polled until
+#                    first response   the port is bound and "/" answers (any status)
+#                    routes ready     an API route answers (routers imported)
+#                    ready            "/" answers 200
+# Warm-up is off by default, since it embeds through the OpenAI API; --warmup includes it.
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import httpx
+
+from benchmarks.common import temp_workdir
+
+FIRST_PARTY = ("main", "core", "routers", "services", "models")
+
+
+def import_profile(backend_dir, env):
+    """{module: (self µs, cumulative µs)} from one `-X importtime` run."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=backend_dir, env=env, capture_output=True, text=True, check=True,
+    ).stderr
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def summarize_imports(runs, top):
+    totals = [run["main"][1] / 1000 for run in runs]
+    last = runs[-1]
+    packages = defaultdict(int)
+    for name, (self_us, _) in last.items():
+        packages[name.split(".")[0]] += self_us
+    first_party = sorted(
+        ((name, cumulative) for name, (_, cumulative) in last.items() if name.split(".")[0] in FIRST_PARTY),
+        key=lambda item: -item[1],
+    )
+    return {
+        "import_main_ms": round(statistics.median(totals), 1),
+        "import_main_runs_ms": [round(t, 1) for t in totals],
+        "modules": len(last),
+        "packages_ms": {name: round(us / 1000, 1) for name, us in
+                        sorted(packages.items(), key=lambda item: -item[1])[:top]},
+        "first_party_ms": {name: round(us / 1000, 1) for name, us in first_party[:top]},
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_once(backend_dir, env, timeout):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", backend_dir, "--port", str(port),
+         "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    t0 = time.perf_counter()
+    marks = {}
+    try:
+        with httpx.Client(timeout=5) as client:
+            while len(marks) < 3 and time.perf_counter() - t0 < timeout:
+                try:
+                    health = client.get(f"{base}/")
+                    marks.setdefault("first_response_s", time.perf_counter() - t0)
+                    if "routes_ready_s" not in marks and client.get(f"{base}/suggested-questions").status_code == 200:
+                        marks["routes_ready_s"] = time.perf_counter() - t0
+                    if health.status_code == 200:
+                        marks.setdefault("ready_s", time.perf_counter() - t0)
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+    finally:
+        process.terminate()
+        process.wait()
+    return marks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--warmup", action="store_true", help="keep the startup warm-up on (needs the API)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    backend_dir = os.getcwd()
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-benchmark"),
+           "WARMUP_ENABLED": "true" if args.warmup else "false"}
+
+    # The first run pays for cold .pyc / page cache; the median covers it
+    runs = [import_profile(backend_dir, env) for _ in range(args.runs)]
+    result = summarize_imports(runs, args.top)
+    print(f"import main: median {result['import_main_ms']:.0f}ms over {args.runs} runs "
+          f"({result['modules']} modules)")
+    print("  by package (self time):  " + "  ".join(f"{k}={v:.0f}ms" for k, v in result["packages_ms"].items()))
+    print("  first party (cumulative): " + "  ".join(f"{k}={v:.0f}ms" for k, v in result["first_party_ms"].items()))
+
+    serves = []
+    with temp_workdir():
+        for _ in range(args.runs):
+            serves.append(serve_once(backend_dir, env, args.timeout))
+    for mark in ("first_response_s", "routes_ready_s", "ready_s"):
+        values = [serve[mark] for serve in serves if mark in serve]
+        result[mark] = round(statistics.median(values), 3) if values else None
+        shown = f"{result[mark] * 1000:.0f}ms" if values else "not reached"
+        print(f"serve: {mark[:-2].replace('_', ' '):<15} median {shown}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
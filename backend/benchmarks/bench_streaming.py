@@ -0,0 +1,74 @@
+# Time-to-first-token of /chat/stream compared with total latency of /chat.
+#
+# Usage (from backend/):  python -m benchmarks.bench_streaming --latency 0.3 --token-latency 0.02
+#
+# httpx's ASGITransport buffers the response body, so TTFT is taken from the
+# timings the server reports in the final "done" event.
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+# All load comes from one client; per-client rate limits would throttle the benchmark itself
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+# Both endpoints share the response cache; every request gets a fresh question so both measure generation
+
+import httpx
+
+from benchmarks.common import summarize, temp_workdir
+from benchmarks.fakes import HashEmbeddings, fake_llm_factory
+from services.registry import registry
+
+QUESTION = "Tell me about Nelfund Navigator"
+
+
+async def run(args):
+    from main import app
+
+    registry.llm_factory = fake_llm_factory(latency=args.latency, token_latency=args.token_latency)
+    registry.embeddings_factory = HashEmbeddings
+    registry.start()
+    transport = httpx.ASGITransport(app=app)
+    blocking, ttft, streamed_total = [], [], []
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for i in range(args.requests):
+                t0 = time.perf_counter()
+                payload = {"question": f"{QUESTION} (request {i}, blocking)", "history": []}
+                (await client.post("/chat", json=payload)).raise_for_status()
+                blocking.append(time.perf_counter() - t0)
+
+                payload = {"question": f"{QUESTION} (request {i}, streamed)", "history": []}
+                response = await client.post("/chat/stream", json=payload)
+                done = json.loads(response.text.rstrip().rsplit("data: ", 1)[1])
+                ttft.append(done["ttft_ms"] / 1000)
+                streamed_total.append(done["total_ms"] / 1000)
+
+            # Repeating a streamed question is answered from the cache it filled
+            response = await client.post("/chat/stream", json=payload)
+            cached = json.loads(response.text.rstrip().rsplit("data: ", 1)[1])
+    finally:
+        await registry.aclose()
+
+    summarize("/chat", blocking)
+    summarize("ttft", ttft)
+    summarize("stream", streamed_total)
+    print(f"repeated streamed question: cached={cached.get('cached', False)} total={cached['total_ms']:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.3, help="fake LLM latency before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--requests", type=int, default=10)
+    args = parser.parse_args()
+
+    with temp_workdir():
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Lazy per-tenant index loading with LRU eviction: cold/warm retrieval latency and memory
+# as the number of tenants grows past the loaded limit.
+#
+# Usage (from backend/):  python -m benchmarks.bench_tenants --tenants 200 --max-loaded 16 200
+#                         (VECTOR_STORE=numpy for the NumPy backend)
+#
+# Each tenant gets a small synthetic index. Requests pick tenants with a Zipf-like
+# skew (a few busy personas, a long tail of idle ones), as a shared deployment would see.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from benchmarks.common import percentile, temp_workdir
+from benchmarks.corpus import QUERIES, synthetic_chunks
+from benchmarks.fakes import HashEmbeddings
+from benchmarks.suite import memory_mb
+from core.index_state import write_generation
+from core.tenants import tenant_paths
+from services.lexical_index import BM25Index
+from services.llm_service import LLMService
+from services.registry import registry
+from services.vector_store import close_vectorstore, open_vectorstore, persist_vectorstore
+
+
+def make_tenants(count, chunks, dim):
+    embeddings = HashEmbeddings(size=dim)
+    tenants = []
+    for i in range(count):
+        tenant = f"tenant-{i:05d}"
+        paths = tenant_paths(tenant)
+        target = os.path.join(paths.index_root, "gen-0001")
+        os.makedirs(target)
+        with open(paths.persona_file, "w", encoding="utf-8") as f:
+            json.dump({"name": f"Persona {i}"}, f)
+        docs = list(synthetic_chunks(chunks, seed=i))
+        vectorstore = open_vectorstore(target, embeddings)
+        vectorstore.add_documents(docs, ids=[d.id for d in docs])
+        persist_vectorstore(vectorstore)
+        close_vectorstore(vectorstore)
+        BM25Index.from_documents(docs).save(target)
+        write_generation(target, paths.generation_file, chunks=chunks)
+        tenants.append(tenant)
+    return tenants
+
+
+async def heartbeat(stalls, interval=0.001):
+    """Records how late each tick wakes up: time the event loop spent blocked."""
+    while True:
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - t0 - interval)
+
+
+async def run(tenants, max_loaded, requests, seed):
+    registry.max_loaded = max_loaded
+    registry.close_grace_seconds = 0
+    registry.counters = dict.fromkeys(registry.counters, 0)
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(tenants))]
+    cold, warm, stalls = [], [], []
+    ticker = asyncio.create_task(heartbeat(stalls))
+    try:
+        for i in range(requests):
+            tenant = rng.choices(tenants, weights)[0]
+            loads = registry.counters["tenant_loads"]
+            t0 = time.perf_counter()
+            retriever = await LLMService.get_retriever(tenant=tenant)
+            await retriever.ainvoke(QUERIES[i % len(QUERIES)])
+            elapsed = time.perf_counter() - t0
+            (cold if registry.counters["tenant_loads"] > loads else warm).append(elapsed)
+    finally:
+        ticker.cancel()
+
+    stats = registry.tenant_stats()
+    rss, _ = memory_mb()
+    print(
+        f"max_loaded={max_loaded:<5} loaded={stats['loaded']:<5} loads={stats['tenant_loads']:<5} "
+        f"evictions={stats['tenant_evictions']:<5} index~{stats['approx_mb']:7.1f}MB rss={rss:7.1f}MB"
+    )
+    for label, samples in (("cold", cold), ("warm", warm)):
+        if samples:
+            print(
+                f"    {label}: {len(samples):>5} requests  p50={percentile(samples, 50) * 1000:7.2f}ms "
+                f"p99={percentile(samples, 99) * 1000:7.2f}ms"
+            )
+    # Index opens run on the pool, so other requests keep being served meanwhile
+    print(f"    event loop stall: p99={percentile(stalls, 99) * 1000:7.2f}ms max={max(stalls) * 1000:7.2f}ms")
+    await registry.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenants", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=200, help="chunks per tenant")
+    parser.add_argument("--dim", type=int, default=256, help="fake embedding width")
+    parser.add_argument("--max-loaded", type=int, nargs="+", default=[16, 200])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with temp_workdir(copy_db=False):
+        t0 = time.perf_counter()
+        tenants = make_tenants(args.tenants, args.chunks, args.dim)
+        print(f"built {len(tenants)} tenant indexes in {time.perf_counter() - t0:.1f}s")
+        registry.embeddings_factory = lambda: HashEmbeddings(size=args.dim)
+        for max_loaded in args.max_loaded:
+            asyncio.run(run(tenants, max_loaded, args.requests, args.seed))
+
+
+if __name__ == "__main__":
+    main()
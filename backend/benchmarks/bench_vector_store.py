@@ -0,0 +1,155 @@
+# Vector store backends side by side: Chroma vs the NumPy store (float16 and int8).
+#
+# Usage (from backend/):  python -m benchmarks.bench_vector_store --sizes 10000 100000 --dim 384
+#
+# Vectors are synthetic but clustered (like real embeddings of related chunks), and
+# queries are perturbed corpus vectors, so the exact float32 top-k is a meaningful
+# ground truth. Each backend is then opened in a fresh subprocess to measure:
+#   cold start  time to open the store and answer the first query
+#   RSS         resident memory of that process after the queries, minus the interpreter baseline
+#   latency     p50/p99 of similarity_search_by_vector(k), as the hybrid retriever calls it
+#   recall@k    overlap of the returned IDs with the exact top-k
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import numpy as np
+from langchain_core.documents import Document
+
+from benchmarks.common import percentile, temp_workdir
+from benchmarks.suite import memory_mb
+from services.vector_store import NumpyVectorStore, open_vectorstore, persist_vectorstore, vector_writer
+
+BACKENDS = ("chroma", "numpy-float16", "numpy-int8")
+WRITE_BATCH = 1000
+
+
+def make_vectors(size, dim, clusters, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, size)] + 0.6 * rng.normal(size=(size, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(vectors, count, seed):
+    rng = np.random.default_rng(seed + 1)
+    queries = vectors[rng.integers(0, len(vectors), count)] + 0.3 * rng.normal(size=(count, vectors.shape[1]))
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+
+def exact_top_k(vectors, queries, k):
+    scores = queries @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [{f"chunk-{i}" for i in row} for row in top]
+
+
+def build(backend, directory, vectors):
+    os.makedirs(directory)
+    if backend == "chroma":
+        store = open_vectorstore(directory, None, "chroma")
+    else:
+        store = NumpyVectorStore(directory, None, dtype=backend.split("-")[1])
+    write = vector_writer(store)
+    t0 = time.perf_counter()
+    for start in range(0, len(vectors), WRITE_BATCH):
+        rows = range(start, min(start + WRITE_BATCH, len(vectors)))
+        write(
+            [f"chunk-{i}" for i in rows],
+            vectors[start:rows.stop].tolist(),
+            [Document(page_content=f"Synthetic chunk {i} about Python, FastAPI and RAG.",
+                      metadata={"source": f"Local File: doc-{i // 20}.md", "content_hash": f"{i:064x}"})
+             for i in rows],
+        )
+    persist_vectorstore(store)
+    return time.perf_counter() - t0
+
+
+def directory_mb(directory):
+    total = sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names
+    )
+    return round(total / 1024 / 1024, 1)
+
+
+def probe(directory, queries_file, k):
+    """Runs in a fresh interpreter: open, query, report. Printed as one JSON line."""
+    queries = np.load(queries_file)
+    baseline, _ = memory_mb()
+    t0 = time.perf_counter()
+    store = open_vectorstore(directory, None)
+    open_seconds = time.perf_counter() - t0
+    store.similarity_search_by_vector(queries[0].tolist(), k=k)
+    cold_seconds = time.perf_counter() - t0
+
+    samples, results = [], []
+    for query in queries:
+        t0 = time.perf_counter()
+        docs = store.similarity_search_by_vector(query.tolist(), k=k)
+        samples.append(time.perf_counter() - t0)
+        results.append([doc.id for doc in docs])
+    rss, _ = memory_mb()
+    print(json.dumps({
+        "open_ms": round(open_seconds * 1000, 1),
+        "cold_start_ms": round(cold_seconds * 1000, 1),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "rss_mb": round(rss - baseline, 1),
+        "results": results,
+    }))
+
+
+def run(size, args, backend_dir):
+    vectors = make_vectors(size, args.dim, args.clusters, args.seed)
+    queries = make_queries(vectors, args.queries, args.seed)
+    np.save("queries.npy", queries)
+    truth = exact_top_k(vectors, queries, args.k)
+
+    print(f"size={size} dim={args.dim} k={args.k} queries={args.queries}")
+    for backend in args.backends:
+        directory = f"./store-{backend}-{size}"
+        build_seconds = build(backend, directory, vectors)
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_vector_store", "--probe", os.path.abspath(directory),
+             "--queries-file", os.path.abspath("queries.npy"), "--k", str(args.k)],
+            cwd=backend_dir, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        recall = np.mean([len(truth[i] & set(ids)) / args.k for i, ids in enumerate(result["results"])])
+        print(
+            f"  {backend:<14} build={build_seconds:7.2f}s disk={directory_mb(directory):8.1f}MB "
+            f"cold start={result['cold_start_ms']:8.1f}ms (open {result['open_ms']:7.1f}ms) "
+            f"rss=+{result['rss_mb']:7.1f}MB p50={result['p50_ms']:7.2f}ms p99={result['p99_ms']:7.2f}ms "
+            f"recall@{args.k}={recall:.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=384, help="1536 matches text-embedding-3-small")
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20, help="RETRIEVER_FETCH_K")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--probe", help=argparse.SUPPRESS)
+    parser.add_argument("--queries-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe(args.probe, args.queries_file, args.k)
+        return
+    backend_dir = os.getcwd()
+    with temp_workdir(copy_db=False):
+        for size in args.sizes:
+            run(size, args, backend_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# This handles shared helpers for the benchmark scripts
+
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+from contextlib import contextmanager
+
+from core.config import PERSIST_DIRECTORY
+
+
+@contextmanager
+def temp_workdir(copy_db: bool = True, copy_data: bool = False):
+    """
+    Runs the benchmark inside a scratch directory holding a copy of ./chroma_db
+    (and optionally ./data), so the committed database is never modified.
+    All paths in core/config.py are relative, so chdir is enough to redirect them.
+    """
+    backend_dir = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    if copy_db:
+        shutil.copytree(os.path.join(backend_dir, PERSIST_DIRECTORY), os.path.join(workdir, PERSIST_DIRECTORY))
+    if copy_data:
+        shutil.copytree(os.path.join(backend_dir, "data"), os.path.join(workdir, "data"))
+    os.chdir(workdir)
+    try:
+        yield workdir
+    finally:
+        os.chdir(backend_dir)
+        release_chroma_clients()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def release_chroma_clients():
+    """
+    Chroma caches one client per path string for the whole process, and the relative
+    paths repeat from one scratch directory to the next; a stale client would write
+    to the deleted directory ("attempt to write a readonly database").
+    """
+    if "chromadb" in sys.modules:
+        from chromadb.api.shared_system_client import SharedSystemClient
+
+        SharedSystemClient.clear_system_cache()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(label, samples):
+    print(
+        f"{label:<10} mean={statistics.mean(samples) * 1000:8.2f}ms "
+        f"p50={percentile(samples, 50) * 1000:8.2f}ms p95={percentile(samples, 95) * 1000:8.2f}ms"
+    )
+    return statistics.mean(samples)
@@ -0,0 +1,47 @@
+# This handles deterministic synthetic corpora for the benchmarks (1k to 1M chunks)
+
+import random
+
+from langchain_core.documents import Document
+
+# Topic terms give BM25 and the reranker realistic postings to work with;
+# filler words pad chunks to roughly the size ingest.py produces (~1000 chars).
+TOPIC_TERMS = [
+    "python", "fastapi", "langchain", "langgraph", "chromadb", "rag", "embeddings", "openai",
+    "react", "docker", "sql", "mysql", "streamlit", "pandas", "pytorch", "evaluation", "agents",
+    "retrieval", "reranking", "backend", "api", "deployment", "xplainify-ai", "nelfund",
+    "fiscal-sentinel", "ussd", "tiidelab", "loan", "prediction", "pipeline", "latency", "caching",
+]
+FILLER = (
+    "the a of and to in for with on built designed shipped improved project system service model "
+    "data users team production tests results using through from into over across each new"
+).split()
+
+QUERIES = [
+    "What are Olajide's Python skills?",
+    "Tell me about Nelfund Navigator",
+    "Has he deployed FastAPI backends with Docker?",
+    "Experience with LangGraph agents",
+    "How did xplainify-ai handle retrieval and reranking?",
+    "Which projects use MySQL or SQL?",
+    "Evaluation of RAG pipelines",
+    "Streamlit dashboards and pandas",
+]
+
+
+def synthetic_chunks(count: int, seed: int = 0, words: int = 150, sources: int = 500):
+    """
+    Yields `count` Documents with stable ids. The same (count, seed) always yields
+    the same corpus, so runs on different commits index identical data.
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        topics = rng.sample(TOPIC_TERMS, 4)
+        body = []
+        for _ in range(words):
+            body.append(rng.choice(topics) if rng.random() < 0.15 else rng.choice(FILLER))
+        yield Document(
+            id=f"synthetic-{seed}-{i}",
+            page_content=" ".join(body),
+            metadata={"source": f"synthetic/source-{i % sources}.md"},
+        )
@@ -0,0 +1,113 @@
+# This handles deterministic local stand-ins for ChatOpenAI and OpenAIEmbeddings
+
+import asyncio
+import hashlib
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+EMBEDDING_DIM = 1536  # Same width as text-embedding-3-small
+
+
+class FakeChatModel(BaseChatModel):
+    """Returns a fixed answer after an artificial delay. Never touches the network."""
+
+    response: str = "Olajide has strong Python, FastAPI and RAG experience. What role are you hiring for?"
+    latency: float = 0.05
+    token_latency: float = 0.0
+    # Appends a call counter so downstream caches (DOCX, response cache) see new text each time
+    vary: bool = False
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _text(self) -> str:
+        self.calls += 1
+        return f"{self.response}\nRef {self.calls}" if self.vary else self.response
+
+    def _total_latency(self) -> float:
+        # A non-streamed call waits for every token the streamed variant would emit
+        return self.latency + self.token_latency * len(self.response.split(" "))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._total_latency())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._text()))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._total_latency())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._text()))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        await asyncio.sleep(self.latency)
+        for token in self._text().split(" "):
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token + " "))
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic embeddings: each text hashes to a seed for a unit vector.
+    Identical text always maps to the identical vector.
+    """
+
+    def __init__(self, size: int = EMBEDDING_DIM, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.size = size
+        self.latency = latency
+        # Fraction of batch calls that raise, to simulate 429s / transient errors
+        self.failure_rate = failure_rate
+        self._rng = np.random.default_rng(seed)
+        self.calls = 0
+
+    def _maybe_fail(self):
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise RuntimeError("Fake rate limit exceeded (429)")
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vec = np.random.default_rng(seed).standard_normal(self.size).astype(np.float32)
+        vec /= np.linalg.norm(vec)
+        return vec.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        self._maybe_fail()
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._maybe_fail()
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+def fake_llm_factory(latency: float = 0.05, token_latency: float = 0.0, response: Optional[str] = None,
+                     vary: bool = False):
+    def factory(model_name: str):
+        kwargs = {"latency": latency, "token_latency": token_latency, "vary": vary}
+        if response is not None:
+            kwargs["response"] = response
+        return FakeChatModel(**kwargs)
+    return factory
+
+
+def fake_embeddings_factory(size: int = EMBEDDING_DIM, latency: float = 0.0):
+    def factory():
+        return HashEmbeddings(size=size, latency=latency)
+    return factory
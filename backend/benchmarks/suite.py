@@ -0,0 +1,253 @@
+# Offline benchmark suite: ingest throughput, retrieval latency vs corpus size,
+# end-to-end /chat and /generate-cv under concurrent load, and memory. No network.
+#
+# Usage (from backend/):
+#   python -m benchmarks.suite                                   # 1k and 10k chunks
+#   python -m benchmarks.suite --sizes 1000 10000 100000 1000000 --dim 128
+#   python -m benchmarks.suite --compare old.json new.json
+#
+# Results are written as JSON (benchmark-results/ by default) so runs on different
+# commits can be compared. Corpora are seeded, so every run indexes identical data.
+# At 1M chunks use a small --dim: full 1536-d vectors need ~6 GB in Chroma alone.
+# Indexes use the configured backend: VECTOR_STORE=numpy python -m benchmarks.suite compares the NumPy store.
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+# All load comes from one client; per-client rate limits would throttle the benchmark itself
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+
+import httpx
+
+from benchmarks.bench_docx import CV_TEXT
+from benchmarks.common import percentile, temp_workdir
+from benchmarks.corpus import QUERIES, synthetic_chunks
+from benchmarks.fakes import EMBEDDING_DIM, HashEmbeddings, fake_embeddings_factory, fake_llm_factory
+from core.config import VECTOR_STORE
+from core.index_state import write_generation
+from services.embedding_pipeline import EmbeddingPipeline, RateLimiter
+from services.lexical_index import BM25Index
+from services.llm_service import LLMService
+from services.registry import registry
+from services.vector_store import open_vectorstore, persist_vectorstore, vector_writer
+
+LOAD_PAYLOADS = {
+    "/chat": lambda i: {"question": f"What are Olajide's Python skills? ({i})", "history": []},
+    "/generate-cv": lambda i: {"job_description": f"Senior Python Backend Engineer, FastAPI, RAG ({i})"},
+}
+
+
+def memory_mb():
+    """(current RSS, peak RSS) of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        current = peak
+    return round(current, 1), round(peak, 1)
+
+
+def latency_summary(samples):
+    return {
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- Phases ---
+def bench_ingest(size, args):
+    target = f"./suite_index_{size}"
+    embeddings = HashEmbeddings(size=args.dim, latency=args.embed_latency)
+    vectorstore = open_vectorstore(target, embeddings)
+    pipeline = EmbeddingPipeline(
+        embeddings, vector_writer(vectorstore), batch_size=args.batch_size, max_concurrency=args.concurrency,
+        rate_limiter=RateLimiter(rpm=10 ** 7, tpm=10 ** 12),
+    )
+    t0 = time.perf_counter()
+    stats = asyncio.run(pipeline.run(synthetic_chunks(size, seed=args.seed)))
+    persist_vectorstore(vectorstore)
+    embed_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    BM25Index.from_documents(synthetic_chunks(size, seed=args.seed)).save(target)
+    bm25_seconds = time.perf_counter() - t0
+
+    rss, peak = memory_mb()
+    result = {
+        "size": size,
+        "chunks": stats["chunks"],
+        "embed_seconds": round(embed_seconds, 3),
+        "bm25_seconds": round(bm25_seconds, 3),
+        "chunks_per_second": round(stats["chunks"] / (embed_seconds + bm25_seconds), 1),
+        "rss_mb": rss,
+        "peak_rss_mb": peak,
+    }
+    print(f"ingest     size={size:<8} {result['chunks_per_second']:10.1f} chunks/s  rss={rss}MB")
+    return target, result
+
+
+def bench_retrieval(size, target, args):
+    write_generation(target, chunks=size)
+    registry.embeddings_factory = fake_embeddings_factory(size=args.dim)
+    t0 = time.perf_counter()
+    registry.reload()
+    open_seconds = time.perf_counter() - t0
+
+    retriever = asyncio.run(LLMService.get_retriever())
+    retriever.invoke(QUERIES[0])  # warm-up
+    samples = []
+    for _ in range(args.repeats):
+        for query in QUERIES:
+            t0 = time.perf_counter()
+            retriever.invoke(query)
+            samples.append(time.perf_counter() - t0)
+
+    rss, peak = memory_mb()
+    result = {"size": size, "open_seconds": round(open_seconds, 3), **latency_summary(samples),
+              "rss_mb": rss, "peak_rss_mb": peak}
+    print(f"retrieval  size={size:<8} p50={result['p50_ms']:8.2f}ms p99={result['p99_ms']:8.2f}ms  rss={rss}MB")
+    return result
+
+
+async def bench_load(args):
+    from main import app
+
+    registry.llm_factory = fake_llm_factory(latency=args.llm_latency, response=CV_TEXT, vary=True)
+    registry.embeddings_factory = HashEmbeddings
+    registry.start()
+    counter = itertools.count()
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            for path, payload in LOAD_PAYLOADS.items():
+                for level in args.levels:
+                    samples = []
+
+                    async def worker():
+                        for _ in range(args.requests):
+                            # Unique payloads keep the response and DOCX caches out of the measurement
+                            t0 = time.perf_counter()
+                            response = await client.post(path, json=payload(next(counter)))
+                            response.raise_for_status()
+                            samples.append(time.perf_counter() - t0)
+
+                    t0 = time.perf_counter()
+                    await asyncio.gather(*(worker() for _ in range(level)))
+                    elapsed = time.perf_counter() - t0
+                    rss, peak = memory_mb()
+                    result = {"endpoint": path, "concurrency": level,
+                              "requests_per_second": round(len(samples) / elapsed, 2),
+                              **latency_summary(samples), "rss_mb": rss, "peak_rss_mb": peak}
+                    results.append(result)
+                    print(
+                        f"load       {path:<14} clients={level:<4} {result['requests_per_second']:8.2f} req/s "
+                        f"p50={result['p50_ms']:8.1f}ms p99={result['p99_ms']:8.1f}ms"
+                    )
+    finally:
+        await registry.aclose()
+    return results
+
+
+# --- Comparison ---
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    keys = {"ingest": ("size",), "retrieval": ("size",), "load": ("endpoint", "concurrency")}
+    for section, key_fields in keys.items():
+        old_rows = {tuple(row[k] for k in key_fields): row for row in old.get(section, [])}
+        for row in new.get(section, []):
+            key = tuple(row[k] for k in key_fields)
+            before = old_rows.get(key)
+            if before is None:
+                continue
+            for field, value in row.items():
+                if field in key_fields or not isinstance(value, (int, float)) or not before.get(field):
+                    continue
+                change = (value - before[field]) / before[field] * 100
+                print(f"{section:<10} {'/'.join(map(str, key)):<20} {field:<20} "
+                      f"{before[field]:>12} -> {value:>12} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="fake embedding width")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="fake latency per embedding batch")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4, help="embedding batches in flight")
+    parser.add_argument("--repeats", type=int, default=10, help="passes over the query set per size")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM latency per call")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=5, help="requests per client in the load phase")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    output = os.path.abspath(
+        args.output or os.path.join("benchmark-results", f"suite-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    )
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.time(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "vector_store": VECTOR_STORE,
+            "args": vars(args),
+        },
+        "ingest": [],
+        "retrieval": [],
+        "load": [],
+    }
+
+    for size in args.sizes:
+        with temp_workdir(copy_db=False):
+            target, ingest_result = bench_ingest(size, args)
+            report["ingest"].append(ingest_result)
+            try:
+                report["retrieval"].append(bench_retrieval(size, target, args))
+            finally:
+                asyncio.run(registry.aclose())
+
+    if not args.skip_load:
+        with temp_workdir():
+            report["load"] = asyncio.run(bench_load(args))
+
+    report["meta"]["peak_rss_mb"] = memory_mb()[1]
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,164 @@
 # This handles the settings (Env variables and constants)
 
 import os
-from dotenv import load_dotenv
 
-# Loading the environment
-load_dotenv()
+# Loading the environment from a .env file, when there is one (in the working directory or
+# backend/). Hosts that set real environment variables skip the file search and the import.
+_ENV_FILES = [
+    os.path.abspath(".env"),
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"),
+]
+_ENV_FILE = next((path for path in _ENV_FILES if os.path.isfile(path)), None)
+if _ENV_FILE:
+    from dotenv import load_dotenv
+
+    load_dotenv(_ENV_FILE)
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 PERSIST_DIRECTORY = "./chroma_db"
 
+# Written by ingest.py after every successful run so running API workers can
+# detect a new index generation and hot-swap to it.
+GENERATION_FILE = "./index_generation.json"
+
+# Incremental ingest builds each new generation here, next to the live one
+INDEX_ROOT = "./chroma_generations"
+KEEP_GENERATIONS = int(os.getenv("KEEP_GENERATIONS", "2"))
+
+# Vector store backend for new generations: "chroma", or "numpy" (memory-mapped quantized vectors with
+# exact search: smaller and much faster to open, for corpora up to a few hundred thousand chunks).
+# A generation always opens with the backend it was built with; switching makes the next ingest rebuild.
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma").lower()
+NUMPY_STORE_DTYPE = os.getenv("NUMPY_STORE_DTYPE", "int8").lower()  # "int8" or "float16"
+NUMPY_STORE_BLOCK_ROWS = int(os.getenv("NUMPY_STORE_BLOCK_ROWS", "512"))  # rows upcast to float32 per matmul (cache-sized)
+
+# Multi-tenant personas. The default tenant uses the paths above; every other tenant lives in
+# TENANTS_ROOT/<tenant>/ (persona.json, ingest_sources.json, its own generation marker and index).
+# Tenant indexes open on first use; the least recently used ones are closed beyond
+# TENANT_MAX_LOADED or after TENANT_IDLE_SECONDS without requests.
+TENANTS_ROOT = os.getenv("TENANTS_ROOT", "./tenants")
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+TENANT_MAX_LOADED = int(os.getenv("TENANT_MAX_LOADED", "32"))
+TENANT_IDLE_SECONDS = float(os.getenv("TENANT_IDLE_SECONDS", "900"))
+TENANT_STATS_MAX = int(os.getenv("TENANT_STATS_MAX", "1024"))
+# Edits to a persona.json are picked up within this many seconds (its mtime is checked at most this often)
+PERSONA_CHECK_SECONDS = float(os.getenv("PERSONA_CHECK_SECONDS", "5"))
+
+# Loading stage of ingest.py: sources are listed on threads, files are parsed and split on processes.
+# Sources come from INGEST_SOURCES_FILE when it exists, otherwise from the defaults in ingest.py.
+INGEST_SOURCES_FILE = os.getenv("INGEST_SOURCES_FILE", "./ingest_sources.json")
+INGEST_LOAD_WORKERS = int(os.getenv("INGEST_LOAD_WORKERS", "4"))
+INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "1000"))
+# Git sources keep a shallow bare mirror here and only fetch new commits; larger files are skipped unread
+GIT_MIRROR_ROOT = os.getenv("GIT_MIRROR_ROOT", "./git_mirrors")
+GIT_MAX_FILE_BYTES = int(os.getenv("GIT_MAX_FILE_BYTES", "200000"))
+
+# Embedding stage of ingest.py (limits for the OpenAI embeddings endpoint)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+EMBED_RPM = int(os.getenv("EMBED_RPM", "3000"))
+EMBED_TPM = int(os.getenv("EMBED_TPM", "1000000"))
+
+# Persistent embedding cache shared by ingest.py and query time
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+DEFAULT_CHAT_MODEL = "gpt-4o-mini"
+RETRIEVER_K = 6
+
+# Hybrid retrieval: BM25 + vector hits fused with reciprocal rank fusion
+RETRIEVER_FETCH_K = int(os.getenv("RETRIEVER_FETCH_K", "20"))
+# Upper bound on a client-supplied retrieval.k (ChatRequest)
+RETRIEVER_MAX_K = int(os.getenv("RETRIEVER_MAX_K", str(RETRIEVER_FETCH_K)))
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Rerank-and-prune: over-fetch candidates, score locally, keep what fits the budget
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "12"))
+RERANK_TOKEN_BUDGET = int(os.getenv("RERANK_TOKEN_BUDGET", "1200"))
+RERANK_TIME_BUDGET_MS = float(os.getenv("RERANK_TIME_BUDGET_MS", "25"))
+
+# Service registry (shared clients and vector store handle)
+REGISTRY_REFRESH_SECONDS = float(os.getenv("REGISTRY_REFRESH_SECONDS", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "60"))
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "4"))
+
+# Chat history compaction: recent turns are kept verbatim up to the token
+# budget, older turns are folded into a rolling summary per conversation
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))
+HISTORY_SUMMARY_MAX_WORDS = int(os.getenv("HISTORY_SUMMARY_MAX_WORDS", "150"))
+HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", "1024"))
+HISTORY_REWRITE_QUERIES = os.getenv("HISTORY_REWRITE_QUERIES", "true").lower() == "true"
+HISTORY_REWRITE_TURNS = int(os.getenv("HISTORY_REWRITE_TURNS", "4"))
+# The rewrite runs before retrieval; past this the raw question is used
+HISTORY_REWRITE_TIMEOUT_SECONDS = float(os.getenv("HISTORY_REWRITE_TIMEOUT_SECONDS", "2.0"))
+
+# DOCX rendering
+DOCX_CACHE_MAX_ENTRIES = int(os.getenv("DOCX_CACHE_MAX_ENTRIES", "128"))
+DOCX_STREAM_CHUNK_SIZE = 64 * 1024
+# Uncached documents and ZIPs are written to a temporary file kept in memory up to this size, on disk beyond it
+DOCX_SPOOL_MAX_BYTES = int(os.getenv("DOCX_SPOOL_MAX_BYTES", str(1024 * 1024)))
+
+# Observability: per-stage histograms on /metrics, optional JSON log lines with request IDs
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+JSON_LOGS = os.getenv("JSON_LOGS", "false").lower() == "true"
+
+# Warm-up: at startup (and whenever a new index generation is published) each tenant in
+# WARMUP_TENANTS has its index opened and its suggested questions and profile queries
+# embedded and retrieved. With WARMUP_PRECOMPUTE_ANSWERS, ingest.py also stores answers
+# to the suggested questions in the generation, served from the response cache.
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_TENANTS = [t.strip() for t in os.getenv("WARMUP_TENANTS", DEFAULT_TENANT).split(",") if t.strip()]
+WARMUP_QUESTIONS_FILE = os.getenv("WARMUP_QUESTIONS_FILE", "./warmup_questions.json")
+WARMUP_PRECOMPUTE_ANSWERS = os.getenv("WARMUP_PRECOMPUTE_ANSWERS", "false").lower() == "true"
+
+# Admission control around every LLM call: at most LLM_MAX_CONCURRENCY calls in flight
+# (and per model, e.g. LLM_MODEL_CONCURRENCY="gpt-4o=4,gpt-4o-mini=12"). Beyond that up to
+# LLM_MAX_QUEUE requests wait LLM_QUEUE_TIMEOUT_SECONDS for a slot; the rest get a 503 at
+# once. Identical prompts in flight at the same time share one call (LLM_COALESCE).
+# Each client (IP) gets RATE_LIMIT_PER_MINUTE LLM requests with bursts of RATE_LIMIT_BURST;
+# 0 (the default) disables the limit. Behind a proxy (Render) every request comes from the
+# proxy's address, so only enable it with uvicorn --proxy-headers --forwarded-allow-ips set
+# to the proxy, or with RATE_LIMIT_TRUST_FORWARDED; otherwise all users share one bucket.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MODEL_CONCURRENCY = {
+    name.strip(): int(limit)
+    for name, _, limit in (pair.partition("=") for pair in os.getenv("LLM_MODEL_CONCURRENCY", "").split(","))
+    if name.strip() and limit.strip()
+}
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+LLM_COALESCE = os.getenv("LLM_COALESCE", "true").lower() == "true"
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "0"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+
+# Batch document jobs (POST /batch/documents): JDs are deduplicated and processed on an
+# in-process queue by BATCH_WORKERS jobs at a time, each with up to BATCH_ITEM_CONCURRENCY
+# JDs in flight. Finished jobs (and their DOCX files) are kept for polling until
+# BATCH_JOB_TTL_SECONDS, at most BATCH_MAX_JOBS of them.
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "2"))
+BATCH_ITEM_CONCURRENCY = int(os.getenv("BATCH_ITEM_CONCURRENCY", "4"))
+BATCH_MAX_QUEUED = int(os.getenv("BATCH_MAX_QUEUED", "20"))
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "50"))
+BATCH_JOB_TTL_SECONDS = float(os.getenv("BATCH_JOB_TTL_SECONDS", "3600"))
+
+# Semantic response cache for /chat (questions without history only)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))
+
 if not OPENAI_API_KEY:
     print("WARNING: OPENAI_API_KEY not found in .env file")
-    
\ No newline at end of file
@@ -0,0 +1,52 @@
+# This handles the index generation marker shared by ingest.py and the API
+
+import json
+import os
+import time
+
+from core.config import GENERATION_FILE, PERSIST_DIRECTORY
+
+
+def read_generation(generation_file: str = GENERATION_FILE, persist_directory: str = PERSIST_DIRECTORY):
+    """
+    Returns the active index generation as a dict:
+    {"generation": int, "persist_directory": str, "created_at": float}
+
+    Falls back to generation 0 on persist_directory when ingest.py has never
+    written a marker (e.g. a database committed before markers existed).
+    Other tenants pass their own marker and directory (core/tenants.py).
+    """
+    try:
+        with open(generation_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        state.setdefault("persist_directory", persist_directory)
+        state.setdefault("generation", 0)
+        return state
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"generation": 0, "persist_directory": persist_directory, "created_at": 0.0}
+
+
+def write_generation(persist_directory: str = PERSIST_DIRECTORY, generation_file: str = GENERATION_FILE, **extra):
+    """
+    Bumps the generation counter and atomically replaces the marker file.
+    Readers either see the old marker or the new one, never a partial write.
+    """
+    current = read_generation(generation_file, persist_directory)
+    state = {
+        "generation": int(current.get("generation", 0)) + 1,
+        "persist_directory": persist_directory,
+        "created_at": time.time(),
+        **extra,
+    }
+    tmp_path = f"{generation_file}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, generation_file)
+    return state
+
+
+def generation_mtime(generation_file: str = GENERATION_FILE):
+    try:
+        return os.path.getmtime(generation_file)
+    except FileNotFoundError:
+        return 0.0
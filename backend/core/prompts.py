@@ -1,8 +1,25 @@
-# This handles the long text templates (CV and Cover Letter)
+# This handles the long text templates (CV and Cover Letter) and the persona they are written for
+
+from models.schemas import Persona
+
+# Fixed retrieval queries used by the document endpoints
+PROFILE_QUERIES = {
+    "cv": "My full professional experience, technical skills, and projects",
+    "cover_letter": "My full professional experience, motivation, and soft skills",
+}
+
+# Starter questions shown by the frontend and warmed up at startup; override with
+# WARMUP_QUESTIONS_FILE (a JSON list) or "suggested_questions" in a tenant's persona.json
+SUGGESTED_QUESTIONS = [
+    "What are {name}'s strongest technical skills?",
+    "Which projects has {name} built?",
+    "What experience does {name} have with AI and RAG systems?",
+    "What is {name}'s professional background?",
+]
 
 CV_STRUCTURE_TEMPLATE = """
 # [Your Name]
-**AI Engineer & Backend Developer**
+**{headline}**
 [City, Country] | [Email] | [LinkedIn URL] | [GitHub URL]
 
 ## Professional Summary
@@ -41,7 +58,7 @@ Dear Hiring Manager,
 [State the role applying for and 1 key reason why you are a perfect fit based on the Job Description.]
 
 **Paragraph 2: Technical Proof**
-[Discuss 1-2 specific projects from the context (e.g., xplainify-ai) that prove you can do the job requirements.]
+[Discuss 1-2 specific projects from the context{project_hint} that prove you can do the job requirements.]
 
 **Paragraph 3: Soft Skills & Culture**
 [Mention collaboration, learning speed, or problem-solving capability.]
@@ -50,19 +67,19 @@ Dear Hiring Manager,
 [Professional closing, expressing desire for an interview.]
 
 Sincerely,
-Olajide
+{name}
 """
 
 
-system_prompt_text = """
+SYSTEM_PROMPT_TEMPLATE = """
 ### ROLE DEFINITION
-You are the **AI Professional Representative of Olajide (OlajCodes)**. 
-Your sole purpose is to interview with recruiters, hiring managers, and visitors on behalf of Olajide. You must showcase his expertise in AI/ML, Software Engineering, and Python development.
+You are the **AI Professional Representative of {display_name}**. 
+Your sole purpose is to interview with recruiters, hiring managers, and visitors on behalf of {name}. You must showcase {possessive} expertise in {expertise}.
 
 ### TEMPORAL CONTEXT
-**Current Date:** {current_date}
+**Current Date:** {{current_date}}
 **Instruction:** Always compare dates in the context with the Current Date. 
-- If a graduation date (e.g., "May 2025") is in the past relative to {current_date}, assume he has graduated.
+- If a graduation date (e.g., "May 2025") is in the past relative to {{current_date}}, assume {subject} has graduated.
 - If a project says "2024-Present", it is still active.
 - Do not use phrases like "currently pursuing" for degrees with past completion dates.
 
@@ -71,15 +88,111 @@ You will be provided with retrieved context (RAG Data).
 **RULE:** You must derive all claims strictly from this provided context.
 
 ### OPERATIONAL GUIDELINES
-1. **Voice:** Professional, confident, yet humble. Use the third person ("Olajide's experience includes...").
-2. **Handling Unknowns:** If a skill is NOT in the context, do NOT say "I don't know." Pivot to his ability to learn.
+1. **Voice:** Professional, confident, yet humble. Use the third person ("{name}'s experience includes...").
+2. **Handling Unknowns:** If a skill is NOT in the context, do NOT say "I don't know." Pivot to {possessive} ability to learn.
 3. **Engagement:** End answers with a relevant follow-up question.
-4. **Citations (CRITICAL):** You MUST cite your sources. When you provide a fact, reference the document it came from (e.g., "According to the 'Nelfund Navigator' README...").
+4. **Citations (CRITICAL):** You MUST cite your sources. When you provide a fact, reference the document it came from (e.g., "According to the {citation_example} README...").
 
 ### PRIVACY GUARDRAILS
 * **Refuse** requests for: Age, Home Address, Phone Number, Personal Email.
-* **Response:** "I cannot share personal or sensitive information. Please ask about Olajide's professional experience."
+* **Response:** "I cannot share personal or sensitive information. Please ask about {name}'s professional experience."
 
 ### CONTEXT
-{context}
-"""
\ No newline at end of file
+{{context}}
+"""
+# Used by the chat history compaction (services/history_service.py)
+HISTORY_SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a recruiter and {name}'s AI assistant.
+
+EXISTING SUMMARY:
+{summary}
+
+NEW MESSAGES:
+{messages}
+
+Update the summary so it also covers the new messages. Keep the recruiter's goals, the role and
+company discussed, questions already answered and any facts the assistant stated.
+Write at most {max_words} words of plain text. Output ONLY the updated summary.
+"""
+
+QUERY_REWRITE_PROMPT = """
+Rewrite the recruiter's latest question as a standalone search query about {name}'s
+experience, skills or projects. Resolve pronouns and references ("that project", "it",
+"the second one") using the recent conversation. If the question is already standalone,
+return it unchanged.
+
+RECENT CONVERSATION:
+{messages}
+
+LATEST QUESTION:
+{question}
+
+Output ONLY the rewritten query.
+"""
+
+
+# The original single persona; served by the default tenant unless tenants/default/persona.json overrides it
+DEFAULT_PERSONA = Persona(
+    name="Olajide",
+    handle="OlajCodes",
+    headline="AI Engineer & Backend Developer",
+    expertise="AI/ML, Software Engineering, and Python development",
+    possessive="his",
+    subject="he",
+    roles="AI Engineer, Backend Developer, Data Scientist",
+    tech="Python, FastAPI, React, RAG, LLMs, OpenAI, Vector DBs",
+    relevant_fields="Software, Tech, AI, Data, or Engineering",
+    unrelated_examples="Nurse, Chef, Driver, HR",
+    core_domain="AI Engineering, Python, Backend, Machine Learning",
+    cv_unrelated_examples="Nurse, Accountant, Chef",
+    relevance_profile="an AI Engineer/Python Developer",
+    featured_project="xplainify-ai",
+    cited_project="Nelfund Navigator",
+    cv_notes=[
+        """**Education Status:** Compare my graduation date (e.g., July 2025) with Today's Date ({today}).
+           - Since the graduation date is in the past, I have **GRADUATED**.
+           - **NEVER** write "Currently pursuing".
+           - Instead, start the summary with: "Computer Science Graduate..." or "AI Engineer with...\"""",
+    ],
+    cover_letter_notes=[
+        """**Chronology & Accuracy:** - Look at dates in the context.
+           - **TIIDELab** was an internship in the past. Do NOT refer to it as "recent" or "current".
+           - Focus heavily on my **current** work: 'xplainify-ai', 'Nelfund Navigator', 'Fiscal Sentinel', and my AI Engineering training.""",
+    ],
+)
+
+
+def persona_fields(persona: Persona, escape: bool = False) -> dict:
+    """Template values for a persona. escape=True doubles braces for text that is formatted again later."""
+    cited = persona.cited_project or persona.featured_project
+    fields = {
+        "name": persona.name,
+        "display_name": f"{persona.name} ({persona.handle})" if persona.handle else persona.name,
+        "possessive": persona.possessive,
+        "subject": persona.subject or persona.name,
+        "expertise": persona.expertise,
+        "headline": persona.headline,
+        "project_hint": f" (e.g., {persona.featured_project})" if persona.featured_project else "",
+        "citation_example": f"'{cited}'" if cited else "project's",
+    }
+    if escape:
+        fields = {key: value.replace("{", "{{").replace("}", "}}") for key, value in fields.items()}
+    return fields
+
+
+def system_prompt_for(persona: Persona) -> str:
+    """The chat system prompt; {current_date} and {context} are left for ChatPromptTemplate."""
+    return SYSTEM_PROMPT_TEMPLATE.format(**persona_fields(persona, escape=True))
+
+
+def cv_structure_for(persona: Persona) -> str:
+    return CV_STRUCTURE_TEMPLATE.format(**persona_fields(persona))
+
+
+def cover_letter_template_for(persona: Persona) -> str:
+    return COVER_LETTER_TEMPLATE.format(**persona_fields(persona))
+
+
+def suggested_questions_for(persona: Persona, templates=None):
+    """The persona's starter questions, else `templates`, else SUGGESTED_QUESTIONS, with {name} filled in."""
+    return [t.replace("{name}", persona.name) for t in persona.suggested_questions or templates or SUGGESTED_QUESTIONS]
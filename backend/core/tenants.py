@@ -0,0 +1,107 @@
+# This handles tenants (personas): where each one's index, sources and prompt config live
+
+import json
+import os
+import re
+import threading
+import time
+from typing import NamedTuple
+
+from core.config import (
+    DEFAULT_TENANT,
+    GENERATION_FILE,
+    INDEX_ROOT,
+    INGEST_SOURCES_FILE,
+    PERSIST_DIRECTORY,
+    PERSONA_CHECK_SECONDS,
+    TENANTS_ROOT,
+)
+from core.prompts import DEFAULT_PERSONA
+from models.schemas import Persona
+
+TENANT_ID_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+PERSONA_FILE = "persona.json"
+
+
+class UnknownTenantError(LookupError):
+    pass
+
+
+class TenantPaths(NamedTuple):
+    root: str
+    generation_file: str
+    persist_directory: str  # index used before the tenant's first ingest publishes a generation
+    index_root: str
+    sources_file: str
+    persona_file: str
+
+
+def tenant_paths(tenant_id: str = DEFAULT_TENANT) -> TenantPaths:
+    root = os.path.join(TENANTS_ROOT, tenant_id)
+    if tenant_id == DEFAULT_TENANT:
+        # The original single-persona layout, so existing deployments keep their index
+        return TenantPaths(root, GENERATION_FILE, PERSIST_DIRECTORY, INDEX_ROOT, INGEST_SOURCES_FILE,
+                           os.path.join(root, PERSONA_FILE))
+    return TenantPaths(
+        root,
+        os.path.join(root, "index_generation.json"),
+        os.path.join(root, "chroma_db"),
+        os.path.join(root, "chroma_generations"),
+        os.path.join(root, "ingest_sources.json"),
+        os.path.join(root, PERSONA_FILE),
+    )
+
+
+def resolve_tenant(tenant_id: str = None) -> str:
+    """The tenant a request is for (the default one when omitted). Raises UnknownTenantError."""
+    tenant_id = tenant_id or DEFAULT_TENANT
+    if tenant_id == DEFAULT_TENANT:
+        return tenant_id
+    # The pattern also keeps tenant IDs from escaping TENANTS_ROOT
+    if not TENANT_ID_RE.match(tenant_id) or not os.path.isdir(os.path.join(TENANTS_ROOT, tenant_id)):
+        raise UnknownTenantError(f"Unknown tenant '{tenant_id}'.")
+    return tenant_id
+
+
+def list_tenants():
+    tenants = {DEFAULT_TENANT}
+    if os.path.isdir(TENANTS_ROOT):
+        tenants.update(
+            name for name in os.listdir(TENANTS_ROOT)
+            if TENANT_ID_RE.match(name) and os.path.isdir(os.path.join(TENANTS_ROOT, name))
+        )
+    return sorted(tenants)
+
+
+# persona.json is re-read when its mtime changes, so personas can be edited without a restart.
+# The mtime is checked at most every PERSONA_CHECK_SECONDS: this runs several times per request.
+_personas = {}  # tenant -> (mtime, persona, checked at)
+_personas_lock = threading.Lock()
+
+
+def get_persona(tenant_id: str = DEFAULT_TENANT) -> Persona:
+    now = time.monotonic()
+    cached = _personas.get(tenant_id)
+    if cached is not None and now - cached[2] < PERSONA_CHECK_SECONDS:
+        return cached[1]
+
+    path = tenant_paths(tenant_id).persona_file
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    if cached is not None and cached[0] == mtime:
+        with _personas_lock:
+            _personas[tenant_id] = (mtime, cached[1], now)
+        return cached[1]
+
+    if mtime is not None:
+        with open(path, "r", encoding="utf-8") as f:
+            persona = Persona(**json.load(f))
+    elif tenant_id == DEFAULT_TENANT:
+        persona = DEFAULT_PERSONA
+    else:
+        persona = Persona(name=tenant_id)
+    with _personas_lock:
+        _personas[tenant_id] = (mtime, persona, now)
+    return persona
@@ -1,112 +1,386 @@
+import argparse
+import asyncio
+import hashlib
+import json
 import os
 import shutil
-from core.config import OPENAI_API_KEY, PERSIST_DIRECTORY
+import time
+from collections import defaultdict
+from core.config import (
+    OPENAI_API_KEY, DEFAULT_TENANT, EMBEDDING_MODEL, EMBEDDING_CACHE_ENABLED, INDEX_ROOT, KEEP_GENERATIONS,
+    NUMPY_STORE_DTYPE, VECTOR_STORE, WARMUP_PRECOMPUTE_ANSWERS,
+)
+from core.index_state import read_generation, write_generation
+from core.tenants import list_tenants, tenant_paths
+from services.embedding_cache import CachedEmbeddings, get_embedding_cache
+from services.embedding_pipeline import Checkpoint, EmbeddingPipeline
+from services.lexical_index import BM25Index
+from services.llm_service import LLMService
+from services.vector_store import close_vectorstore, open_vectorstore, persist_vectorstore, vector_writer
+from services.warmup_service import (
+    WARMUP_FILE, precompute_answers, suggested_questions, warmup_texts, write_warmup_file,
+)
 
-# Loaders
-from langchain_community.document_loaders import GitLoader, PyPDFLoader, TextLoader
+# Sources (loading and splitting run in worker pools, see services/sources.py)
+from services.sources import (
+    DirectorySource, GitHubSource, LoadUnit, PDFSource, SourceContext, aiter_chunks, load_sources_file,
+)
 
-# Splitters & Embeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings 
-from langchain_chroma import Chroma
+# Embeddings
+from langchain_openai import OpenAIEmbeddings
 
 os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
 GITHUB_REPO_URL = "https://github.com/Olajcodes/Olajcodes"
 LINKEDIN_PDF_PATH = "Profile.pdf"
-LOCAL_DATA_FOLDER = "./data"  
+LOCAL_DATA_FOLDER = "./data"
+MANIFEST_NAME = "manifest.json"
+CHECKPOINT_NAME = "embed_checkpoint.jsonl"
 
 def get_embeddings():
-    print("INFO: Using OpenAI Embeddings (text-embedding-3-small)...")
-    return OpenAIEmbeddings(model="text-embedding-3-small")
+    print(f"INFO: Using OpenAI Embeddings ({EMBEDDING_MODEL})...")
+    return OpenAIEmbeddings(model=EMBEDDING_MODEL)
 
-def main():
-    # Clear existing DB
-    if os.path.exists(PERSIST_DIRECTORY):
-        print(f"Removing existing database at {PERSIST_DIRECTORY}...")
-        shutil.rmtree(PERSIST_DIRECTORY)
+def get_cached_embeddings():
+    embeddings = get_embeddings()
+    if EMBEDDING_CACHE_ENABLED:
+        print("INFO: Embedding cache enabled; unchanged text is never re-embedded.")
+        embeddings = CachedEmbeddings(embeddings, EMBEDDING_MODEL, get_embedding_cache())
+    return embeddings
 
-    documents = []
+def default_sources():
+    return [
+        GitHubSource(GITHUB_REPO_URL),
+        PDFSource(LINKEDIN_PDF_PATH, label="LinkedIn Profile"),
+        DirectorySource(LOCAL_DATA_FOLDER),
+    ]
 
-    try:
-        print(f"Loading GitHub repository from {GITHUB_REPO_URL}...")
-        if os.path.exists("./temp_repo"):
-            shutil.rmtree("./temp_repo")
-            
-        loader_github = GitLoader(
-            clone_url=GITHUB_REPO_URL,
-            repo_path="./temp_repo",
-            branch="main",
-            file_filter=lambda file_path: file_path.endswith((".md", ".py", ".js", ".ts", ".html", ".ipynb"))
-        )
-        github_docs = loader_github.load()
-        for doc in github_docs:
-            doc.metadata["source"] = f"GitHub: {doc.metadata.get('file_name', 'Unknown')}"
-        documents.extend(github_docs)
-        print(f"Loaded {len(github_docs)} documents from GitHub.")
-    except Exception as e:
-        print(f"Error loading GitHub: {e}")
+def get_sources(sources_file=None, tenant=DEFAULT_TENANT):
+    """
+    Sources from the JSON sources file when present (tenants/<tenant>/ingest_sources.json
+    for other tenants), otherwise the defaults above. Only the default tenant has defaults.
+    """
+    sources_file = sources_file or tenant_paths(tenant).sources_file
+    if os.path.exists(sources_file):
+        print(f"INFO: Reading ingest sources from {sources_file}")
+        return load_sources_file(sources_file)
+    if tenant != DEFAULT_TENANT:
+        raise FileNotFoundError(f"No sources for tenant '{tenant}': create {sources_file}.")
+    return default_sources()
 
+# --- Content hashing & manifest ---
+def assign_chunk_id(doc, occurrences):
+    """
+    Gives a chunk a stable ID derived from its source and content:
+    {source hash}-{content hash}-{occurrence}. An unchanged chunk keeps its ID
+    across runs, so only new or edited chunks need embedding. The set of IDs
+    does not depend on the order chunks arrive in.
+    """
+    source = doc.metadata.get("source", "Unknown")
+    content_hash = hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+    source_hash = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    key = (source, content_hash)
+    doc.metadata["content_hash"] = content_hash
+    doc.id = f"{source_hash[:12]}-{content_hash[:24]}-{occurrences[key]}"
+    occurrences[key] += 1
+    return doc
 
+def build_manifest(sources, source_state=None):
+    """sources: {source label: [chunk ids]}; source_state: {source name: state}, e.g. a git source's last commit"""
+    manifest_sources = {}
+    for source, ids in sources.items():
+        manifest_sources[source] = {
+            "hash": hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest(),
+            "chunks": len(ids),
+            "ids": ids,
+        }
+    return {
+        "embedding_model": EMBEDDING_MODEL,
+        "vector_store": VECTOR_STORE,
+        "created_at": time.time(),
+        "sources": manifest_sources,
+        "source_state": source_state or {},
+    }
+
+def load_manifest(persist_directory):
     try:
-        if os.path.exists(LINKEDIN_PDF_PATH):
-            print(f"Loading LinkedIn profile from {LINKEDIN_PDF_PATH}...")
-            loader_linkedin = PyPDFLoader(LINKEDIN_PDF_PATH)
-            linkedin_docs = loader_linkedin.load()
-            for doc in linkedin_docs:
-                doc.metadata["source"] = "LinkedIn Profile"
-            documents.extend(linkedin_docs)
-            print(f"Loaded {len(linkedin_docs)} pages from LinkedIn.")
+        with open(os.path.join(persist_directory, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def save_manifest(persist_directory, manifest):
+    # Atomic, since it may rewrite the manifest of the live generation
+    path = os.path.join(persist_directory, MANIFEST_NAME)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(f"{path}.tmp", path)
+
+def diff_manifests(old, new):
+    """Returns (ids to embed, ids to delete, per-source report)."""
+    old_sources = old["sources"] if old else {}
+    new_sources = new["sources"]
+
+    old_ids = {i for entry in old_sources.values() for i in entry["ids"]}
+    new_ids = {i for entry in new_sources.values() for i in entry["ids"]}
+
+    report = {}
+    for source in sorted(set(old_sources) | set(new_sources)):
+        before = set(old_sources.get(source, {}).get("ids", []))
+        after = set(new_sources.get(source, {}).get("ids", []))
+        if source not in new_sources:
+            status = "deleted"
+        elif source not in old_sources:
+            status = "new"
+        elif old_sources[source]["hash"] == new_sources[source]["hash"]:
+            status = "unchanged"
         else:
-            print(f"Warning: {LINKEDIN_PDF_PATH} not found. Skipping.")
+            status = "changed"
+        report[source] = {"status": status, "added": len(after - before), "removed": len(before - after)}
+
+    return new_ids - old_ids, old_ids - new_ids, report
+
+def previous_chunks(live_directory, old_manifest):
+    """{source label: [chunks]} of the live generation, for sources that report a file as unchanged."""
+    if not old_manifest:
+        return {}
+    chunks = defaultdict(list)
+    for doc in BM25Index.read_documents(live_directory):
+        source = doc.metadata.get("source", "Unknown")
+        if source in old_manifest["sources"]:
+            chunks[source].append(doc)
+    return chunks
+
+def print_report(report, to_embed, to_delete):
+    for source, entry in report.items():
+        if entry["status"] != "unchanged":
+            print(f"   {entry['status']:>9}: {source} (+{entry['added']} / -{entry['removed']} chunks)")
+    unchanged = sum(1 for e in report.values() if e["status"] == "unchanged")
+    print(f"Sources unchanged: {unchanged}. Chunks to embed: {len(to_embed)}. Chunks to delete: {len(to_delete)}.")
+
+# --- Generations ---
+def next_generation_directory(generation, index_root=INDEX_ROOT):
+    os.makedirs(index_root, exist_ok=True)
+    return os.path.join(index_root, f"gen-{generation:04d}")
+
+def prune_generations(live_directory, index_root=INDEX_ROOT):
+    """Keeps the live generation plus the newest KEEP_GENERATIONS - 1 older ones for in-flight readers."""
+    if not os.path.isdir(index_root):
+        return
+    live = os.path.abspath(live_directory)
+    generations = sorted(
+        os.path.join(index_root, name) for name in os.listdir(index_root) if name.startswith("gen-")
+    )
+    keep = {os.path.abspath(p) for p in generations[-KEEP_GENERATIONS:]} | {live}
+    for path in generations:
+        if os.path.abspath(path) not in keep:
+            print(f"Removing old generation {path}...")
+            shutil.rmtree(path, ignore_errors=True)
+
+class GenerationTarget:
+    """
+    The next generation directory, created on the first write. A run where
+    nothing changed never copies the live index.
+    """
+
+    def __init__(self, target, live_directory, copy_live, checkpoint, resume, embeddings):
+        self.target = target
+        self.live_directory = live_directory
+        self.copy_live = copy_live
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.embeddings = embeddings
+        self.vectorstore = None
+
+    def open(self):
+        if self.vectorstore is None:
+            if self.resume:
+                print(f"Resuming interrupted build at {self.target} ({len(self.checkpoint.done)} chunks already embedded)...")
+            else:
+                if os.path.exists(self.target):
+                    shutil.rmtree(self.target)
+                if self.copy_live:
+                    print(f"Copying live index {self.live_directory} -> {self.target}...")
+                    shutil.copytree(self.live_directory, self.target)
+                else:
+                    print(f"Building fresh index at {self.target}...")
+                    os.makedirs(self.target)
+            self.checkpoint.open(self.resume)
+            self.vectorstore = open_vectorstore(self.target, self.embeddings, VECTOR_STORE)
+        return self.vectorstore
+
+    def write_batch(self, ids, vectors, documents):
+        # Called from the pipeline's worker thread, one batch at a time
+        vector_writer(self.open())(ids, vectors, documents)
+
+async def warm_generation(tenant, target, vectorstore, lexical_index, embeddings, precompute: bool):
+    """
+    Embeds the suggested questions and profile queries into the shared embedding
+    cache, so API workers warm up without calling OpenAI, and optionally stores
+    answers to the suggested questions in the new generation (warmup.json).
+    """
+    texts = warmup_texts(tenant)
+    await embeddings.aembed_documents(texts)
+    print(f"Pre-embedded {len(texts)} warm-up questions and profile queries.")
+    path = os.path.join(target, WARMUP_FILE)
+    if os.path.exists(path):
+        os.remove(path)  # copied from the live generation; its answers are stale now
+    if not precompute:
+        return
+    questions = suggested_questions(tenant)
+    print(f"Precomputing answers to {len(questions)} suggested questions...")
+    try:
+        retriever = LLMService.build_retriever(vectorstore, lexical_index)
+        write_warmup_file(target, await precompute_answers(questions, retriever, tenant))
     except Exception as e:
-        print(f"Error loading LinkedIn: {e}")
-
-    print(f"Checking for local documents in {LOCAL_DATA_FOLDER}...")
-    if os.path.exists(LOCAL_DATA_FOLDER):
-        local_docs = []
-        for filename in os.listdir(LOCAL_DATA_FOLDER):
-            file_path = os.path.join(LOCAL_DATA_FOLDER, filename)
-            
-            if os.path.isfile(file_path) and filename.endswith((".md", ".txt")):
-                try:
-                    print(f"   - Loading: {filename}")
-                    loader = TextLoader(file_path, encoding='utf-8')
-                    docs = loader.load()
-                    
-                    for doc in docs:
-                        doc.metadata["source"] = f"Local File: {filename}"
-                    
-                    local_docs.extend(docs)
-                except Exception as e:
-                    print(f"   ! Failed to load {filename}: {e}")
-        
-        documents.extend(local_docs)
-        print(f"Loaded {len(local_docs)} local documents.")
+        print(f"WARNING: Could not precompute answers, the API will generate them on demand: {e}")
+
+async def build(sources, dry_run: bool = False, full: bool = False, tenant: str = DEFAULT_TENANT,
+                precompute_answers: bool = WARMUP_PRECOMPUTE_ANSWERS):
+    """
+    Streams load -> split -> embed -> write. Chunks are embedded as soon as they
+    are split, while other sources are still loading. Loading, splitting and
+    embedding hold only the files and batches in flight, but the run is not
+    bounded overall: the BM25 index keeps every chunk's text (what the API
+    holds in memory when serving this generation) and the previous chunks are
+    read back whole before loading starts, then handed to it source by source.
+    Each tenant has its own generations and marker; the embedding cache is shared.
+    Before publishing, the warm-up questions are embedded (and optionally answered).
+    """
+    paths = tenant_paths(tenant)
+    live_state = read_generation(paths.generation_file, paths.persist_directory)
+    live_directory = live_state["persist_directory"]
+    old_manifest = None if full else load_manifest(live_directory)
+    if old_manifest and old_manifest.get("embedding_model") != EMBEDDING_MODEL:
+        print("Embedding model changed since last ingest. Rebuilding from scratch.")
+        old_manifest = None
+    if old_manifest and old_manifest.get("vector_store", "chroma") != VECTOR_STORE:
+        print(f"Vector store backend changed to '{VECTOR_STORE}'. Rebuilding from scratch.")
+        old_manifest = None
+    old_ids = {i for entry in (old_manifest or {}).get("sources", {}).values() for i in entry["ids"]}
+
+    # Build the next generation beside the live one; the API keeps serving the old index meanwhile
+    target = next_generation_directory(int(live_state["generation"]) + 1, paths.index_root)
+    build_key = hashlib.sha256(
+        f"{live_directory}|{EMBEDDING_MODEL}|{VECTOR_STORE}|{NUMPY_STORE_DTYPE}|{bool(old_manifest)}|"
+        f"{[s.name for s in sources]}".encode("utf-8")
+    ).hexdigest()
+    checkpoint = Checkpoint(os.path.join(target, CHECKPOINT_NAME), build_key)
+    resume = not dry_run and checkpoint.load()
+    embeddings = None if dry_run else get_cached_embeddings()
+    generation = GenerationTarget(target, live_directory, bool(old_manifest), checkpoint, resume, embeddings)
+
+    carried = previous_chunks(live_directory, old_manifest)
+    context = SourceContext((old_manifest or {}).get("source_state"), carried)
+
+    occurrences = defaultdict(int)
+    source_ids = defaultdict(list)
+    lexical_index = BM25Index()
+
+    async def changed_chunks():
+        async for doc in aiter_chunks(sources, context=context):
+            if isinstance(doc, LoadUnit):
+                # Unchanged file: its chunks (already embedded) are carried over unread
+                for old in carried.pop(doc.source, ()):
+                    source_ids[doc.source].append(old.id)
+                    lexical_index.add(old)
+                continue
+            assign_chunk_id(doc, occurrences)
+            source_ids[doc.metadata.get("source", "Unknown")].append(doc.id)
+            lexical_index.add(doc)
+            if doc.id not in old_ids:
+                yield doc
+
+    print("Loading, splitting and embedding new/changed chunks as they stream in...")
+    if dry_run:
+        async for _ in changed_chunks():
+            pass
     else:
-        print(f"Notice: Folder '{LOCAL_DATA_FOLDER}' does not exist. Create it to add local text files.")
+        pipeline = EmbeddingPipeline(embeddings, generation.write_batch, checkpoint=checkpoint)
+        try:
+            stats = await pipeline.run(changed_chunks())
+        finally:
+            checkpoint.close()
+        print(
+            f"Embedded {stats['chunks']} chunks in {stats['batches']} batches "
+            f"({stats['skipped']} resumed from checkpoint, {stats['retries']} retries)."
+        )
 
-    # Split Text
-    if not documents:
+    total_chunks = sum(len(ids) for ids in source_ids.values())
+    if not total_chunks:
         print("No documents found to ingest.")
         return
+    print(f"Total chunks created: {total_chunks}")
+
+    source_state = {s.name: s.state for s in sources if getattr(s, "state", None)}
+    new_manifest = build_manifest(source_ids, source_state)
+    to_embed, to_delete, report = diff_manifests(old_manifest, new_manifest)
+    # Chunks embedded by an interrupted run whose content has since changed
+    to_delete |= checkpoint.done - {i for ids in source_ids.values() for i in ids}
+    print_report(report, to_embed, to_delete)
+
+    if dry_run:
+        print("Dry run: no changes written.")
+        return report
+    if old_manifest and generation.vectorstore is None and not to_delete:
+        if new_manifest["source_state"] != old_manifest.get("source_state"):
+            # e.g. a new git commit that touched no indexed file: diff from it next time
+            save_manifest(live_directory, {**old_manifest, "source_state": new_manifest["source_state"]})
+        print("Index is already up to date.")
+        return report
+
+    vectorstore = generation.open()
+    checkpoint.close()
+    if to_delete:
+        print(f"Deleting {len(to_delete)} stale chunks...")
+        vectorstore.delete(ids=sorted(to_delete))
+    persist_vectorstore(vectorstore)
+    if embeddings is not None and EMBEDDING_CACHE_ENABLED:
+        cache_stats = get_embedding_cache().stats()
+        print(
+            f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+            f"{cache_stats['bytes'] / 1024 / 1024:.1f} MB stored."
+        )
+
+    print("Saving BM25 lexical index...")
+    lexical_index.finalize()
+    lexical_index.save(target)
+    await warm_generation(tenant, target, vectorstore, lexical_index, embeddings, precompute_answers)
+
+    save_manifest(target, new_manifest)
+    checkpoint.close(remove=True)
 
-    print(f"Splitting {len(documents)} total documents...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(documents)
-    print(f"Total chunks created: {len(splits)}")
-
-    # Embed and Store
-    print("Generating embeddings and Storing in ChromaDB...")
-    embedding_function = get_embeddings()
-    
-    vectorstore = Chroma.from_documents(
-        documents=splits,
-        embedding=embedding_function,
-        persist_directory=PERSIST_DIRECTORY
+    # Atomic swap: running API workers pick the new generation up on their next refresh
+    state = write_generation(
+        target, paths.generation_file, chunks=total_chunks, embedded=len(to_embed), deleted=len(to_delete)
     )
+    prune_generations(target, paths.index_root)
+    # Releases Chroma's client for the directory; it is cached per path string for the whole process
+    close_vectorstore(vectorstore)
+    print(f"Success! Generation {state['generation']} of tenant '{tenant}' published at {target}.")
+    return report
 
-    print("Success! Database created.")
+def main(dry_run: bool = False, full: bool = False, sources_file: str = None, tenant: str = DEFAULT_TENANT,
+         precompute_answers: bool = WARMUP_PRECOMPUTE_ANSWERS):
+    return asyncio.run(build(
+        get_sources(sources_file, tenant), dry_run=dry_run, full=full, tenant=tenant,
+        precompute_answers=precompute_answers,
+    ))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Incrementally ingest profile sources into the vector store.")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing anything.")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-embed every chunk.")
+    parser.add_argument("--sources", help="JSON list of sources (default: the tenant's ingest_sources.json if present).")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="Persona to ingest for (tenants/<tenant>/).")
+    parser.add_argument("--all-tenants", action="store_true", help="Ingest every tenant, one after another.")
+    parser.add_argument("--precompute-answers", action="store_true", default=WARMUP_PRECOMPUTE_ANSWERS,
+                        help="Answer the suggested questions now (LLM calls) so the API serves them instantly.")
+    args = parser.parse_args()
+    for tenant in (list_tenants() if args.all_tenants else [args.tenant]):
+        print(f"=== Tenant '{tenant}' ===")
+        try:
+            main(dry_run=args.dry_run, full=args.full, sources_file=args.sources, tenant=tenant,
+                 precompute_answers=args.precompute_answers)
+        except FileNotFoundError as e:
+            print(f"Skipping: {e}")
@@ -1,9 +1,26 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import chat, documents
+from fastapi.responses import JSONResponse, PlainTextResponse
+from core.tenants import UnknownTenantError
+from services.metrics import TracingMiddleware, metrics, tenant_latency
+from services.startup import StartupGate, startup
+
+# Only light modules are imported here so the port binds fast; the routers (LangChain,
+# OpenAI, the vector store, python-docx) are imported in the background by services/startup.py
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Routers, shared clients, the vector store, warm-up and batch workers load after the port is bound
+    startup.begin(app)
+    yield
+    await startup.aclose()
 
-app = FastAPI(title="OlajCodes AI Agent", version="4.0.0")
+app = FastAPI(title="OlajCodes AI Agent", version="4.0.0", lifespan=lifespan)
 
+# API requests arriving before the routers are loaded wait for them
+app.add_middleware(StartupGate, fastapi_app=app)
 # CORS Setup
 app.add_middleware(
     CORSMiddleware,
@@ -12,11 +29,50 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Request IDs, per-request latency and optional JSON logs
+app.add_middleware(TracingMiddleware)
 
-# Include Routers
-app.include_router(chat.router)
-app.include_router(documents.router)
+@app.exception_handler(UnknownTenantError)
+async def unknown_tenant_handler(request, exc):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
 
 @app.get("/")
 async def health_check():
-    return {"status": "active", "message": "Backend Running"}
\ No newline at end of file
+    """503 until the routers are loaded and warm-up is over, so load balancers hold traffic back from a cold worker."""
+    if not startup.loaded:
+        body = {"status": "failed" if startup.error else "starting", "message": "Backend Running", "ready": False,
+                "startup": startup.status()}
+        return JSONResponse(status_code=503, content=body)
+
+    # Already imported with the routers
+    from services.registry import registry
+    from services.warmup_service import warmup
+
+    body = {
+        "status": "active" if warmup.ready else "warming",
+        "message": "Backend Running",
+        "index_generation": registry.generation,
+        "ready": warmup.ready,
+        "warmup": warmup.status(),
+        "startup": startup.status(),
+    }
+    return JSONResponse(status_code=200 if warmup.ready else 503, content=body)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition of the request and pipeline-stage histograms."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/tenants/stats")
+async def tenant_stats():
+    """Loaded tenant indexes (approximate memory, open time) and per-tenant request latency."""
+    from services.registry import registry
+
+    return {"indexes": registry.tenant_stats(), "latency": tenant_latency.stats()}
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """LLM slots in use, wait-queue depth, rejections, rate-limited requests and coalesced calls."""
+    from services.admission import admission
+
+    return admission.stats()
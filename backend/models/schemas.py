@@ -1,17 +1,61 @@
 # Pydantic models
 
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+
+from core.config import RETRIEVER_MAX_K
 
 class Message(BaseModel):
     role: str
     content: str
     
+class RetrievalOptions(BaseModel):
+    k: Optional[int] = Field(None, ge=1, le=RETRIEVER_MAX_K)
+    vector_weight: Optional[float] = Field(None, ge=0)
+    lexical_weight: Optional[float] = Field(None, ge=0)
+
 class ChatRequest(BaseModel):
     question: str
     history: Optional[List[Message]] = []
     model: Optional[str] = "gpt-4o-mini"
+    retrieval: Optional[RetrievalOptions] = None
+    # Lets the server reuse the rolling history summary across turns
+    conversation_id: Optional[str] = None
+    # Persona to answer as (tenants/<tenant>/); the default persona when omitted
+    tenant: Optional[str] = None
     
 class DocRequest(BaseModel):
     job_description: str
-    model: Optional[str] = "gpt-4o-mini"
\ No newline at end of file
+    model: Optional[str] = "gpt-4o-mini"
+    tenant: Optional[str] = None
+
+class BatchDocRequest(BaseModel):
+    job_descriptions: List[str]
+    documents: List[Literal["cv", "cover_letter"]] = ["cv", "cover_letter"]
+    model: Optional[str] = "gpt-4o-mini"
+    tenant: Optional[str] = None
+
+class Persona(BaseModel):
+    """Prompt configuration of one tenant, read from tenants/<tenant>/persona.json."""
+    name: str
+    handle: Optional[str] = None
+    headline: str = "Software Engineer"
+    expertise: str = "Software Engineering"
+    possessive: str = "their"  # pronoun used in the prompts ("showcase their expertise")
+    subject: Optional[str] = None  # how later sentences refer to the persona ("assume he has graduated"); name if unset
+    roles: str = "Software Engineer"
+    tech: str = ""
+    # Fields the relevance gate accepts, and examples of roles it refuses
+    relevant_fields: str = "Software, Tech, AI, Data, or Engineering"
+    unrelated_examples: str = "Nurse, Chef, Driver, HR"
+    # The CV prompt's own relevance check; each falls back to the field above it when unset
+    core_domain: Optional[str] = None  # -> expertise
+    cv_unrelated_examples: Optional[str] = None  # -> unrelated_examples
+    relevance_profile: Optional[str] = None  # who the relevance gate compares against -> "name (headline)"
+    featured_project: Optional[str] = None
+    cited_project: Optional[str] = None  # the system prompt's citation example -> featured_project
+    # Persona-specific rules appended to the CV / cover letter instructions ("{today}" is replaced)
+    cv_notes: List[str] = []
+    cover_letter_notes: List[str] = []
+    suggested_questions: List[str] = []  # "{name}" is replaced; empty means the deployment's list
+    file_prefix: Optional[str] = None
\ No newline at end of file
@@ -0,0 +1,176 @@
+# This is for the batch CV/Cover Letter endpoints (many job descriptions in one job)
+
+import asyncio
+import io
+import json
+import re
+import zipfile
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from models.schemas import BatchDocRequest, DocRequest
+from routers.chat import sse_event
+from routers.documents import docx_response, file_name, file_response, write_cover_letter, write_cv
+from services.admission import admission, background, client_id
+from services.batch_service import BatchItemRefused, BatchQueueFullError, batch_queue, dedup_key
+from services.doc_service import DocService, spooled_file
+from services.llm_service import LLMService
+from services.metrics import span
+from services.registry import registry
+from core.config import BATCH_MAX_ITEMS
+from core.prompts import PROFILE_QUERIES
+from core.tenants import get_persona
+
+router = APIRouter()
+
+DOCUMENT_FILES = {"cv": "CV_Tailored.docx", "cover_letter": "Cover_Letter.docx"}
+WRITERS = {"cv": write_cv, "cover_letter": write_cover_letter}
+
+
+def item_label(job_description: str) -> str:
+    """Folder name for one JD in the ZIP: its first line (usually the title or company), slugged."""
+    first_line = next((line for line in job_description.splitlines() if line.strip()), "")
+    return re.sub(r"\W+", "_", first_line).strip("_")[:40] or "Job"
+
+
+def make_handler(documents, model: str, tenant: str, file_names, contexts):
+    """The per-JD work of a batch: the requested documents in parallel, rendered to DOCX as file_names[kind]."""
+
+    async def generate(job_description: str):
+        request = DocRequest(job_description=job_description, model=model, tenant=tenant)
+        # Batch items queue for LLM slots instead of being turned away like interactive requests
+        with background():
+            tasks = [asyncio.create_task(WRITERS[kind](request, tenant, contexts[kind])) for kind in documents]
+        try:
+            texts = await asyncio.gather(*tasks)
+        except HTTPException as he:
+            if he.status_code == 400:
+                raise BatchItemRefused(he.detail)
+            raise
+        finally:
+            # A refusal on one side makes the other side's work pointless
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        rendered = await asyncio.gather(*(registry.run_blocking(DocService.render_docx, text) for text in texts))
+        return {file_names[kind]: data for kind, data in zip(documents, rendered)}
+
+    return generate
+
+
+def build_batch_zip(job):
+    """
+    Every generated DOCX, one folder per distinct JD, plus results.json with each
+    item's outcome, as a spooled file positioned at 0 (large batches spill to disk).
+    """
+    archive = spooled_file()
+    with span("build_batch_zip"):
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            for item in job.items:
+                if item.duplicate_of is not None:
+                    continue
+                folder = f"{item.index + 1:03d}_{item_label(item.payload)}"
+                for name, data in item.files.items():
+                    zf.writestr(f"{folder}/{name}", data)
+            zf.writestr("results.json", json.dumps(job.snapshot(), indent=2))
+    archive.seek(0)
+    return archive
+
+
+def get_job(job_id: str):
+    job = batch_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired batch job '{job_id}'.")
+    return job
+
+
+@router.post("/batch/documents", status_code=202)
+async def create_batch(request: BatchDocRequest, http_request: Request):
+    """
+    Queues one job for many JDs and returns at once. Duplicate JDs are generated
+    once, and the profile context is retrieved once for the whole batch. Each
+    distinct JD costs one request from the client's rate limit.
+    """
+    tenant = registry.resolve_tenant(request.tenant)
+    job_descriptions = [jd for jd in request.job_descriptions if jd.strip()]
+    documents = list(dict.fromkeys(request.documents))
+    if not job_descriptions or not documents:
+        raise HTTPException(status_code=400, detail="Provide at least one job description and one document type.")
+    if len(job_descriptions) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} job descriptions per batch.")
+    admission.check_rate(client_id(http_request), cost=len({dedup_key(jd) for jd in job_descriptions}))
+    try:
+        contexts = {}
+        for kind in documents:
+            contexts[kind] = await LLMService.get_profile_context(PROFILE_QUERIES[kind], tenant)
+        # Named once from the persona at submission, so a later persona.json edit does not orphan the files
+        persona = get_persona(tenant)
+        file_names = {kind: file_name(persona, DOCUMENT_FILES[kind]) for kind in documents}
+        handler = make_handler(documents, request.model, tenant, file_names, contexts)
+        job = batch_queue.submit(
+            job_descriptions, handler, tenant=tenant, documents=documents, file_names=file_names,
+            zip_name=file_name(persona, "Batch_Applications.zip"),
+        )
+    except BatchQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        print(f"Batch Submit Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "job_id": job.id,
+        "state": job.state,
+        "items": len(job.items),
+        "unique": len(job.unique),
+        "status_url": f"/batch/{job.id}",
+        "events_url": f"/batch/{job.id}/events",
+        "zip_url": f"/batch/{job.id}/zip",
+    }
+
+
+@router.get("/batch/{job_id}")
+async def batch_status(job_id: str):
+    return get_job(job_id).snapshot()
+
+
+@router.get("/batch/{job_id}/events")
+async def batch_events(job_id: str):
+    """Server-sent events: one `item` per JD as it finishes (finished ones replayed first), then `done`."""
+    job = get_job(job_id)
+
+    async def event_generator():
+        async for event, data in job.events_stream():
+            yield sse_event(event, data)
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+@router.get("/batch/{job_id}/items/{index}/{document}")
+async def batch_item_document(job_id: str, index: int, document: str):
+    job = get_job(job_id)
+    if not 0 <= index < len(job.items) or document not in DOCUMENT_FILES:
+        raise HTTPException(status_code=404, detail="No such item or document.")
+    item = job.items[index]
+    name = job.meta["file_names"].get(document)
+    if name not in item.files:
+        raise HTTPException(status_code=409, detail=f"Item {index} is {item.status}; no {document} available.")
+    return docx_response(io.BytesIO(item.files[name]), name)
+
+
+@router.get("/batch/{job_id}/zip")
+async def batch_zip(job_id: str):
+    job = get_job(job_id)
+    if not job.finished:
+        raise HTTPException(status_code=409, detail=f"Batch job is {job.state}; poll /batch/{job_id} until done.")
+    try:
+        archive = await registry.run_blocking(build_batch_zip, job)
+    except Exception as e:
+        print(f"Batch Zip Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return file_response(archive, "application/zip", job.meta["zip_name"])
+
+
+@router.delete("/batch/{job_id}")
+async def cancel_batch(job_id: str):
+    get_job(job_id)
+    return (await batch_queue.cancel(job_id)).snapshot()
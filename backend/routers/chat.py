@@ -1,56 +1,225 @@
 # This is for the chat endpoints
 
+import json
+import time
 from datetime import datetime
-from fastapi import APIRouter, HTTPException
-from operator import itemgetter
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 
 from models.schemas import ChatRequest
 from services.llm_service import LLMService
-from core.prompts import system_prompt_text
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage
+from services.admission import admission, rate_limited
+from services.cache_service import response_cache
+from services.history_service import has_earlier_question, history_manager
+from services.registry import registry
+from services.embedding_cache import get_embedding_cache
+from services.metrics import count_event, span
+from services.warmup_service import sources_of, suggested_questions, warmup
+from core.config import EMBEDDING_CACHE_ENABLED, RESPONSE_CACHE_ENABLED
 from langchain_core.output_parsers import StrOutputParser
 
 router = APIRouter()
 
-@router.post("/chat")
+
+async def get_retriever(request: ChatRequest, tenant: str):
+    options = request.retrieval
+    if options is None:
+        return await LLMService.get_retriever(tenant=tenant)
+    return await LLMService.get_retriever(
+        k=options.k, vector_weight=options.vector_weight, lexical_weight=options.lexical_weight, tenant=tenant
+    )
+
+
+def is_first_message(request: ChatRequest) -> bool:
+    """No earlier user turn: the frontend sends its greeting and the new question as history."""
+    return not has_earlier_question(request.question, request.history)
+
+
+async def lookup_cached(request: ChatRequest, tenant: str):
+    """
+    (cacheable, generation, question vector, cached (answer, sources) or None).
+    Answers only depend on the question on a first message without custom retrieval;
+    the question is embedded only when the exact lookup misses.
+    """
+    cacheable = RESPONSE_CACHE_ENABLED and is_first_message(request) and request.retrieval is None
+    if not cacheable:
+        return False, None, None, None
+    generation = registry.get_generation(tenant)
+    cached = response_cache.get_exact(request.question, request.model, generation, tenant, with_sources=True)
+    question_vector = None
+    if cached is None:
+        question_vector = await registry.get_embeddings().aembed_query(request.question)
+        cached = response_cache.get_similar(question_vector, request.model, generation, tenant, with_sources=True)
+    count_event("response_cache_hit" if cached is not None else "response_cache_miss")
+    return True, generation, question_vector, cached
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/chat", dependencies=[Depends(rate_limited)])
 async def chat_endpoint(request: ChatRequest):
+    tenant = registry.resolve_tenant(request.tenant)
     try:
-        retriever = LLMService.get_retriever()
+        retriever = await get_retriever(request, tenant)
         llm = LLMService.get_llm(request.model)
-        
-        today_str = datetime.now().strftime("%B %d, %Y") 
-
-        chat_history_objects = []
-        if request.history:
-            for msg in request.history:
-                if msg.role.lower() == "user":
-                    chat_history_objects.append(HumanMessage(content=msg.content))
-                elif msg.role.lower() == "assistant":
-                    chat_history_objects.append(AIMessage(content=msg.content))
-        
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("system", system_prompt_text),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{question}"),
-        ])
-        
-        chain = (
-            {
-                "context": itemgetter("question") | retriever | LLMService.format_docs,
-                "chat_history": lambda x: chat_history_objects,
-                "current_date": lambda x: today_str, 
-                "question": itemgetter("question")
-            }
-            | prompt_template
-            | llm
-            | StrOutputParser()
-        )
-        
+        prompt_template = LLMService.get_prompt_template(tenant)
+
+        cacheable, generation, question_vector, cached = await lookup_cached(request, tenant)
+        if cached is not None:
+            print(f"Cache hit: {request.question}")
+            return {"answer": cached[0]}
+
+        # Turn the request away before retrieval if the LLM queue is already full
+        admission.check_capacity(request.model)
+
+        # After the cache lookup: compaction and query rewriting may call the LLM
+        today_str = datetime.now().strftime("%B %d, %Y")
+        chat_history_objects, retrieval_query = await history_manager.prepare(request, tenant)
+
+        chain = prompt_template | llm | StrOutputParser()
+
         print(f"Processing query: {request.question}")
-        response = chain.invoke({"question": request.question})
+        start = time.perf_counter()
+        with span("chat_chain"):
+            # The cache lookup already embedded the question; retrieval reuses that vector
+            query_vector = question_vector if retrieval_query == request.question else None
+            docs = await retriever.ainvoke(retrieval_query, query_vector=query_vector)
+            response = await chain.ainvoke({
+                "context": LLMService.format_docs(docs),
+                "chat_history": chat_history_objects,
+                "current_date": today_str,
+                "question": request.question,
+            })
+
+        if cacheable:
+            response_cache.put(
+                request.question, request.model, generation, response,
+                vector=question_vector, cost_seconds=time.perf_counter() - start, tenant=tenant,
+                sources=sources_of(docs),
+            )
         return {"answer": response}
 
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        print(f"Chat Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/chat/cache-stats")
+async def cache_stats():
+    stats = response_cache.stats()
+    if EMBEDDING_CACHE_ENABLED:
+        stats["embedding_cache"] = get_embedding_cache().stats()
+    stats["history"] = history_manager.stats()
+    return stats
+
+
+@router.get("/suggested-questions")
+async def suggested_questions_endpoint(tenant: str = None):
+    """Starter questions for the chat UI; these are the ones warmed up (and possibly precomputed)."""
+    tenant = registry.resolve_tenant(tenant)
+    return {"questions": suggested_questions(tenant)}
+
+
+@router.post("/chat/stream", dependencies=[Depends(rate_limited)])
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Server-Sent Events variant of /chat. Event order:
+    - sources: retrieved chunk metadata, sent before generation starts
+    - token:   one per streamed chunk of the answer
+    - done:    timings (retrieval_ms, ttft_ms, total_ms); precomputed or cached answers are flagged
+    - error:   sent instead of done if generation fails mid-stream
+
+    Shares the response cache with /chat: hits are replayed as one token event,
+    and a fully streamed answer is stored under the same gating.
+    """
+    tenant = registry.resolve_tenant(request.tenant)
+    precomputed = None
+    if request.retrieval is None and is_first_message(request):
+        precomputed = warmup.precomputed(request.question, request.model, tenant)
+    cacheable, generation, question_vector, cached = False, None, None, None
+    try:
+        retriever = await get_retriever(request, tenant)
+        llm = LLMService.get_llm(request.model)
+        prompt_template = LLMService.get_prompt_template(tenant)
+        if precomputed is None:
+            cacheable, generation, question_vector, cached = await lookup_cached(request, tenant)
     except Exception as e:
         print(f"Chat Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+    if precomputed is None and cached is None:
+        # Refuse with a 503 now rather than as an error event once the stream has started
+        admission.check_capacity(request.model)
+
+    async def replay(answer, sources, flag):
+        start = time.perf_counter()
+        yield sse_event("sources", sources or [])
+        yield sse_event("token", answer)
+        total_ms = round((time.perf_counter() - start) * 1000, 1)
+        yield sse_event("done", {"retrieval_ms": 0.0, "ttft_ms": total_ms, "total_ms": total_ms, flag: True})
+
+    async def event_stream():
+        start = time.perf_counter()
+        try:
+            print(f"Processing streamed query: {request.question}")
+            chat_history, retrieval_query = await history_manager.prepare(request, tenant)
+            with span("retrieval"):
+                # Reuse the vector embedded for the cache lookup, as /chat does
+                query_vector = question_vector if retrieval_query == request.question else None
+                docs = await retriever.ainvoke(retrieval_query, query_vector=query_vector)
+            retrieval_ms = (time.perf_counter() - start) * 1000
+            sources = sources_of(docs)
+            yield sse_event("sources", sources)
+
+            chain = prompt_template | llm | StrOutputParser()
+            inputs = {
+                "context": LLMService.format_docs(docs),
+                "chat_history": chat_history,
+                "current_date": datetime.now().strftime("%B %d, %Y"),
+                "question": request.question,
+            }
+
+            ttft_ms = None
+            tokens = []
+            async for token in chain.astream(inputs):
+                if not token:
+                    continue
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - start) * 1000
+                tokens.append(token)
+                yield sse_event("token", token)
+
+            total_ms = (time.perf_counter() - start) * 1000
+            if cacheable:
+                response_cache.put(
+                    request.question, request.model, generation, "".join(tokens),
+                    vector=question_vector, cost_seconds=total_ms / 1000, tenant=tenant, sources=sources,
+                )
+            print(f"Stream timings: retrieval={retrieval_ms:.0f}ms ttft={ttft_ms or 0:.0f}ms total={total_ms:.0f}ms")
+            yield sse_event("done", {
+                "retrieval_ms": round(retrieval_ms, 1),
+                "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+                "total_ms": round(total_ms, 1),
+            })
+        except Exception as e:
+            print(f"Chat Stream Error: {e}")
+            yield sse_event("error", {"detail": str(e)})
+
+    if precomputed is not None:
+        # A suggested question answered at warm-up: no retrieval or generation needed
+        count_event("precomputed_answer_hit")
+        body = replay(precomputed["answer"], precomputed["sources"], "precomputed")
+    elif cached is not None:
+        print(f"Cache hit: {request.question}")
+        body = replay(*cached, "cached")
+    else:
+        body = event_stream()
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
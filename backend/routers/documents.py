@@ -1,158 +1,275 @@
 # This is for the CV/Cover Letter endpoints
 
+import asyncio
+import os
+import re
+import zipfile
 from datetime import datetime
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 
-from models.schemas import DocRequest
+from models.schemas import DocRequest, Persona
 from services.llm_service import LLMService
-from services.doc_service import DocService
-from core.prompts import CV_STRUCTURE_TEMPLATE, COVER_LETTER_TEMPLATE
+from services.admission import rate_limited
+from services.doc_service import DocService, spooled_file
+from services.metrics import span
+from services.registry import registry
+from core.config import DEFAULT_TENANT
+from core.prompts import DEFAULT_PERSONA, PROFILE_QUERIES, cover_letter_template_for, cv_structure_for
+from core.tenants import get_persona
 
 router = APIRouter()
 
-@router.post("/generate-cv")
-async def generate_cv(request: DocRequest):
-    try:
-        retriever = LLMService.get_retriever()
-        llm = LLMService.get_llm(request.model)
-        
-        today_str = datetime.now().strftime("%B %d, %Y")
-        docs = retriever.invoke("My full professional experience, technical skills, and projects")
-        context_text = LLMService.format_docs(docs)
-
-        cv_prompt = f"""
-        You are an expert Career Coach. 
-        
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+def refusal_detail(persona: Persona) -> str:
+    return f"Job description is not relevant to {persona.name}'s skillset. Generation refused."
+
+
+def file_name(persona: Persona, suffix: str) -> str:
+    prefix = persona.file_prefix or re.sub(r"\W+", "_", persona.name).strip("_") or "Profile"
+    return f"{prefix}_{suffix}"
+
+
+def numbered_rules(rules, today_str: str) -> str:
+    """
+    Generic and persona-specific rules as one numbered list; persona notes may use {today}.
+    A blank line follows each multi-line rule, as in the original hand-written lists.
+    """
+    rules = [rule.replace("{today}", today_str) for rule in rules]
+    lines = []
+    for i, rule in enumerate(rules, 1):
+        lines.append(f"        {i}. {rule}")
+        if "\n" in rule and i < len(rules):
+            lines.append("")
+    return "\n".join(lines)
+
+
+def build_cv_prompt(job_description: str, context_text: str, today_str: str, persona: Persona = DEFAULT_PERSONA) -> str:
+    rules = numbered_rules(persona.cv_notes + [
+        "**Summary:** Tailor the Professional Summary to the JD. Highlight years of experience and key tech.",
+        "**Structure:** Follow the template below exactly.",
+    ], today_str)
+    core_domain = persona.core_domain or persona.expertise
+    unrelated_examples = persona.cv_unrelated_examples or persona.unrelated_examples
+    return f"""
+        You are an expert Career Coach.
+
         TODAY'S DATE: {today_str}
-        
+
         STEP 1: RELEVANCE CHECK
-        Compare the Job Description (JD) below with Olajide's Skills Context.
-        - Olajide's Core Domain: AI Engineering, Python, Backend, Machine Learning.
-        - If the JD is for a completely unrelated role (e.g., Nurse, Accountant, Chef), output ONLY: "NO_MATCH"
-        
+        Compare the Job Description (JD) below with {persona.name}'s Skills Context.
+        - {persona.name}'s Core Domain: {core_domain}.
+        - If the JD is for a completely unrelated role (e.g., {unrelated_examples}), output ONLY: "NO_MATCH"
+
         STEP 2: GENERATION (Only if Match)
         If the role fits, generate a CV using the EXACT structure below.
-        
+
         ### CRITICAL RULES:
-        1. **Education Status:** Compare my graduation date (e.g., July 2025) with Today's Date ({today_str}). 
-           - Since the graduation date is in the past, I have **GRADUATED**.
-           - **NEVER** write "Currently pursuing". 
-           - Instead, start the summary with: "Computer Science Graduate..." or "AI Engineer with..."
-        
-        2. **Summary:** Tailor the Professional Summary to the JD. Highlight years of experience and key tech.
-        3. **Structure:** Follow the template below exactly.
-        
+{rules}
+
         ### CV STRUCTURE:
-        {CV_STRUCTURE_TEMPLATE}
+        {cv_structure_for(persona)}
 
         ---
         ### JOB DESCRIPTION:
-        "{request.job_description}"
-        
+        "{job_description}"
+
         ### SKILLS CONTEXT:
         {context_text}
         """
 
-        print("Analyzing JD and Generating CV...")
-        ai_response = llm.invoke(cv_prompt).content
 
-        # 3. Check for Refusal
-        if "NO_MATCH" in ai_response:
-            raise HTTPException(status_code=400, detail="Job description is not relevant to Olajide's skillset. Generation refused.")
+def relevance_profile(persona: Persona) -> str:
+    return persona.relevance_profile or f"{persona.name} ({persona.headline})"
 
-        # 4. Convert to File
-        docx_file = DocService.create_docx_from_text(ai_response)
 
-        return StreamingResponse(
-            docx_file, 
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            headers={"Content-Disposition": "attachment; filename=Olajide_CV_Tailored.docx"}
-        )
+def build_relevance_prompt(job_description: str, persona: Persona = DEFAULT_PERSONA) -> str:
+    return f"""
+        You are a Career Relevance Analyzer.
 
-    except HTTPException as he:
-        raise he
-    except Exception as e:
-        print(f"CV Gen Error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        YOUR TASK:
+        Determine if the Job Description (JD) below matches the profile of {relevance_profile(persona)}.
 
+        {persona.name.upper()}'S PROFILE:
+        - Roles: {persona.roles}.
+        - Tech: {persona.tech}.
 
-@router.post("/generate-cover-letter")
-async def generate_cover_letter(request: DocRequest):
-    try:
-        today_str = datetime.now().strftime("%B %d, %Y")
-        
-        retriever = LLMService.get_retriever()
-        llm = LLMService.get_llm(request.model)
-        docs = retriever.invoke("My full professional experience, motivation, and soft skills")
-        context_text = LLMService.format_docs(docs)
-
-        check_prompt = f"""
-        You are a Career Relevance Analyzer.
-        
-        YOUR TASK:
-        Determine if the Job Description (JD) below matches the profile of an AI Engineer/Python Developer.
-        
-        OLAJIDE'S PROFILE:
-        - Roles: AI Engineer, Backend Developer, Data Scientist.
-        - Tech: Python, FastAPI, React, RAG, LLMs, OpenAI, Vector DBs.
-        
         ### COVER LETTER STRUCTURE:
-        {COVER_LETTER_TEMPLATE}
-        
+        {cover_letter_template_for(persona)}
+
         JOB DESCRIPTION:
-        {request.job_description}
-        
+        {job_description}
+
         INSTRUCTIONS:
-        - If the job is related to Software, Tech, AI, Data, or Engineering -> Return "YES"
-        - If the job is completely unrelated (e.g. Nurse, Chef, Driver, HR) -> Return "NO"
+        - If the job is related to {persona.relevant_fields} -> Return "YES"
+        - If the job is completely unrelated (e.g. {persona.unrelated_examples}) -> Return "NO"
         - Be lenient. If there is a partial skill match, Return "YES".
-        
+
         Output strictly one word: YES or NO.
         """
-        
-        print("Checking Relevance...")
-        relevance_check = llm.invoke(check_prompt).content.strip().upper()
 
-        if "NO" in relevance_check:
-             raise HTTPException(status_code=400, detail="Job description is not relevant to Olajide's skillset. Generation refused.")
 
+def build_cover_letter_prompt(job_description: str, context_text: str, today_str: str,
+                              persona: Persona = DEFAULT_PERSONA) -> str:
+    rules = numbered_rules([
+        f"""**Header Formatting:** - Replace [Date] with "{today_str}".
+           - Extract the Company Name from the JD and replace [Company Name].
+           - If NO Company Name is found, delete the [Company Name] line entirely.""",
+        *persona.cover_letter_notes,
+        "**Tone:** Confident, professional, enthusiastic.",
+        "**Length:** Keep it under 350 words.",
+    ], today_str)
+    return f"""
+        You are {persona.name}. Write a professional, persuasive cover letter for this job.
 
-        write_prompt = f"""
-        You are Olajide. Write a professional, persuasive cover letter for this job.
-        
         CONTEXT (My Skills & Experience):
         {context_text}
-        
+
         JOB DESCRIPTION:
-        "{request.job_description}"
-        
+        "{job_description}"
+
         CURRENT DATE: {today_str}
 
         INSTRUCTIONS:
-        1. **Header Formatting:** - Replace [Date] with "{today_str}".
-           - Extract the Company Name from the JD and replace [Company Name]. 
-           - If NO Company Name is found, delete the [Company Name] line entirely.
-        
-        2. **Chronology & Accuracy:** - Look at dates in the context. 
-           - **TIIDELab** was an internship in the past. Do NOT refer to it as "recent" or "current".
-           - Focus heavily on my **current** work: 'xplainify-ai', 'Nelfund Navigator', 'Fiscal Sentinel', and my AI Engineering training.
-        
-        3. **Tone:** Confident, professional, enthusiastic.
-        4. **Length:** Keep it under 350 words.
-        
+{rules}
+
         OUTPUT:
         Return ONLY the body of the letter (starting from the Date). Do not include any markdown code blocks.
         """
-   
-        cover_letter_content = llm.invoke(write_prompt).content
-        
-        docx = DocService.create_docx_from_text(cover_letter_content)
-        
-        return StreamingResponse(
-            docx, 
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            headers={"Content-Disposition": "attachment; filename=Olajide_Cover_Letter.docx"}
-        )
+
+
+async def write_cv(request: DocRequest, tenant: str = DEFAULT_TENANT, context_text: str = None) -> str:
+    """
+    Returns the CV markdown, or raises a 400 HTTPException if the JD is out of scope.
+    `context_text` lets a batch pass the profile context it retrieved once for all its JDs.
+    """
+    llm = LLMService.get_llm(request.model)
+    persona = get_persona(tenant)
+    today_str = datetime.now().strftime("%B %d, %Y")
+    if context_text is None:
+        context_text = await LLMService.get_profile_context(PROFILE_QUERIES["cv"], tenant)
+
+    print("Analyzing JD and Generating CV...")
+    with span("write_cv"):
+        prompt = build_cv_prompt(request.job_description, context_text, today_str, persona)
+        ai_response = (await llm.ainvoke(prompt)).content
+
+    # Check for Refusal
+    if "NO_MATCH" in ai_response:
+        raise HTTPException(status_code=400, detail=refusal_detail(persona))
+    return ai_response
+
+
+async def write_cover_letter(request: DocRequest, tenant: str = DEFAULT_TENANT, context_text: str = None) -> str:
+    """
+    Runs the relevance gate and the letter generation concurrently. The letter
+    is discarded (and its call cancelled if still running) when the gate says NO.
+    """
+    llm = LLMService.get_llm(request.model)
+    persona = get_persona(tenant)
+    today_str = datetime.now().strftime("%B %d, %Y")
+    if context_text is None:
+        context_text = await LLMService.get_profile_context(PROFILE_QUERIES["cover_letter"], tenant)
+
+    print("Checking Relevance and Writing Cover Letter...")
+    gate = asyncio.create_task(llm.ainvoke(build_relevance_prompt(request.job_description, persona)))
+    writer = asyncio.create_task(
+        llm.ainvoke(build_cover_letter_prompt(request.job_description, context_text, today_str, persona))
+    )
+    try:
+        with span("relevance_gate"):
+            relevance_check = (await gate).content.strip().upper()
+        if "NO" in relevance_check:
+            raise HTTPException(status_code=400, detail=refusal_detail(persona))
+        with span("write_cover_letter"):
+            return (await writer).content
+    finally:
+        if not writer.done():
+            writer.cancel()
+
+
+def file_response(file, media_type: str, filename: str):
+    """Streams a file (positioned at 0) in chunks, closing it once sent; read on a worker thread."""
+    size = file.seek(0, os.SEEK_END)
+    file.seek(0)
+    return StreamingResponse(
+        DocService.iter_file(file),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}", "Content-Length": str(size)}
+    )
+
+
+def docx_response(file, filename: str):
+    return file_response(file, DOCX_MEDIA_TYPE, filename)
+
+
+@router.post("/generate-cv", dependencies=[Depends(rate_limited)])
+async def generate_cv(request: DocRequest):
+    tenant = registry.resolve_tenant(request.tenant)
+    try:
+        ai_response = await write_cv(request, tenant)
+
+        # Convert to File (off the event loop)
+        docx_file = await registry.run_blocking(DocService.open_docx, ai_response)
+        return docx_response(docx_file, file_name(get_persona(tenant), "CV_Tailored.docx"))
+
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        print(f"CV Gen Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/generate-cover-letter", dependencies=[Depends(rate_limited)])
+async def generate_cover_letter(request: DocRequest):
+    tenant = registry.resolve_tenant(request.tenant)
+    try:
+        cover_letter_content = await write_cover_letter(request, tenant)
+
+        docx_file = await registry.run_blocking(DocService.open_docx, cover_letter_content)
+        return docx_response(docx_file, file_name(get_persona(tenant), "Cover_Letter.docx"))
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        print(f"Cover Letter Gen Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def build_application_zip(cv_text: str, cover_letter_text: str, persona: Persona = DEFAULT_PERSONA):
+    """The ZIP as a spooled file positioned at 0."""
+    archive = spooled_file()
+    with span("build_application_zip"):
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(file_name(persona, "CV_Tailored.docx"), DocService.render_docx(cv_text))
+            zf.writestr(file_name(persona, "Cover_Letter.docx"), DocService.render_docx(cover_letter_text))
+    archive.seek(0)
+    return archive
+
+
+@router.post("/generate-application", dependencies=[Depends(rate_limited)])
+async def generate_application(request: DocRequest):
+    """Generates the tailored CV and cover letter in parallel and returns both in one ZIP."""
+    tenant = registry.resolve_tenant(request.tenant)
+    try:
+        persona = get_persona(tenant)
+        cv_task = asyncio.create_task(write_cv(request, tenant))
+        cover_letter_task = asyncio.create_task(write_cover_letter(request, tenant))
+        try:
+            cv_text, cover_letter_text = await asyncio.gather(cv_task, cover_letter_task)
+        finally:
+            # A refusal on one side makes the other side's work pointless
+            for task in (cv_task, cover_letter_task):
+                if not task.done():
+                    task.cancel()
+
+        archive = await registry.run_blocking(build_application_zip, cv_text, cover_letter_text, persona)
+        return file_response(archive, "application/zip", file_name(persona, 'Application.zip'))
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        print(f"Application Gen Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
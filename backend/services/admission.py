@@ -0,0 +1,368 @@
+# This handles admission control: LLM concurrency limits, a bounded wait queue, per-client rate limits and request coalescing
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+
+from fastapi import HTTPException, Request
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable
+
+from core.config import (
+    LLM_COALESCE,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_QUEUE,
+    LLM_MODEL_CONCURRENCY,
+    LLM_QUEUE_TIMEOUT_SECONDS,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_MAX_CLIENTS,
+    RATE_LIMIT_PER_MINUTE,
+    RATE_LIMIT_TRUST_FORWARDED,
+)
+from services.metrics import count_event, span
+
+# Background work (batch jobs, warm-up) waits for a slot however long the queue is
+background_var = contextvars.ContextVar("admission_background", default=False)
+
+
+class AdmissionRejected(HTTPException):
+    """No LLM slot is free and the wait queue is full (or the wait timed out). Surfaces as a 503."""
+
+    def __init__(self, detail: str, retry_after: float = 1.0):
+        super().__init__(status_code=503, detail=detail, headers={"Retry-After": str(math.ceil(retry_after))})
+
+
+@contextmanager
+def background():
+    """LLM calls made inside wait for a slot instead of being rejected."""
+    token = background_var.set(True)
+    try:
+        yield
+    finally:
+        background_var.reset(token)
+
+
+def prompt_key(model_name: str, prompt, kwargs) -> str:
+    """Identical model + messages + call options -> identical key; used to coalesce calls."""
+    if hasattr(prompt, "to_messages"):
+        prompt = prompt.to_messages()
+    elif isinstance(prompt, str):
+        prompt = [prompt]
+    parts = [[m.type, m.content] if isinstance(m, BaseMessage) else repr(m) for m in prompt]
+    payload = json.dumps([model_name, parts, sorted((k, repr(v)) for k, v in kwargs.items())], default=repr)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Flight:
+    """One LLM call in flight and the callers sharing it."""
+
+    def __init__(self):
+        self.task = None
+        self.waiters = 0
+        self.chunks = []  # streamed calls: every chunk so far, replayed to late joiners
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Condition()
+
+    def leave(self):
+        self.waiters -= 1
+        if self.waiters == 0 and not self.task.done():
+            # Everyone waiting on it went away (client disconnect, refusal)
+            self.task.cancel()
+
+
+class AdmissionController:
+    """
+    Sits between the routers and the LLM clients (the registry wraps every LLM
+    in AdmittedLLM):
+    - a global semaphore and one per model bound the LLM calls in flight
+    - callers that find no free slot wait in a bounded queue; once max_queue
+      are waiting, or after queue_timeout_seconds, they get a 503 right away
+      instead of piling up behind an overloaded upstream
+    - concurrent calls with the same prompt share one upstream call (and one
+      stream); the call is cancelled when its last caller goes away
+    - per-client token buckets cap how fast one client can start LLM requests
+
+    Semaphores are created lazily for the running event loop.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, model_concurrency=None,
+                 max_queue: int = LLM_MAX_QUEUE, queue_timeout_seconds: float = LLM_QUEUE_TIMEOUT_SECONDS,
+                 coalesce: bool = LLM_COALESCE, rate_per_minute: float = RATE_LIMIT_PER_MINUTE,
+                 burst: int = RATE_LIMIT_BURST, max_clients: int = RATE_LIMIT_MAX_CLIENTS):
+        self.max_concurrency = max_concurrency
+        self.model_concurrency = dict(LLM_MODEL_CONCURRENCY if model_concurrency is None else model_concurrency)
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.coalesce = coalesce
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.max_clients = max_clients
+
+        self._loop = None
+        self._global = None
+        self._models = {}
+        self._flights = {}
+        self._buckets = OrderedDict()  # client -> [tokens, last refill], least recently seen first
+        self.in_flight = {}  # model -> calls holding a slot
+        self.waiting = 0
+        self.max_waiting = 0
+        self.counters = {
+            "admitted": 0, "queued": 0, "coalesced": 0,
+            "rejected_queue_full": 0, "rejected_timeout": 0, "rate_limited": 0,
+        }
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._global = asyncio.Semaphore(self.max_concurrency)
+            self._models = {}
+            self._flights = {}
+            self.in_flight = {}
+            self.waiting = 0
+
+    def _model_limit(self, model: str) -> asyncio.Semaphore:
+        limit = self._models.get(model)
+        if limit is None:
+            limit = self._models[model] = asyncio.Semaphore(self.model_concurrency.get(model, self.max_concurrency))
+        return limit
+
+    def _reject(self, reason: str, detail: str):
+        self.counters[f"rejected_{reason}"] += 1
+        count_event(f"admission_rejected_{reason}")
+        raise AdmissionRejected(detail, retry_after=max(1.0, self.queue_timeout_seconds / 2))
+
+    # --- Concurrency and queueing ---
+    def check_capacity(self, model: str):
+        """Raises AdmissionRejected now if a call to `model` would be rejected (used before streaming starts)."""
+        self._bind_loop()
+        busy = self._global.locked() or self._model_limit(model).locked()
+        if busy and not background_var.get() and self.waiting >= self.max_queue:
+            self._reject("queue_full", f"Server busy: {self.waiting} requests already waiting for the LLM.")
+
+    async def _acquire(self, model_limit: asyncio.Semaphore):
+        # Model slot first, so waiting on a busy model never holds a global slot
+        await model_limit.acquire()
+        try:
+            await self._global.acquire()
+        except BaseException:
+            model_limit.release()
+            raise
+
+    @asynccontextmanager
+    async def slot(self, model: str):
+        """Holds one global and one per-model LLM slot for the duration of the block."""
+        self._bind_loop()
+        model_limit = self._model_limit(model)
+        if not (self._global.locked() or model_limit.locked()):
+            await self._acquire(model_limit)
+        else:
+            background = background_var.get()
+            if not background and self.waiting >= self.max_queue:
+                self._reject("queue_full", f"Server busy: {self.waiting} requests already waiting for the LLM.")
+            self.counters["queued"] += 1
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            try:
+                with span("admission_wait"):
+                    await asyncio.wait_for(
+                        self._acquire(model_limit), None if background else self.queue_timeout_seconds
+                    )
+            except asyncio.TimeoutError:
+                self._reject("timeout", f"Server busy: no LLM slot within {self.queue_timeout_seconds:.0f}s.")
+            finally:
+                self.waiting -= 1
+        self.counters["admitted"] += 1
+        self.in_flight[model] = self.in_flight.get(model, 0) + 1
+        try:
+            yield
+        finally:
+            self.in_flight[model] -= 1
+            self._global.release()
+            model_limit.release()
+
+    # --- Calls ---
+    async def invoke(self, model: str, key: str, call):
+        """Awaits call() under a slot; concurrent callers with the same key share one call."""
+        if not self.coalesce:
+            async with self.slot(model):
+                return await call()
+        self._bind_loop()
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = Flight()
+            flight.task = asyncio.create_task(self._run(model, key, flight, call))
+        else:
+            self.counters["coalesced"] += 1
+            count_event("llm_coalesced")
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.leave()
+
+    async def _run(self, model: str, key: str, flight: Flight, call):
+        try:
+            async with self.slot(model):
+                return await call()
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def stream(self, model: str, key: str, call):
+        """Yields call()'s chunks under a slot; concurrent callers with the same key share one stream."""
+        if not self.coalesce:
+            async with self.slot(model):
+                async for chunk in call():
+                    yield chunk
+            return
+        self._bind_loop()
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = Flight()
+            flight.task = asyncio.create_task(self._pump(model, key, flight, call))
+        else:
+            self.counters["coalesced"] += 1
+            count_event("llm_coalesced")
+        flight.waiters += 1
+        sent = 0
+        try:
+            while True:
+                async with flight.changed:
+                    await flight.changed.wait_for(lambda: len(flight.chunks) > sent or flight.done)
+                    new, done = flight.chunks[sent:], flight.done
+                for chunk in new:
+                    yield chunk
+                sent += len(new)
+                if done and sent == len(flight.chunks):
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            flight.leave()
+
+    async def _pump(self, model: str, key: str, flight: Flight, call):
+        try:
+            async with self.slot(model):
+                async for chunk in call():
+                    async with flight.changed:
+                        flight.chunks.append(chunk)
+                        flight.changed.notify_all()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            async with flight.changed:
+                flight.done = True
+                flight.changed.notify_all()
+
+    # --- Per-client rate limits ---
+    def take(self, client: str, cost: float = 1.0) -> float:
+        """
+        Takes `cost` tokens from the client's bucket. Returns 0 when allowed, else
+        the seconds until it would be. A cost above the burst is allowed on a full
+        bucket and leaves it in debt, so large batches are paced, not refused.
+        """
+        if self.rate_per_minute <= 0:
+            return 0.0
+        now = time.monotonic()
+        rate = self.rate_per_minute / 60
+        bucket = self._buckets.pop(client, None) or [float(self.burst), now]
+        bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        self._buckets[client] = bucket
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        needed = min(cost, self.burst)
+        if bucket[0] >= needed:
+            bucket[0] -= cost
+            return 0.0
+        return (needed - bucket[0]) / rate
+
+    def check_rate(self, client: str, cost: float = 1.0):
+        wait = self.take(client, cost)
+        if wait > 0:
+            self.counters["rate_limited"] += 1
+            count_event("admission_rate_limited")
+            raise HTTPException(
+                status_code=429, detail="Too many requests; slow down.",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+    def stats(self):
+        return {
+            "in_flight": dict(self.in_flight),
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "coalescing": len(self._flights),
+            "clients": len(self._buckets),
+            "limits": {
+                "max_concurrency": self.max_concurrency,
+                "model_concurrency": self.model_concurrency,
+                "max_queue": self.max_queue,
+                "queue_timeout_seconds": self.queue_timeout_seconds,
+                "rate_per_minute": self.rate_per_minute,
+                "burst": self.burst,
+            },
+            **self.counters,
+        }
+
+
+admission = AdmissionController()
+
+
+class AdmittedLLM(Runnable):
+    """A chat model behind the admission controller; drop-in wherever the model itself was used."""
+
+    def __init__(self, llm, model_name: str, controller: AdmissionController = admission):
+        self.llm = llm
+        self.model_name = model_name
+        self.controller = controller
+
+    @property
+    def InputType(self):
+        return self.llm.InputType
+
+    @property
+    def OutputType(self):
+        return self.llm.OutputType
+
+    def invoke(self, input, config=None, **kwargs):
+        # Sync calls (scripts, ingest) never run on the API's event loop
+        return self.llm.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        key = prompt_key(self.model_name, input, kwargs)
+        return await self.controller.invoke(self.model_name, key, lambda: self.llm.ainvoke(input, config, **kwargs))
+
+    async def astream(self, input, config=None, **kwargs):
+        key = prompt_key(self.model_name, input, kwargs)
+        async for chunk in self.controller.stream(
+            self.model_name, key, lambda: self.llm.astream(input, config, **kwargs)
+        ):
+            yield chunk
+
+
+def client_id(request: Request) -> str:
+    """
+    The client's IP. Under uvicorn --proxy-headers, request.client is already the address
+    the trusted proxy reported; RATE_LIMIT_TRUST_FORWARDED reads X-Forwarded-For directly,
+    for proxies uvicorn is not told about (the header is client-supplied, so only behind one).
+    """
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+async def rate_limited(request: Request):
+    """Router dependency: one token per request from the client's bucket, else 429."""
+    admission.check_rate(client_id(request))
@@ -0,0 +1,268 @@
+# This handles batch jobs: an in-process queue that fans many inputs out to a handler with bounded concurrency
+
+import asyncio
+import hashlib
+import re
+import time
+import uuid
+from collections import OrderedDict
+
+from core.config import (
+    BATCH_ITEM_CONCURRENCY,
+    BATCH_JOB_TTL_SECONDS,
+    BATCH_MAX_JOBS,
+    BATCH_MAX_QUEUED,
+    BATCH_WORKERS,
+)
+
+
+class BatchQueueFullError(Exception):
+    """Too many jobs are waiting; the client should retry later."""
+
+
+class BatchItemRefused(Exception):
+    """Raised by a handler when an input is rejected on its merits (not a failure)."""
+
+
+def dedup_key(text: str) -> str:
+    """Inputs that differ only in case or whitespace are the same unit of work."""
+    return hashlib.sha256(re.sub(r"\s+", " ", text).strip().casefold().encode("utf-8")).hexdigest()
+
+
+class BatchItem:
+    __slots__ = ("index", "payload", "key", "status", "detail", "duplicate_of", "files", "seconds")
+
+    def __init__(self, index: int, payload: str, key: str):
+        self.index = index
+        self.payload = payload
+        self.key = key
+        self.status = "queued"
+        self.detail = None
+        self.duplicate_of = None  # index of the item whose result this one shares
+        self.files = {}  # file name -> bytes
+        self.seconds = None
+
+    def summary(self):
+        result = {"index": self.index, "status": self.status, "files": list(self.files)}
+        if self.detail is not None:
+            result["detail"] = self.detail
+        if self.duplicate_of is not None:
+            result["duplicate_of"] = self.duplicate_of
+        if self.seconds is not None:
+            result["seconds"] = self.seconds
+        return result
+
+
+class BatchJob:
+    """
+    One submitted batch. Items with the same dedup key share one run of the
+    handler; every finished item appends an event, which `events_stream()` replays to
+    any number of listeners and then follows live until the job is over.
+    """
+
+    def __init__(self, payloads, handler, meta=None):
+        self.id = uuid.uuid4().hex
+        self.handler = handler
+        self.meta = meta or {}
+        self.state = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.items = []
+        self.unique = []  # first item of each dedup key; only these are run
+        first = {}
+        for index, payload in enumerate(payloads):
+            item = BatchItem(index, payload, dedup_key(payload))
+            if item.key in first:
+                item.duplicate_of = first[item.key].index
+            else:
+                first[item.key] = item
+                self.unique.append(item)
+            self.items.append(item)
+        self.events = []
+        self._changed = asyncio.Condition()
+        self._task = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "cancelled")
+
+    def counts(self):
+        counts = {}
+        for item in self.items:
+            counts[item.status] = counts.get(item.status, 0) + 1
+        return counts
+
+    def snapshot(self):
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "items": len(self.items),
+            "unique": len(self.unique),
+            "counts": self.counts(),
+            "created_at": self.created_at,
+            "seconds": round((self.finished_at or time.time()) - (self.started_at or time.time()), 3),
+            "results": [item.summary() for item in self.items],
+            **self.meta,
+        }
+
+    async def _publish(self, event):
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def events_stream(self):
+        """Every event so far, then new ones as they happen, until the job is over."""
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.events) > sent)
+                new = self.events[sent:]
+            for event in new:
+                yield event
+            sent += len(new)
+            if new[-1][0] == "done":
+                return
+
+    async def _finish_item(self, item: BatchItem, status: str, detail=None, files=None, seconds=None):
+        for each in self.items:
+            if each is item or each.duplicate_of == item.index:
+                each.status = status
+                each.detail = detail
+                each.files = files or {}
+                each.seconds = seconds
+                await self._publish(("item", each.summary()))
+
+    async def _run_item(self, item: BatchItem, limit: asyncio.Semaphore):
+        async with limit:
+            for each in self.items:
+                if each is item or each.duplicate_of == item.index:
+                    each.status = "running"
+            start = time.perf_counter()
+            try:
+                files = await self.handler(item.payload)
+            except asyncio.CancelledError:
+                raise
+            except BatchItemRefused as e:
+                await self._finish_item(item, "refused", str(e), seconds=round(time.perf_counter() - start, 3))
+                return
+            except Exception as e:
+                print(f"WARNING: Batch {self.id} item {item.index} failed: {e}")
+                await self._finish_item(item, "failed", str(e), seconds=round(time.perf_counter() - start, 3))
+                return
+            await self._finish_item(item, "done", files=files, seconds=round(time.perf_counter() - start, 3))
+
+    async def run(self, concurrency: int):
+        self.state = "running"
+        self.started_at = time.time()
+        limit = asyncio.Semaphore(concurrency)
+        try:
+            await asyncio.gather(*(self._run_item(item, limit) for item in self.unique))
+            self.state = "done"
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+            for item in self.items:
+                if item.status in ("queued", "running"):
+                    item.status = "cancelled"
+        finally:
+            self.finished_at = time.time()
+            await self._publish(("done", {"job_id": self.id, "state": self.state, "counts": self.counts()}))
+
+
+class BatchQueue:
+    """
+    In-process job queue: `submit` returns at once, BATCH_WORKERS jobs run at a
+    time with up to BATCH_ITEM_CONCURRENCY items each, and finished jobs stay
+    available for polling and downloads until they expire. State lives in the
+    worker process, so with several API workers a client must poll the worker
+    that accepted its job (sticky sessions).
+    """
+
+    def __init__(self, workers: int = BATCH_WORKERS, concurrency: int = BATCH_ITEM_CONCURRENCY,
+                 max_queued: int = BATCH_MAX_QUEUED, max_jobs: int = BATCH_MAX_JOBS,
+                 ttl_seconds: float = BATCH_JOB_TTL_SECONDS):
+        self.workers = workers
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self._jobs = OrderedDict()  # job_id -> BatchJob, oldest first
+        self._queue = None
+        self._tasks = []
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def aclose(self):
+        running = [job._task for job in self._jobs.values() if job._task is not None and not job._task.done()]
+        for task in running + self._tasks:
+            task.cancel()
+        await asyncio.gather(*running, *self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.finished:  # cancelled while queued
+                    continue
+                job._task = asyncio.create_task(job.run(self.concurrency))
+                # Shielded: cancelling the job (DELETE) must not take the worker down with it
+                await asyncio.shield(job._task)
+            finally:
+                self._queue.task_done()
+
+    # --- Jobs ---
+    def submit(self, payloads, handler, **meta) -> BatchJob:
+        """Queues `handler(payload)` (async, returns {file name: bytes}) for each distinct payload."""
+        self.start()
+        self._evict()
+        queued = sum(1 for job in self._jobs.values() if job.state == "queued")
+        if queued >= self.max_queued:
+            raise BatchQueueFullError(f"{queued} batch jobs are already waiting; retry later.")
+        job = BatchJob(payloads, handler, meta)
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        print(f"INFO: Batch {job.id} queued: {len(job.items)} items, {len(job.unique)} unique")
+        return job
+
+    def get(self, job_id: str):
+        self._evict()
+        return self._jobs.get(job_id)
+
+    async def cancel(self, job_id: str):
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        if job._task is None:
+            # Still queued: the worker skips it when it comes up
+            job.state = "cancelled"
+            job.finished_at = time.time()
+            for item in job.items:
+                item.status = "cancelled"
+            await job._publish(("done", {"job_id": job.id, "state": job.state, "counts": job.counts()}))
+        else:
+            job._task.cancel()
+            await asyncio.gather(job._task, return_exceptions=True)
+        return job
+
+    def _evict(self):
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in finished:
+            if now - job.finished_at > self.ttl_seconds or len(self._jobs) > self.max_jobs:
+                del self._jobs[job.id]
+
+    def stats(self):
+        states = {}
+        for job in self._jobs.values():
+            states[job.state] = states.get(job.state, 0) + 1
+        return {"jobs": states, "workers": self.workers, "item_concurrency": self.concurrency}
+
+
+batch_queue = BatchQueue()
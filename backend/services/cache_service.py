@@ -0,0 +1,229 @@
+# This handles the semantic response cache in front of the chat chain
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from core.config import (
+    DEFAULT_TENANT,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_SIMILARITY,
+    RESPONSE_CACHE_TTL_SECONDS,
+)
+
+
+def normalize_question(text: str) -> str:
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+class CacheEntry:
+    __slots__ = ("answer", "sources", "created_at", "cost_seconds", "pinned")
+
+    def __init__(self, answer, cost_seconds, pinned=False, sources=None):
+        self.answer = answer
+        self.sources = sources
+        self.created_at = time.monotonic()
+        self.cost_seconds = cost_seconds
+        self.pinned = pinned
+
+
+class ResponseCache:
+    """
+    Two-level answer cache keyed by (normalized question, model, tenant):
+    1. exact match on the normalized question text
+    2. nearest neighbour over cached question embeddings (cosine >= threshold)
+
+    Entries expire after a TTL and the least recently used entry is evicted when
+    the cache is full. Pinned entries (precomputed warm-up answers) neither
+    expire nor get evicted. A tenant's entries are dropped when its index
+    generation changes, so answers built on a stale corpus are never served.
+
+    Lookups return the answer, or (answer, sources) with with_sources=True for
+    the streaming endpoint, which sends the sources before the answer.
+
+    Question vectors live in one preallocated matrix (a row per entry, freed
+    rows reused), so a semantic lookup is a single matrix-vector product with
+    no per-request copying; each row is tagged with its (model, tenant) group.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+                 similarity_threshold=RESPONSE_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()
+        self._generations = {}  # tenant -> generation its entries were built on
+        self._matrix = None  # (capacity, dim) unit question vectors, allocated on the first put
+        self._row_group = None  # group id of each row, -1 when free
+        self._rows = {}  # key -> row
+        self._row_keys = []
+        self._free_rows = []
+        self._groups = {}  # (model, tenant) -> group id
+        self._lock = threading.Lock()
+        self.counters = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "seconds_saved": 0.0,
+        }
+
+    # --- Public API ---
+    def get_exact(self, question: str, model: str, generation, tenant: str = DEFAULT_TENANT,
+                  with_sources: bool = False):
+        key = (normalize_question(question), model, tenant)
+        with self._lock:
+            self._check_generation(tenant, generation)
+            entry = self._live_entry(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self._record_hit("exact_hits", entry)
+            return (entry.answer, entry.sources) if with_sources else entry.answer
+
+    def get_similar(self, vector, model: str, generation, tenant: str = DEFAULT_TENANT,
+                    with_sources: bool = False):
+        query = self._unit(vector)
+        with self._lock:
+            self._check_generation(tenant, generation)
+            group = self._groups.get((model, tenant))
+            if group is None or self._matrix is None or self._matrix.shape[1] != query.shape[0]:
+                self.counters["misses"] += 1
+                return None
+
+            scores = self._matrix @ query
+            scores[self._row_group != group] = -np.inf
+            # Best first; a candidate past its TTL is dropped and the next one tried
+            while True:
+                row = int(np.argmax(scores))
+                if scores[row] < self.similarity_threshold:
+                    break
+                key = self._row_keys[row]
+                entry = self._live_entry(key)
+                if entry is None:
+                    scores[row] = -np.inf
+                    continue
+                self._entries.move_to_end(key)
+                self._record_hit("semantic_hits", entry)
+                return (entry.answer, entry.sources) if with_sources else entry.answer
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, question: str, model: str, generation, answer: str, vector=None, cost_seconds: float = 0.0,
+            tenant: str = DEFAULT_TENANT, pinned: bool = False, sources=None):
+        key = (normalize_question(question), model, tenant)
+        entry = CacheEntry(answer, cost_seconds, pinned, sources)
+        with self._lock:
+            self._check_generation(tenant, generation)
+            previous = self._entries.get(key)
+            if previous is not None and previous.pinned and not pinned:
+                return
+            if previous is not None:
+                self._remove(key)
+            self._entries[key] = entry
+            if vector is not None:
+                self._store_vector(key, self._unit(vector))
+            excess = len(self._entries) - self.max_entries
+            if excess > 0:
+                victims = [k for k, e in self._entries.items() if not e.pinned][:excess]
+                for victim in victims:
+                    self._remove(victim)
+                    self.counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._matrix = self._row_group = None
+            self._rows = {}
+            self._row_keys = []
+            self._free_rows = []
+            self._groups = {}
+
+    def stats(self):
+        with self._lock:
+            hits = self.counters["exact_hits"] + self.counters["semantic_hits"]
+            lookups = hits + self.counters["misses"]
+            return {
+                **self.counters,
+                "seconds_saved": round(self.counters["seconds_saved"], 3),
+                "entries": len(self._entries),
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "generation": self._generations.get(DEFAULT_TENANT),
+                "tenants": len(self._generations),
+            }
+
+    # --- Internals ---
+    @staticmethod
+    def _unit(vector):
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _check_generation(self, tenant, generation):
+        if tenant in self._generations and self._generations[tenant] == generation:
+            return
+        stale = [key for key in self._entries if key[2] == tenant]
+        if stale:
+            self.counters["invalidations"] += 1
+        for key in stale:
+            self._remove(key)
+        self._generations[tenant] = generation
+        # Forget tenants with nothing cached so the map stays bounded by the cache size
+        if len(self._generations) > self.max_entries:
+            live = {key[2] for key in self._entries} | {tenant}
+            self._generations = {t: g for t, g in self._generations.items() if t in live}
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not entry.pinned and time.monotonic() - entry.created_at > self.ttl_seconds:
+            self._remove(key)
+            self.counters["expirations"] += 1
+            return None
+        return entry
+
+    def _remove(self, key):
+        del self._entries[key]
+        row = self._rows.pop(key, None)
+        if row is not None:
+            self._row_group[row] = -1
+            self._row_keys[row] = None
+            self._free_rows.append(row)
+
+    def _store_vector(self, key, vector):
+        if self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+            # First vector, or a different embedding size: start a fresh matrix
+            # (entries already cached stay reachable by exact match only)
+            capacity = max(self.max_entries, 1)
+            self._matrix = np.zeros((capacity, vector.shape[0]), dtype=np.float32)
+            self._row_group = np.full(capacity, -1, dtype=np.int64)
+            self._row_keys = [None] * capacity
+            self._rows = {}
+            self._free_rows = list(range(capacity - 1, -1, -1))
+        if not self._free_rows:
+            # Only pinned entries can push the cache past max_entries; grow by doubling
+            capacity = len(self._row_keys)
+            self._matrix = np.vstack([self._matrix, np.zeros_like(self._matrix)])
+            self._row_group = np.concatenate([self._row_group, np.full(capacity, -1, dtype=np.int64)])
+            self._row_keys += [None] * capacity
+            self._free_rows = list(range(2 * capacity - 1, capacity - 1, -1))
+        row = self._free_rows.pop()
+        self._matrix[row] = vector
+        self._row_group[row] = self._groups.setdefault(key[1:], len(self._groups))
+        self._row_keys[row] = key
+        self._rows[key] = row
+
+    def _record_hit(self, counter, entry):
+        self.counters[counter] += 1
+        self.counters["seconds_saved"] += entry.cost_seconds
+
+
+response_cache = ResponseCache()
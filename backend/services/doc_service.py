@@ -1,85 +1,278 @@
 # This handles word document creation
 
+import hashlib
 import io
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
 from docx import Document
+from docx.oxml.ns import qn
 from docx.shared import Pt, RGBColor
+from docx.enum.style import WD_STYLE_TYPE
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 
+from core.config import DOCX_CACHE_MAX_ENTRIES, DOCX_SPOOL_MAX_BYTES, DOCX_STREAM_CHUNK_SIZE
+from services.metrics import count_event, span
+
+HEADING_COLOR = RGBColor(0, 51, 102)  # Dark Blue
+# Paragraph styles used by the renderer, resolved once per document
+STYLE_NAMES = ['List Bullet', 'List Paragraph'] + [f'Heading {level}' for level in range(1, 7)]
+
+# One pass per line: optional block marker, then the body
+_BLOCK_RE = re.compile(
+    r"^(?:(?P<heading>#{1,6})\s+|(?P<bullet>[-*+])\s+|(?P<number>\d+[.)])\s+)?(?P<body>.*)$"
+)
+_RULE_RE = re.compile(r"^([-*_])\1{2,}$")
+_INLINE_RE = re.compile(r"(\*\*\*|\*\*|\*)")
+
+
+def tokenize_blocks(text: str):
+    """
+    Yields (kind, level, body) per non-empty line, where kind is one of
+    heading, bullet, number, paragraph. For numbered items, level holds the
+    original "1." marker so the LLM's numbering is kept verbatim.
+    """
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line or _RULE_RE.match(line):
+            continue
+        match = _BLOCK_RE.match(line)
+        if match.group("heading"):
+            yield "heading", len(match.group("heading")), match.group("body")
+        elif match.group("bullet"):
+            yield "bullet", 0, match.group("body")
+        elif match.group("number"):
+            yield "number", match.group("number"), match.group("body")
+        else:
+            yield "paragraph", 0, line
+
+
+def tokenize_inline(text: str):
+    """
+    Splits markdown emphasis into (text, bold, italic) runs. Supports nesting
+    (**bold *both* bold**, ***both***). Unmatched markers and a lone '*'
+    surrounded by spaces are kept as literal text.
+    """
+    parts = _INLINE_RE.split(text)
+    tokens = []  # [kind, value]: kind is "text" or "marker"
+    for i, part in enumerate(parts):
+        if i % 2 == 0:
+            tokens.append(["text", part])
+        else:
+            before = parts[i - 1][-1:] if parts[i - 1] else " "
+            after = parts[i + 1][:1] if i + 1 < len(parts) and parts[i + 1] else " "
+            if part == "*" and before.isspace() and after.isspace():
+                tokens.append(["text", part])
+            else:
+                tokens.append(["marker", part])
+
+    # Demote the last unmatched bold / italic marker to literal text
+    for flag, markers in (("**", ("**", "***")), ("*", ("*", "***"))):
+        positions = [i for i, (kind, value) in enumerate(tokens) if kind == "marker" and value in markers]
+        if len(positions) % 2:
+            last = positions[-1]
+            value = tokens[last][1]
+            if value == "***":
+                other = "*" if flag == "**" else "**"
+                tokens[last] = ["marker", other]
+                tokens.insert(last + 1, ["text", flag])
+            else:
+                tokens[last] = ["text", value]
+
+    runs = []
+    bold = italic = False
+    for kind, value in tokens:
+        if kind == "text":
+            if value:
+                runs.append((value, bold, italic))
+        else:
+            if value in ("**", "***"):
+                bold = not bold
+            if value in ("*", "***"):
+                italic = not italic
+    return runs
+
+
+def _build_template():
+    """Pre-styled base document (as docx bytes): fonts, heading colours and alignment are set once here."""
+    doc = Document()
+
+    # Set Default Font
+    style = doc.styles['Normal']
+    style.font.name = 'Cambria'
+    style.font.size = Pt(12)
+
+    for level in (1, 2):
+        heading = doc.styles[f'Heading {level}']
+        heading.font.name = 'Cambria'
+        # Theme font attributes would otherwise override the explicit font name
+        rfonts = heading.element.rPr.rFonts
+        for attr in ("w:asciiTheme", "w:hAnsiTheme"):
+            rfonts.attrib.pop(qn(attr), None)
+        heading.font.bold = True
+        heading.font.color.rgb = HEADING_COLOR
+    # Center ONLY the main title (Level 1), Left align others
+    doc.styles['Heading 1'].paragraph_format.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    for level in range(2, 7):
+        doc.styles[f'Heading {level}'].paragraph_format.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+    # Documents never contain tables. Without the ~100 built-in table styles every clone is
+    # faster to parse and save, and so is `paragraph.style = ...`, which scans all styles
+    for style in list(doc.styles):
+        if style.type == WD_STYLE_TYPE.TABLE and style.name != 'Normal Table':
+            style.delete()
+
+    stream = io.BytesIO()
+    doc.save(stream)
+    return stream.getvalue()
+
+
+def spooled_file():
+    """Temporary file for a document or archive being built: in memory while small, on disk beyond DOCX_SPOOL_MAX_BYTES."""
+    return tempfile.SpooledTemporaryFile(max_size=DOCX_SPOOL_MAX_BYTES)
+
+
 class DocService:
+    """
+    Renders markdown-ish LLM text to .docx from a pre-styled template.
+    render_docx() returns bytes (for ZIP members and batch results); open_docx()
+    returns a file to stream from, so an uncached document is written to a
+    spooled temporary file and sent in chunks instead of as one buffer.
+    Documents that fit in the spool are kept in an LRU cache by content hash.
+    """
+
+    _template = None
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+    cache_hits = 0
+    cache_misses = 0
+
     @staticmethod
-    def create_docx_from_text(text: str):
+    def _new_document():
+        """A clone of the template, plus its paragraph styles by name (looked up once, not per paragraph)."""
+        if DocService._template is None:
+            with DocService._lock:
+                if DocService._template is None:
+                    DocService._template = _build_template()
+        doc = Document(io.BytesIO(DocService._template))
+        return doc, {name: doc.styles[name] for name in STYLE_NAMES}
+
+    @staticmethod
+    def _add_paragraph(doc, style=None):
+        p = doc.add_paragraph()
+        if style is not None:
+            p.style = style
+        return p
+
+    @staticmethod
+    def _add_runs(paragraph, text: str):
+        for value, bold, italic in tokenize_inline(text):
+            run = paragraph.add_run(value)
+            if bold:
+                run.font.bold = True
+            if italic:
+                run.font.italic = True
+
+    @staticmethod
+    def _render(text: str, out):
         """
         Docx generator that matches the reference image style:
         - Main Name Header (#): Centered
         - Contact Line (with '|'): Centered
         - Section Headers (##, ###): Left Aligned
+        - Bullets and numbered items: Left Aligned
         - Body Text: Justified
         """
-        doc = Document()
-        
-        # Set Default Font
-        style = doc.styles['Normal']
-        style.font.name = 'Cambria'
-        style.font.size = Pt(12)
-
-        lines = text.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            # --- HEADERS ---
-            if line.startswith('# ') or line.startswith('## ') or line.startswith('### '):
-                clean_text = line.replace('#', '').strip()
-                level = 1
-                if line.startswith('### '): level = 3
-                elif line.startswith('## '): level = 2
-                
-                heading = doc.add_heading(clean_text, level=level)
-                
-                # LOGIC: Center ONLY the main title (Level 1), Left align others
-                if level == 1:
-                    heading.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                else:
-                    heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                
-                # Styling for H1 & H2 (Dark Blue)
-                if level <= 2:
-                    run = heading.runs[0]
-                    run.font.color.rgb = RGBColor(0, 51, 102) 
-                    run.font.name = 'Cambria'
-                    run.font.bold = True
-                
-            # --- BULLET POINTS (Left Aligned) ---
-            elif line.startswith('- ') or line.startswith('* '):
-                clean_text = line[2:] 
-                p = doc.add_paragraph(style='List Bullet')
+        doc, styles = DocService._new_document()
+
+        for kind, level, body in tokenize_blocks(text):
+            if kind == "heading":
+                heading = DocService._add_paragraph(doc, styles[f'Heading {level}'])
+                DocService._add_runs(heading, body)
+
+            elif kind == "bullet":
+                p = DocService._add_paragraph(doc, styles['List Bullet'])
                 p.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                
-                parts = clean_text.split('**')
-                for i, part in enumerate(parts):
-                    run = p.add_run(part)
-                    if i % 2 == 1: 
-                        run.font.bold = True
-
-            # --- STANDARD PARAGRAPHS ---
+                DocService._add_runs(p, body)
+
+            elif kind == "number":
+                p = DocService._add_paragraph(doc, styles['List Paragraph'])
+                p.alignment = WD_ALIGN_PARAGRAPH.LEFT
+                DocService._add_runs(p, f"{level} {body}")
+
             else:
-                p = doc.add_paragraph()
-                
+                p = DocService._add_paragraph(doc)
                 # LOGIC: Center Contact Info line, Justify everything else
-                if '|' in line:
-                    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                else:
-                    p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-
-                parts = line.split('**')
-                for i, part in enumerate(parts):
-                    run = p.add_run(part)
-                    if i % 2 == 1:
-                        run.font.bold = True
-                
-        file_stream = io.BytesIO()
-        doc.save(file_stream)
-        file_stream.seek(0)
-        return file_stream
\ No newline at end of file
+                p.alignment = WD_ALIGN_PARAGRAPH.CENTER if '|' in body else WD_ALIGN_PARAGRAPH.JUSTIFY
+                DocService._add_runs(p, body)
+
+        doc.save(out)
+
+    @staticmethod
+    def _cached(key):
+        with DocService._lock:
+            data = DocService._cache.get(key)
+            if data is not None:
+                DocService._cache.move_to_end(key)
+                DocService.cache_hits += 1
+            else:
+                DocService.cache_misses += 1
+        count_event("docx_cache_hit" if data is not None else "docx_cache_miss")
+        return data
+
+    @staticmethod
+    def _store(key, data: bytes):
+        with DocService._lock:
+            DocService._cache[key] = data
+            while len(DocService._cache) > DOCX_CACHE_MAX_ENTRIES:
+                DocService._cache.popitem(last=False)
+
+    @staticmethod
+    def render_docx(text: str) -> bytes:
+        """Rendered .docx bytes, cached by content hash so identical text is rendered once."""
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        data = DocService._cached(key)
+        if data is not None:
+            return data
+        with span("render_docx"):
+            stream = io.BytesIO()
+            DocService._render(text, stream)
+            data = stream.getvalue()
+        DocService._store(key, data)
+        return data
+
+    @staticmethod
+    def open_docx(text: str):
+        """
+        The rendered .docx as a file positioned at 0 (the caller closes it).
+        A miss is saved straight into a spooled file; it is cached only if it
+        stayed in memory, larger documents are streamed from disk.
+        """
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        data = DocService._cached(key)
+        if data is not None:
+            return io.BytesIO(data)
+        out = spooled_file()
+        with span("render_docx"):
+            DocService._render(text, out)
+        if out.tell() <= DOCX_SPOOL_MAX_BYTES:
+            out.seek(0)
+            DocService._store(key, out.read())
+        out.seek(0)
+        return out
+
+    @staticmethod
+    def iter_file(file, chunk_size: int = DOCX_STREAM_CHUNK_SIZE):
+        """Streams a file in fixed-size chunks and closes it; only one chunk is read at a time."""
+        try:
+            while chunk := file.read(chunk_size):
+                yield chunk
+        finally:
+            file.close()
+
+    @staticmethod
+    def create_docx_from_text(text: str):
+        """File-like wrapper around render_docx() for callers that need a stream."""
+        return io.BytesIO(DocService.render_docx(text))
@@ -0,0 +1,226 @@
+# This handles the persistent embedding cache shared by ingest.py and the API
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from core.config import EMBEDDING_CACHE_MAX_BYTES, EMBEDDING_CACHE_PATH
+
+# Reads record last_access in memory; it is written with the next put, or once this many
+# rows or seconds have accumulated
+TOUCH_FLUSH_ROWS = 256
+TOUCH_FLUSH_SECONDS = 30.0
+# After another process wrote to the file, the size counter is re-read from the database
+# at most this often (and always before evicting)
+SIZE_RESYNC_SECONDS = 10.0
+
+
+def text_key(text: str) -> str:
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    SQLite store of float32 vectors keyed by (model, sha256 of normalized text).
+    Total size is capped at max_bytes; least recently used rows are evicted first.
+
+    Several processes share the file (API workers, ingest.py), so the byte count
+    kept here is only an estimate between re-reads from the database.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # A cache can lose its last commit on power loss; WAL stays consistent without an fsync per commit
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+            " last_access REAL NOT NULL, PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.commit()
+        self._touched = {}  # (model, key) -> last access not yet written
+        self._last_flush = time.monotonic()
+        self._sync_bytes()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get_many(self, model: str, keys: List[str]):
+        """Returns {key: vector} for the keys that are cached."""
+        found = {}
+        if not keys:
+            return found
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *chunk],
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32).tolist()
+            now = time.time()
+            for k in found:
+                self._touched[(model, k)] = now
+            if len(self._touched) >= TOUCH_FLUSH_ROWS or time.monotonic() - self._last_flush >= TOUCH_FLUSH_SECONDS:
+                self._flush_touched()
+                self._conn.commit()
+            hits = sum(1 for k in keys if k in found)
+            self.counters["hits"] += hits
+            self.counters["misses"] += len(keys) - hits
+        return found
+
+    def put_many(self, model: str, items):
+        """items: iterable of (key, vector)."""
+        now = time.time()
+        rows = [(model, key, np.asarray(vec, dtype=np.float32).tobytes(), now) for key, vec in items]
+        if not rows:
+            return
+        with self._lock:
+            for _, key, blob, _ in rows:
+                existing = self._conn.execute(
+                    "SELECT LENGTH(vector) FROM embeddings WHERE model = ? AND text_hash = ?", (model, key)
+                ).fetchone()
+                self._bytes += len(blob) - (existing[0] if existing else 0)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_access) VALUES (?, ?, ?, ?)", rows
+            )
+            self._flush_touched()
+            self._evict()
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                **self.counters,
+                "hit_ratio": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+    def _flush_touched(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                [(now, model, key) for (model, key), now in self._touched.items()],
+            )
+            self._touched = {}
+        self._last_flush = time.monotonic()
+
+    def _data_version(self):
+        # Changes only when another connection commits to the file
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _sync_bytes(self):
+        # A scan of every row header (~150ms at 512 MB), so not done on every put
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        self._synced_version = self._data_version()
+        self._last_sync = time.monotonic()
+
+    def _evict(self):
+        foreign_writes = self._data_version() != self._synced_version
+        if self._bytes > self.max_bytes or (foreign_writes and time.monotonic() - self._last_sync >= SIZE_RESYNC_SECONDS):
+            # Count what is actually stored, including other processes' rows
+            self._sync_bytes()
+        if self._bytes <= self.max_bytes:
+            return
+        # Drop the least recently used rows until we are 10% under the cap
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT model, text_hash, LENGTH(vector) FROM embeddings ORDER BY last_access ASC"
+        )
+        victims = []
+        for model, text_hash, size in rows:
+            if self._bytes <= target:
+                break
+            victims.append((model, text_hash))
+            self._bytes -= size
+        self._conn.executemany("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", victims)
+        self.counters["evictions"] += len(victims)
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps any Embeddings so only texts missing from the cache reach the model."""
+
+    def __init__(self, embeddings: Embeddings, model: str, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache
+
+    def _split(self, texts):
+        keys = [text_key(t) for t in texts]
+        cached = self.cache.get_many(self.model, keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        return keys, cached, missing
+
+    def _merge(self, keys, cached, missing, vectors):
+        fresh = dict(zip(missing.keys(), vectors))
+        self.cache.put_many(self.model, fresh.items())
+        cached.update(fresh)
+        return [cached[k] for k in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = self._split(texts)
+        vectors = self.embeddings.embed_documents(list(missing.values())) if missing else []
+        return self._merge(keys, cached, missing, vectors)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = text_key(text)
+        cached = self.cache.get_many(self.model, [key])
+        if key in cached:
+            return cached[key]
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many(self.model, [(key, vector)])
+        return vector
+
+    # The async variants keep SQLite (reads, writes and their commits) off the event loop
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = await asyncio.to_thread(self._split, texts)
+        vectors = await self.embeddings.aembed_documents(list(missing.values())) if missing else []
+        return await asyncio.to_thread(self._merge, keys, cached, missing, vectors)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = text_key(text)
+        cached = await asyncio.to_thread(self.cache.get_many, self.model, [key])
+        if key in cached:
+            return cached[key]
+        vector = await self.embeddings.aembed_query(text)
+        await asyncio.to_thread(self.cache.put_many, self.model, [(key, vector)])
+        return vector
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Process-wide cache instance, opened on first use."""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                _shared_cache = EmbeddingCache()
+    return _shared_cache
@@ -0,0 +1,212 @@
+# This handles the batched, rate-limited embedding stage used by ingest.py
+
+import asyncio
+import json
+import os
+import random
+import time
+
+from core.config import (
+    EMBED_BATCH_SIZE,
+    EMBED_MAX_CONCURRENCY,
+    EMBED_MAX_RETRIES,
+    EMBED_RPM,
+    EMBED_TPM,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; good enough for scheduling
+    return len(text) // 4 + 1
+
+
+class RateLimiter:
+    """
+    Token buckets for requests-per-minute and tokens-per-minute.
+    acquire() waits until both buckets can cover the next request.
+    """
+
+    def __init__(self, rpm: int = EMBED_RPM, tpm: int = EMBED_TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int):
+        # A single batch larger than the whole TPM budget waits for a full bucket
+        tokens = min(tokens, self.tpm)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait_requests = (1 - self._requests) * 60 / self.rpm if self._requests < 1 else 0
+                wait_tokens = (tokens - self._tokens) * 60 / self.tpm if self._tokens < tokens else 0
+                await asyncio.sleep(max(wait_requests, wait_tokens, 0.01))
+
+
+class Checkpoint:
+    """
+    Append-only record of chunk IDs already written to the vector store.
+    The first line identifies the build so a checkpoint from a different
+    build is never resumed.
+    """
+
+    def __init__(self, path: str, build_key: str):
+        self.path = path
+        self.build_key = build_key
+        self.done = set()
+        self._file = None
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            header = f.readline()
+            try:
+                if json.loads(header).get("build_key") != self.build_key:
+                    return False
+            except json.JSONDecodeError:
+                return False
+            for line in f:
+                line = line.strip()
+                if line:
+                    self.done.add(line)
+        return True
+
+    def open(self, resume: bool):
+        self._file = open(self.path, "a" if resume else "w", encoding="utf-8")
+        if not resume:
+            self._file.write(json.dumps({"build_key": self.build_key}) + "\n")
+            self._file.flush()
+
+    def record(self, ids):
+        self._file.write("".join(f"{i}\n" for i in ids))
+        self._file.flush()
+        self.done.update(ids)
+
+    def close(self, remove: bool = False):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def _aiter(iterable):
+    for item in iterable:
+        yield item
+
+
+class EmbeddingPipeline:
+    """
+    Embeds documents in batches with bounded concurrency and streams each
+    finished batch straight into the vector store through write_batch(ids,
+    vectors, documents). Only the batches in flight are held in memory.
+    """
+
+    def __init__(self, embeddings, write_batch, batch_size=EMBED_BATCH_SIZE,
+                 max_concurrency=EMBED_MAX_CONCURRENCY, max_retries=EMBED_MAX_RETRIES,
+                 rate_limiter=None, checkpoint=None):
+        self.embeddings = embeddings
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.checkpoint = checkpoint
+        self.stats = {"batches": 0, "chunks": 0, "skipped": 0, "retries": 0, "tokens": 0}
+
+    async def _batches(self, documents):
+        # Accepts lists and async generators, so embedding can start while loading is still running
+        if not hasattr(documents, "__aiter__"):
+            documents = _aiter(documents)
+        batch = []
+        async for doc in documents:
+            if self.checkpoint is not None and doc.id in self.checkpoint.done:
+                self.stats["skipped"] += 1
+                continue
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def _embed_with_retry(self, texts):
+        attempt = 0
+        while True:
+            tokens = sum(estimate_tokens(t) for t in texts)
+            await self.rate_limiter.acquire(tokens)
+            try:
+                vectors = await self.embeddings.aembed_documents(texts)
+                self.stats["tokens"] += tokens
+                return vectors
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                # Exponential backoff with full jitter
+                delay = random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
+                self.stats["retries"] += 1
+                print(f"   ! Embedding batch failed ({e}). Retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def run(self, documents):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        write_lock = asyncio.Lock()
+        pending = set()
+        failures = []
+
+        async def process(batch):
+            try:
+                vectors = await self._embed_with_retry([doc.page_content for doc in batch])
+                ids = [doc.id for doc in batch]
+                async with write_lock:
+                    await asyncio.to_thread(self.write_batch, ids, vectors, batch)
+                    if self.checkpoint is not None:
+                        self.checkpoint.record(ids)
+                self.stats["batches"] += 1
+                self.stats["chunks"] += len(batch)
+            except Exception as e:
+                failures.append(e)
+            finally:
+                semaphore.release()
+
+        async for batch in self._batches(documents):
+            await semaphore.acquire()
+            if failures:
+                semaphore.release()
+                break
+            task = asyncio.create_task(process(batch))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+        if pending:
+            await asyncio.gather(*pending)
+        if failures:
+            raise failures[0]
+        return self.stats
+
+
+def chroma_writer(vectorstore):
+    """Writes precomputed vectors into a langchain Chroma store."""
+    def write_batch(ids, vectors, documents):
+        vectorstore._collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            documents=[doc.page_content for doc in documents],
+            metadatas=[doc.metadata or None for doc in documents],
+        )
+    return write_batch
@@ -0,0 +1,267 @@
+# This handles chat history compaction (sliding window + rolling summary) and query rewriting
+
+import asyncio
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from core.config import (
+    DEFAULT_CHAT_MODEL,
+    DEFAULT_TENANT,
+    HISTORY_REWRITE_QUERIES,
+    HISTORY_REWRITE_TIMEOUT_SECONDS,
+    HISTORY_REWRITE_TURNS,
+    HISTORY_SUMMARY_CACHE_SIZE,
+    HISTORY_SUMMARY_MAX_WORDS,
+    HISTORY_TOKEN_BUDGET,
+)
+from core.prompts import DEFAULT_PERSONA, HISTORY_SUMMARY_PROMPT, QUERY_REWRITE_PROMPT
+from core.tenants import get_persona
+from services.metrics import observe_tokens, span
+from services.registry import registry
+from services.tokens import count_tokens
+
+ROLES = ("user", "assistant")
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators added by the chat format
+REWRITE_MESSAGE_CHARS = 600  # recent turns are clipped before being sent to the rewriter
+# Pronouns and references that only make sense with the conversation ("that project", "the second one")
+REFERENCE_PATTERN = re.compile(
+    r"\b(it|its|this|that|these|those|they|them|their|he|him|his|she|her|there|one|ones|former|latter"
+    r"|same|also|else|another|other|previous|above|earlier)\b",
+    re.IGNORECASE,
+)
+# Elliptical follow-ups: "And Django?", "What about his internship?"
+ELLIPSIS_PATTERN = re.compile(r"^\s*(and|or|but|so|also|what about|how about)\b", re.IGNORECASE)
+ELLIPSIS_MAX_WORDS = 3
+
+
+def message_tokens(msg) -> int:
+    return count_tokens(msg.content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def fingerprint(messages) -> str:
+    digest = hashlib.sha256()
+    for msg in messages:
+        digest.update(msg.role.lower().encode("utf-8") + b"\0" + msg.content.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+def render_transcript(messages, max_chars: int = None) -> str:
+    lines = []
+    for msg in messages:
+        speaker = "Recruiter" if msg.role.lower() == "user" else "Assistant"
+        content = msg.content if max_chars is None else msg.content[:max_chars]
+        lines.append(f"{speaker}: {content}")
+    return "\n".join(lines)
+
+
+def earlier_turns(question: str, history):
+    """The conversation before the current question; the frontend sends the question as its last message."""
+    messages = [msg for msg in history or [] if msg.role.lower() in ROLES]
+    if messages and messages[-1].role.lower() == "user" and messages[-1].content.strip() == question.strip():
+        messages = messages[:-1]
+    return messages
+
+
+def has_earlier_question(question: str, history) -> bool:
+    """Whether the user asked anything before; a greeting alone does not count."""
+    return any(msg.role.lower() == "user" for msg in earlier_turns(question, history))
+
+
+def needs_context(question: str) -> bool:
+    """Heuristic: the question refers back to the conversation, so retrieval needs it rewritten."""
+    return bool(
+        REFERENCE_PATTERN.search(question)
+        or ELLIPSIS_PATTERN.match(question)
+        or len(question.split()) <= ELLIPSIS_MAX_WORDS
+    )
+
+
+def to_langchain(messages):
+    return [
+        HumanMessage(content=msg.content) if msg.role.lower() == "user" else AIMessage(content=msg.content)
+        for msg in messages
+    ]
+
+
+def window_start(messages, lower: int, token_budget: int) -> int:
+    """Index of the oldest message (>= lower) such that messages[index:] fit token_budget."""
+    used = 0
+    index = len(messages)
+    while index > lower:
+        tokens = message_tokens(messages[index - 1])
+        if used + tokens > token_budget and index < len(messages):
+            break
+        used += tokens
+        index -= 1
+    return index
+
+
+class SummaryEntry:
+    __slots__ = ("covered", "fingerprint", "summary")
+
+    def __init__(self, covered, fingerprint, summary):
+        self.covered = covered
+        self.fingerprint = fingerprint
+        self.summary = summary
+
+
+class HistoryManager:
+    """
+    Keeps the history sent to the LLM under a token budget:
+    - the newest messages are kept verbatim while they fit HISTORY_TOKEN_BUDGET
+    - older messages are folded into a rolling summary, cached per conversation
+      together with how many messages it covers and a fingerprint of them
+
+    On the next turn only the messages between the cached summary and the
+    window (the delta) are summarized. When the window overflows it is cut back
+    to half the budget, so the following turns usually reuse the summary as-is.
+    If the client edits earlier messages the fingerprint no longer matches and
+    the summary is rebuilt.
+    """
+
+    def __init__(self, token_budget=HISTORY_TOKEN_BUDGET, max_entries=HISTORY_SUMMARY_CACHE_SIZE):
+        self.token_budget = token_budget
+        self.max_entries = max_entries
+        self._summaries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {
+            "summaries_built": 0, "summaries_reused": 0, "rewrites": 0, "rewrites_skipped": 0,
+            "rewrite_timeouts": 0, "failures": 0,
+        }
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._summaries.get(key)
+            if entry is not None:
+                self._summaries.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry):
+        with self._lock:
+            self._summaries[key] = entry
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > self.max_entries:
+                self._summaries.popitem(last=False)
+
+    async def _summarize(self, summary: str, messages, persona=DEFAULT_PERSONA) -> str:
+        llm = registry.get_llm(DEFAULT_CHAT_MODEL)
+        prompt = HISTORY_SUMMARY_PROMPT.format(
+            name=persona.name,
+            summary=summary or "(none yet)",
+            messages=render_transcript(messages),
+            max_words=HISTORY_SUMMARY_MAX_WORDS,
+        )
+        return (await llm.ainvoke(prompt)).content.strip()
+
+    async def compact(self, history, conversation_id: str = None, tenant: str = DEFAULT_TENANT):
+        """Returns (LangChain messages to send, stats)."""
+        messages = [msg for msg in history or [] if msg.role.lower() in ROLES]
+        tokens_before = sum(message_tokens(msg) for msg in messages)
+        stats = {
+            "messages": len(messages),
+            "summarized": 0,
+            "summary_updated": False,
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_before,
+        }
+        if tokens_before <= self.token_budget:
+            return to_langchain(messages), stats
+
+        # Stateless clients still get reuse: their key is derived from the opening message
+        # Namespaced per tenant: the same conversation ID on two personas must not share a summary
+        key = (tenant, conversation_id or f"anon-{fingerprint(messages[:1])}")
+        covered, summary = 0, ""
+        entry = self._get(key)
+        if entry is not None and entry.covered <= len(messages) \
+                and entry.fingerprint == fingerprint(messages[:entry.covered]):
+            covered, summary = entry.covered, entry.summary
+
+        start = window_start(messages, covered, self.token_budget)
+        if start > covered:
+            # Overflow: fold the delta and leave headroom for the next turns
+            start = window_start(messages, covered, self.token_budget // 2)
+            try:
+                summary = await self._summarize(summary, messages[covered:start], get_persona(tenant))
+                covered = start
+                self._put(key, SummaryEntry(covered, fingerprint(messages[:covered]), summary))
+                self.counters["summaries_built"] += 1
+                stats["summary_updated"] = True
+            except Exception as e:
+                # Losing the oldest turns is better than failing the request
+                print(f"WARNING: History summary failed, dropping old turns instead: {e}")
+                self.counters["failures"] += 1
+        else:
+            self.counters["summaries_reused"] += 1
+
+        compacted = to_langchain(messages[start:])
+        if summary:
+            compacted.insert(0, SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+        stats["summarized"] = covered
+        stats["tokens_after"] = sum(count_tokens(msg.content) + MESSAGE_OVERHEAD_TOKENS for msg in compacted)
+        return compacted, stats
+
+    async def rewrite_query(self, question: str, history, persona=DEFAULT_PERSONA) -> str:
+        """
+        Standalone retrieval query for a follow-up question; the question itself on any failure.
+        The rewrite is an LLM round trip before retrieval, so it is skipped for first questions
+        and for questions that do not refer back to the conversation, and cut off after
+        HISTORY_REWRITE_TIMEOUT_SECONDS.
+        """
+        if not HISTORY_REWRITE_QUERIES:
+            return question
+        messages = earlier_turns(question, history)
+        if not any(msg.role.lower() == "user" for msg in messages) or not needs_context(question):
+            self.counters["rewrites_skipped"] += 1
+            return question
+        recent = messages[-HISTORY_REWRITE_TURNS * 2:]
+        prompt = QUERY_REWRITE_PROMPT.format(
+            name=persona.name,
+            messages=render_transcript(recent, max_chars=REWRITE_MESSAGE_CHARS), question=question
+        )
+        try:
+            llm = registry.get_llm(DEFAULT_CHAT_MODEL)
+            reply = await asyncio.wait_for(llm.ainvoke(prompt), HISTORY_REWRITE_TIMEOUT_SECONDS)
+            rewritten = reply.content.strip().strip('"')
+        except asyncio.TimeoutError:
+            print(f"WARNING: Query rewrite timed out after {HISTORY_REWRITE_TIMEOUT_SECONDS}s, using the raw question")
+            self.counters["rewrite_timeouts"] += 1
+            return question
+        except Exception as e:
+            print(f"WARNING: Query rewrite failed, using the raw question: {e}")
+            self.counters["failures"] += 1
+            return question
+        # Guard against the model answering instead of rewriting
+        if not rewritten or len(rewritten) > 4 * len(question) + 200:
+            return question
+        self.counters["rewrites"] += 1
+        return rewritten
+
+    async def prepare(self, request, tenant: str = DEFAULT_TENANT):
+        """Compacts the history and rewrites the retrieval query concurrently."""
+        with span("history") as fields:
+            (chat_history, stats), retrieval_query = await asyncio.gather(
+                self.compact(request.history, request.conversation_id, tenant),
+                self.rewrite_query(request.question, request.history, get_persona(tenant)),
+            )
+            fields.update(history_tokens=stats["tokens_after"], summary_updated=stats["summary_updated"])
+        if stats["messages"]:
+            observe_tokens("history", stats["tokens_after"])
+        if stats["tokens_after"] != stats["tokens_before"]:
+            print(
+                f"History: {stats['messages']} messages, {stats['summarized']} summarized, "
+                f"tokens {stats['tokens_before']} -> {stats['tokens_after']}"
+            )
+        if retrieval_query != request.question:
+            print(f"Retrieval query rewritten: {retrieval_query}")
+        return chat_history, retrieval_query
+
+    def stats(self):
+        with self._lock:
+            return {"conversations": len(self._summaries), **self.counters}
+
+
+history_manager = HistoryManager()
@@ -0,0 +1,287 @@
+# This handles the BM25 lexical index and hybrid (BM25 + vector) retrieval
+
+import asyncio
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables.config import run_in_executor
+
+from core.config import (
+    HYBRID_LEXICAL_WEIGHT,
+    HYBRID_VECTOR_WEIGHT,
+    RETRIEVER_FETCH_K,
+    RETRIEVER_K,
+    RRF_K,
+)
+from services.metrics import observe_chunks, span
+
+LEXICAL_INDEX_NAME = "lexical_index.json"
+# The inverted index, in its own file so ingest can read the chunks back without it
+LEXICAL_POSTINGS_NAME = "lexical_postings.json"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens. Compound names like "xplainify-ai" or "llm_service.py"
+    are kept whole and also split into parts, so both spellings match.
+    """
+    tokens = []
+    for match in _TOKEN_RE.findall(text.lower()):
+        tokens.append(match)
+        if not match.isalnum():
+            tokens.extend(p for p in re.split(r"[-_.]", match) if p)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-process inverted index with Okapi BM25 scoring.
+
+    Postings are stored flat per term ([doc index, term frequency, ...]) and
+    saved beside the chunks, so load() reads the inverted index back without
+    tokenizing the corpus again.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self.contents = []
+        self.metadatas = []
+        self.lengths = []
+        self.postings = defaultdict(list)  # term -> [doc index, term frequency, doc index, ...]
+        self.avg_length = 0.0
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_documents(cls, documents: List[Document]):
+        index = cls()
+        for doc in documents:
+            index.add(doc)
+        index.finalize()
+        return index
+
+    def approx_bytes(self) -> int:
+        """Rough in-memory size: the stored text plus ~100 bytes per chunk and per posting."""
+        postings = sum(len(entries) for entries in self.postings.values()) // 2
+        return sum(len(content) for content in self.contents) + 100 * (len(self.ids) + postings)
+
+    def add(self, doc: Document):
+        """Adds one chunk; call finalize() once all chunks are in."""
+        self._add(doc.id, doc.page_content, doc.metadata)
+
+    def finalize(self):
+        self._finalize()
+
+    def _add(self, doc_id, content, metadata):
+        position = len(self.ids)
+        terms = Counter(tokenize(content))
+        self.ids.append(doc_id)
+        self.contents.append(content)
+        self.metadatas.append(metadata or {})
+        self.lengths.append(sum(terms.values()))
+        for term, freq in terms.items():
+            self.postings[term].extend((position, freq))
+
+    def _finalize(self):
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+    def search(self, query: str, k: int):
+        """Returns [(Document, score)] for the top-k documents."""
+        if not self.ids:
+            return []
+        n = len(self.ids)
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            df = len(postings) // 2
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            pairs = iter(postings)
+            for position, freq in zip(pairs, pairs):
+                norm = 1 - self.b + self.b * self.lengths[position] / self.avg_length
+                scores[position] += idf * freq * (self.k1 + 1) / (freq + self.k1 * norm)
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [
+            (Document(id=self.ids[p], page_content=self.contents[p], metadata=self.metadatas[p]), score)
+            for p, score in top
+        ]
+
+    # --- Persistence ---
+    def save(self, directory: str):
+        # Postings first: a chunks file is never newer than the postings beside it
+        _write_json(os.path.join(directory, LEXICAL_POSTINGS_NAME), {
+            "count": len(self.ids),
+            "lengths": self.lengths,
+            "avg_length": self.avg_length,
+            "postings": self.postings,
+        })
+        _write_json(os.path.join(directory, LEXICAL_INDEX_NAME), {
+            "k1": self.k1,
+            "b": self.b,
+            "ids": self.ids,
+            "contents": self.contents,
+            "metadatas": self.metadatas,
+        })
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["BM25Index"]:
+        path = os.path.join(directory, LEXICAL_INDEX_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        postings = _read_json(os.path.join(directory, LEXICAL_POSTINGS_NAME))
+        if postings is None or postings["count"] != len(data["ids"]):
+            # Saved before the postings were persisted: tokenize once more
+            for doc_id, content, metadata in zip(data["ids"], data["contents"], data["metadatas"]):
+                index._add(doc_id, content, metadata)
+            index._finalize()
+            return index
+        index.ids, index.contents, index.metadatas = data["ids"], data["contents"], data["metadatas"]
+        index.lengths = postings["lengths"]
+        index.avg_length = postings["avg_length"]
+        index.postings = defaultdict(list, postings["postings"])
+        return index
+
+    @staticmethod
+    def read_documents(directory: str) -> List[Document]:
+        """The stored chunks without building postings (ingest carries unchanged ones over)."""
+        path = os.path.join(directory, LEXICAL_INDEX_NAME)
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return [
+            Document(id=doc_id, page_content=content, metadata=metadata)
+            for doc_id, content, metadata in zip(data["ids"], data["contents"], data["metadatas"])
+        ]
+
+    @classmethod
+    def from_chroma(cls, vectorstore) -> "BM25Index":
+        """Builds the index from an existing Chroma collection (for databases ingested before BM25 existed)."""
+        data = vectorstore._collection.get(include=["documents", "metadatas"])
+        index = cls()
+        for doc_id, content, metadata in zip(data["ids"], data["documents"], data["metadatas"]):
+            index._add(doc_id, content or "", metadata)
+        index._finalize()
+        return index
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _doc_key(doc: Document):
+    return doc.id or doc.metadata.get("content_hash") or doc.page_content
+
+
+def reciprocal_rank_fusion(ranked_lists, weights, k: int, rrf_k: int = RRF_K):
+    """Fuses ranked document lists: score = sum(weight / (rrf_k + rank))."""
+    scores = defaultdict(float)
+    docs = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        if not weight:
+            continue
+        for rank, doc in enumerate(ranked, start=1):
+            key = _doc_key(doc)
+            scores[key] += weight / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """Vector similarity hits fused with BM25 hits through reciprocal rank fusion."""
+
+    vectorstore: object
+    lexical_index: Optional[object] = None
+    k: int = RETRIEVER_K
+    fetch_k: int = RETRIEVER_FETCH_K
+    vector_weight: float = HYBRID_VECTOR_WEIGHT
+    lexical_weight: float = HYBRID_LEXICAL_WEIGHT
+
+    def _lexical(self, query: str):
+        if self.lexical_index is None or not self.lexical_weight:
+            return []
+        with span("lexical_search"):
+            docs = [doc for doc, _ in self.lexical_index.search(query, self.fetch_k)]
+        observe_chunks("lexical_search", len(docs))
+        return docs
+
+    def _vector(self, vector):
+        with span("vector_search"):
+            docs = self.vectorstore.similarity_search_by_vector(vector, k=self.fetch_k)
+        observe_chunks("vector_search", len(docs))
+        return docs
+
+    def _fuse(self, vector_docs, lexical_docs):
+        if not lexical_docs:
+            fused = vector_docs[:self.k]
+        else:
+            fused = reciprocal_rank_fusion(
+                [vector_docs, lexical_docs], [self.vector_weight, self.lexical_weight], self.k
+            )
+        observe_chunks("hybrid", len(fused))
+        return fused
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, query_vector=None
+    ) -> List[Document]:
+        """query_vector: the query's embedding when the caller already has it (e.g. from the response cache lookup)."""
+        vector_docs = []
+        if self.vector_weight:
+            vector = query_vector
+            if vector is None:
+                # Embedding and search are split so each shows up as its own stage
+                with span("embed_query"):
+                    vector = self.vectorstore.embeddings.embed_query(query)
+            vector_docs = self._vector(vector)
+        return self._fuse(vector_docs, self._lexical(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun, query_vector=None
+    ) -> List[Document]:
+        # BM25 scores the whole corpus: it runs on a thread while the query is embedded and searched
+        lexical = None
+        if self.lexical_index is not None and self.lexical_weight:
+            lexical = asyncio.ensure_future(run_in_executor(None, self._lexical, query))
+        try:
+            vector_docs = []
+            if self.vector_weight:
+                vector = query_vector
+                if vector is None:
+                    with span("embed_query"):
+                        vector = await self.vectorstore.embeddings.aembed_query(query)
+                vector_docs = await run_in_executor(None, self._vector, vector)
+            lexical_docs = await lexical if lexical is not None else []
+        except BaseException:
+            if lexical is not None:
+                lexical.cancel()
+            raise
+        return self._fuse(vector_docs, lexical_docs)
@@ -1,27 +1,122 @@
 # This handles the interactions with OpenAI (RAG, Chat)
 
-import os
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_chroma import Chroma
-from core.config import PERSIST_DIRECTORY
+import asyncio
+from collections import OrderedDict
+from functools import lru_cache
+
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from core.prompts import PROFILE_QUERIES, system_prompt_for
+from core.config import (
+    DEFAULT_CHAT_MODEL,
+    DEFAULT_TENANT,
+    HYBRID_LEXICAL_WEIGHT,
+    HYBRID_VECTOR_WEIGHT,
+    RERANK_CANDIDATES,
+    RERANK_ENABLED,
+    RETRIEVER_K,
+    TENANT_MAX_LOADED,
+)
+from services.lexical_index import HybridRetriever
+from services.reranker import RerankingRetriever
+from services.metrics import count_event, span
+from core.tenants import get_persona
+from services.registry import registry
+
+# Profile contexts of loaded tenants fit; idle tenants' entries are evicted with them
+PROFILE_CONTEXT_MAX_ENTRIES = max(16, TENANT_MAX_LOADED * len(PROFILE_QUERIES))
+
+@lru_cache(maxsize=256)
+def build_prompt_template(system_prompt: str):
+    return ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("human", "{question}"),
+    ])
 
 class LLMService:
+    # Formatted context for the fixed profile queries, keyed by (tenant, generation, query)
+    _profile_contexts = OrderedDict()
+    _profile_locks = {}
+
+    @staticmethod
+    def get_llm(model_name: str = DEFAULT_CHAT_MODEL):
+        return registry.get_llm(model_name)
+
     @staticmethod
-    def get_llm(model_name: str = "gpt-4o-mini"):
-        return ChatOpenAI(model=model_name, temperature=0.3)
+    async def get_retriever(k: int = None, vector_weight: float = None, lexical_weight: float = None,
+                            tenant: str = DEFAULT_TENANT):
+        # Opens the tenant's index (or swaps in a new generation) off the event loop
+        vectorstore = await registry.aget_vectorstore(tenant)
+        return LLMService.build_retriever(
+            vectorstore, registry.get_lexical_index(tenant), k, vector_weight, lexical_weight
+        )
 
     @staticmethod
-    def get_retriever():
-        if not os.path.exists(PERSIST_DIRECTORY):
-            raise FileNotFoundError("ChromaDB not found.")
-        
-        embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-        vectorstore = Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=embeddings)
-        return vectorstore.as_retriever(search_kwargs={"k": 6})
+    def build_retriever(vectorstore, lexical_index, k: int = None, vector_weight: float = None,
+                        lexical_weight: float = None):
+        """Hybrid retrieval (+ reranking) over an explicit index, e.g. a generation ingest.py just built."""
+        k = k or RETRIEVER_K
+        retriever = HybridRetriever(
+            vectorstore=vectorstore,
+            lexical_index=lexical_index,
+            # Over-fetch so the reranker has candidates to choose from
+            k=max(k, RERANK_CANDIDATES) if RERANK_ENABLED else k,
+            vector_weight=HYBRID_VECTOR_WEIGHT if vector_weight is None else vector_weight,
+            lexical_weight=HYBRID_LEXICAL_WEIGHT if lexical_weight is None else lexical_weight,
+        )
+        if not RERANK_ENABLED:
+            return retriever
+        return RerankingRetriever(base_retriever=retriever, max_docs=k)
+
+    @staticmethod
+    def get_prompt_template(tenant: str = DEFAULT_TENANT):
+        # Keyed by the rendered prompt, so an edited persona.json takes effect on the next request
+        return build_prompt_template(system_prompt_for(get_persona(tenant)))
 
     @staticmethod
     def format_docs(docs):
         return "\n\n".join(
-            f"[Source: {doc.metadata.get('source', 'Unknown')}]\n{doc.page_content}" 
+            f"[Source: {doc.metadata.get('source', 'Unknown')}]\n{doc.page_content}"
             for doc in docs
-        )
\ No newline at end of file
+        )
+
+    @staticmethod
+    async def get_profile_context(query: str, tenant: str = DEFAULT_TENANT):
+        """
+        Retrieval for the fixed profile queries used by the document endpoints.
+        The query never changes, so the result is computed once per tenant and index generation.
+        """
+        await registry.aget_vectorstore(tenant)  # picks up a newly published generation
+        key = (tenant, registry.get_generation(tenant), query)
+        cached = LLMService._profile_contexts.get(key)
+        if cached is not None:
+            count_event("profile_context_hit")
+            return cached
+
+        count_event("profile_context_miss")
+        lock = LLMService._profile_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            cached = LLMService._profile_contexts.get(key)
+            if cached is None:
+                with span("profile_context"):
+                    retriever = await LLMService.get_retriever(tenant=tenant)
+                    docs = await retriever.ainvoke(query)
+                cached = LLMService.format_docs(docs)
+                # Drop this tenant's entries from older generations, then the least recently added
+                contexts = OrderedDict(
+                    (k, v) for k, v in LLMService._profile_contexts.items() if k[0] != tenant or k[1] == key[1]
+                )
+                contexts[key] = cached
+                while len(contexts) > PROFILE_CONTEXT_MAX_ENTRIES:
+                    contexts.popitem(last=False)
+                LLMService._profile_contexts = contexts
+                LLMService._profile_locks = {
+                    k: v for k, v in LLMService._profile_locks.items() if k in contexts or k == key
+                }
+        return cached
+
+    @staticmethod
+    async def warm_profile_contexts(tenant: str = DEFAULT_TENANT):
+        for query in PROFILE_QUERIES.values():
+            await LLMService.get_profile_context(query, tenant)
@@ -0,0 +1,345 @@
+# This handles request tracing: per-stage timing spans, Prometheus-style metrics and JSON logs
+
+import bisect
+import contextvars
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from core.config import JSON_LOGS, METRICS_ENABLED, TENANT_STATS_MAX
+
+# Set per HTTP request by TracingMiddleware; read by log_event()
+request_id_var = contextvars.ContextVar("request_id", default=None)
+# Fields the route handlers attach to the current request (e.g. tenant); see tag_request()
+request_tags_var = contextvars.ContextVar("request_tags", default=None)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (1, 2, 4, 6, 8, 12, 16, 24, 32, 64)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 1500, 2000, 4000, 8000, 16000, 32000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + body + "}"
+
+
+class Histogram:
+    """Fixed-bucket histogram per label set, rendered in the Prometheus text format."""
+
+    def __init__(self, name, help_text, buckets, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._series = {}  # label values -> [bucket counts (non-cumulative) + overflow, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for labels, value in snapshot:
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, help_text, buckets, label_names=()):
+        metric = Histogram(name, help_text, buckets, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, label_names=()):
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+HTTP_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency, including streamed bodies.",
+    LATENCY_BUCKETS, ("method", "path", "status"),
+)
+STAGE_SECONDS = metrics.histogram(
+    "rag_stage_duration_seconds", "Time spent per pipeline stage.", LATENCY_BUCKETS, ("stage",)
+)
+STAGE_ERRORS = metrics.counter("rag_stage_errors_total", "Stages that raised an exception.", ("stage",))
+CHUNKS = metrics.histogram("rag_chunks", "Retrieved / kept chunks per stage.", COUNT_BUCKETS, ("stage",))
+TOKENS = metrics.histogram(
+    "rag_tokens", "Token counts (context, history, llm_prompt, llm_completion).", TOKEN_BUCKETS, ("kind",)
+)
+EVENTS = metrics.counter("rag_events_total", "Cache hits and misses and other discrete events.", ("event",))
+
+
+class TenantLatency:
+    """
+    Request latency per tenant. Kept out of /metrics so thousands of tenants do
+    not become thousands of label values; only the TENANT_STATS_MAX most
+    recently active tenants are tracked, each with its last SAMPLES requests.
+    """
+
+    SAMPLES = 256
+
+    def __init__(self, max_tenants=TENANT_STATS_MAX):
+        self.max_tenants = max_tenants
+        self._tenants = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, tenant: str, seconds: float, error: bool = False):
+        with self._lock:
+            entry = self._tenants.get(tenant)
+            if entry is None:
+                entry = self._tenants[tenant] = {"requests": 0, "errors": 0, "samples": deque(maxlen=self.SAMPLES)}
+            self._tenants.move_to_end(tenant)
+            entry["requests"] += 1
+            entry["errors"] += int(error)
+            entry["samples"].append(seconds)
+            while len(self._tenants) > self.max_tenants:
+                self._tenants.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            snapshot = {tenant: (e["requests"], e["errors"], sorted(e["samples"])) for tenant, e in self._tenants.items()}
+        result = {}
+        for tenant, (requests, errors, samples) in snapshot.items():
+            result[tenant] = {
+                "requests": requests,
+                "errors": errors,
+                "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+                "p50_ms": round(samples[len(samples) // 2] * 1000, 2),
+                "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 2),
+            }
+        return result
+
+
+tenant_latency = TenantLatency()
+
+
+def tag_request(**tags):
+    """Attaches fields to the current request: they go on its log line, and "tenant" feeds tenant_latency."""
+    current = request_tags_var.get()
+    if current is not None:
+        current.update(tags)
+
+
+def log_event(event: str, **fields):
+    """One JSON line per event when JSON_LOGS is on, tagged with the current request ID."""
+    if not JSON_LOGS:
+        return
+    record = {"ts": round(time.time(), 3), "event": event, "request_id": request_id_var.get()}
+    record.update(fields)
+    print(json.dumps(record, default=str), flush=True)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Times a block as one pipeline stage. Yields a dict the block may fill with
+    extra fields (chunk counts, token counts) for the JSON log line.
+    """
+    fields = {}
+    if not METRICS_ENABLED and not JSON_LOGS:
+        yield fields
+        return
+    start = time.perf_counter()
+    error = None
+    try:
+        yield fields
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        if METRICS_ENABLED:
+            STAGE_SECONDS.observe(elapsed, stage)
+            if error:
+                STAGE_ERRORS.inc(stage)
+        log_event("span", stage=stage, duration_ms=round(elapsed * 1000, 2), error=error, **fields)
+
+
+def observe_chunks(stage: str, count: int):
+    if METRICS_ENABLED:
+        CHUNKS.observe(count, stage)
+
+
+def observe_tokens(kind: str, count: int):
+    if METRICS_ENABLED:
+        TOKENS.observe(count, kind)
+
+
+def count_event(event: str):
+    if METRICS_ENABLED:
+        EVENTS.inc(event)
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    Attached to every LLM the registry hands out. Records call latency, time to
+    first streamed token and prompt/completion tokens (from the provider's usage
+    report when present).
+    """
+
+    run_inline = True  # keep the request's context (request ID) and skip the executor hop
+
+    def __init__(self):
+        self._starts = {}
+        self._first_token = set()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if run_id in self._first_token or run_id not in self._starts:
+            return
+        self._first_token.add(run_id)
+        if METRICS_ENABLED:
+            STAGE_SECONDS.observe(time.perf_counter() - self._starts[run_id], "llm_first_token")
+
+    def _finish(self, run_id, error=None):
+        self._first_token.discard(run_id)
+        start = self._starts.pop(run_id, None)
+        if start is None:
+            return None
+        elapsed = time.perf_counter() - start
+        if METRICS_ENABLED:
+            STAGE_SECONDS.observe(elapsed, "llm")
+            if error:
+                STAGE_ERRORS.inc("llm")
+        return elapsed
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        elapsed = self._finish(run_id)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        if prompt_tokens is None:
+            message = getattr(response.generations[0][0], "message", None) if response.generations else None
+            usage_metadata = getattr(message, "usage_metadata", None) or {}
+            prompt_tokens = usage_metadata.get("input_tokens")
+            completion_tokens = usage_metadata.get("output_tokens")
+        if prompt_tokens is not None:
+            observe_tokens("llm_prompt", prompt_tokens)
+        if completion_tokens is not None:
+            observe_tokens("llm_completion", completion_tokens)
+        if elapsed is not None:
+            log_event(
+                "span", stage="llm", duration_ms=round(elapsed * 1000, 2),
+                prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+            )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        elapsed = self._finish(run_id, error)
+        if elapsed is not None:
+            log_event("span", stage="llm", duration_ms=round(elapsed * 1000, 2), error=type(error).__name__)
+
+
+llm_metrics_handler = LLMMetricsHandler()
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware: assigns a request ID (or reuses X-Request-ID), echoes
+    it back, and records the full request latency - for streamed responses that
+    includes the body, not just the headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1") or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+        tags = {}
+        tags_token = request_tags_var.set(tags)
+        status = {"code": 500}
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            elapsed = time.perf_counter() - start
+            # Route templates keep label cardinality bounded
+            path = getattr(scope.get("route"), "path", "unmatched")
+            if METRICS_ENABLED:
+                HTTP_SECONDS.observe(elapsed, scope["method"], path, str(status["code"]))
+                if "tenant" in tags:
+                    tenant_latency.observe(tags["tenant"], elapsed, error=status["code"] >= 500)
+            log_event(
+                "request", method=scope["method"], path=path, status=status["code"],
+                duration_ms=round(elapsed * 1000, 2), **tags,
+            )
+            request_tags_var.reset(tags_token)
+            request_id_var.reset(token)
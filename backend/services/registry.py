@@ -0,0 +1,360 @@
+# This handles the process-wide service registry (shared clients, per-tenant vector stores, LLM cache)
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from core.config import (
+    ADMISSION_ENABLED,
+    DEFAULT_TENANT,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_MODEL,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_TIMEOUT_SECONDS,
+    REGISTRY_REFRESH_SECONDS,
+    RENDER_WORKERS,
+    TENANT_IDLE_SECONDS,
+    TENANT_MAX_LOADED,
+)
+from core.index_state import generation_mtime, read_generation
+from core.tenants import resolve_tenant, tenant_paths
+from services.admission import AdmittedLLM
+from services.embedding_cache import CachedEmbeddings, get_embedding_cache
+from services.lexical_index import BM25Index
+from services.metrics import llm_metrics_handler, span, tag_request
+from services.vector_store import NumpyVectorStore, close_vectorstore, open_vectorstore, vector_bytes
+
+
+class TenantIndex:
+    """One tenant's open vector store and BM25 index, plus what it costs to keep them loaded."""
+
+    def __init__(self, tenant_id: str):
+        self.tenant_id = tenant_id
+        self.paths = tenant_paths(tenant_id)
+        self.lock = threading.RLock()
+        self.vectorstore = None
+        self.lexical_index = None
+        self.state = None
+        self.marker_mtime = 0.0
+        self.last_check = 0.0
+        self.last_used = time.monotonic()
+        self.open_seconds = 0.0
+        self.approx_bytes = 0
+
+    @property
+    def generation(self):
+        return self.state["generation"] if self.state else None
+
+    def read_generation(self):
+        return read_generation(self.paths.generation_file, self.paths.persist_directory)
+
+    def generation_mtime(self):
+        return generation_mtime(self.paths.generation_file)
+
+
+class ServiceRegistry:
+    """
+    Owns every long-lived object the routers need:
+    - one pooled sync + async HTTP client shared by all OpenAI calls
+    - one embeddings client (behind the persistent embedding cache)
+    - per tenant: an open vector store (Chroma or NumPy, see services/vector_store.py)
+      and the BM25 lexical index of the same generation
+    - ChatOpenAI instances cached per model name, behind the admission controller
+    - a bounded thread pool for CPU-bound work (DOCX rendering)
+
+    Tenant indexes open lazily on their first request. The least recently used
+    ones are dropped beyond max_loaded, or once idle for idle_seconds, so memory
+    stays bounded however many tenants exist. A tenant's vector store is
+    hot-swapped when its ingest publishes a new generation. Dropped handles
+    are closed after close_grace_seconds (the HTTP timeout), so requests still
+    holding them finish against the index they started with.
+    """
+
+    def __init__(self, llm_factory=None, embeddings_factory=None,
+                 max_loaded: int = TENANT_MAX_LOADED, idle_seconds: float = TENANT_IDLE_SECONDS):
+        # Factories are swappable so benchmarks can run without OpenAI.
+        self.llm_factory = llm_factory or self._default_llm_factory
+        self.embeddings_factory = embeddings_factory or self._default_embeddings_factory
+        self.max_loaded = max_loaded
+        self.idle_seconds = idle_seconds
+        self.close_grace_seconds = HTTP_TIMEOUT_SECONDS
+
+        self._lock = threading.RLock()
+        self._http_client = None
+        self._async_http_client = None
+        self._embeddings = None
+        self._tenants = OrderedDict()  # tenant ID -> TenantIndex, least recently used first
+        self._retired = []  # (close after, vector store) for dropped handles
+        self._llms = {}
+        self._executor = None
+        self._opening = {}  # tenant ID -> in-flight open on the pool, shared by concurrent requests
+        self.counters = {"tenant_loads": 0, "tenant_evictions": 0}
+
+    # --- Lifecycle ---
+    def start(self):
+        with self._lock:
+            if self._http_client is None:
+                limits = httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                )
+                self._http_client = httpx.Client(limits=limits, timeout=HTTP_TIMEOUT_SECONDS)
+                self._async_http_client = httpx.AsyncClient(limits=limits, timeout=HTTP_TIMEOUT_SECONDS)
+            try:
+                self.get_vectorstore()
+            except FileNotFoundError as e:
+                print(f"WARNING: {e} Run ingest.py before serving requests.")
+
+    async def aclose(self):
+        with self._lock:
+            http_client, async_http_client = self._http_client, self._async_http_client
+            executor = self._executor
+            retired = [vectorstore for _, vectorstore in self._retired]
+            retired += [index.vectorstore for index in self._tenants.values() if index.vectorstore is not None]
+            self._executor = None
+            self._http_client = None
+            self._async_http_client = None
+            self._embeddings = None
+            self._tenants = OrderedDict()
+            self._retired = []
+            self._llms = {}
+        for vectorstore in retired:
+            close_vectorstore(vectorstore)
+        if async_http_client is not None:
+            await async_http_client.aclose()
+        if http_client is not None:
+            http_client.close()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    @property
+    def generation(self):
+        return self.get_generation(DEFAULT_TENANT)
+
+    # --- Factories ---
+    # langchain_openai (and the OpenAI SDK behind it) is imported on first use, not at startup
+    def _default_llm_factory(self, model_name: str):
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(
+            model=model_name,
+            temperature=0.3,
+            http_client=self._http_client,
+            http_async_client=self._async_http_client,
+        )
+
+    def _default_embeddings_factory(self):
+        from langchain_openai import OpenAIEmbeddings
+
+        return OpenAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            http_client=self._http_client,
+            http_async_client=self._async_http_client,
+        )
+
+    # --- Accessors ---
+    def get_llm(self, model_name: str):
+        llm = self._llms.get(model_name)
+        if llm is None:
+            with self._lock:
+                llm = self._llms.get(model_name)
+                if llm is None:
+                    llm = self.llm_factory(model_name)
+                    llm.callbacks = list(llm.callbacks or []) + [llm_metrics_handler]
+                    if ADMISSION_ENABLED:
+                        llm = AdmittedLLM(llm, model_name)
+                    self._llms[model_name] = llm
+        return llm
+
+    def get_embeddings(self):
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    embeddings = self.embeddings_factory()
+                    if EMBEDDING_CACHE_ENABLED:
+                        embeddings = CachedEmbeddings(embeddings, EMBEDDING_MODEL, get_embedding_cache())
+                    self._embeddings = embeddings
+        return self._embeddings
+
+    def resolve_tenant(self, tenant_id: str = None) -> str:
+        """Validates the request's tenant and tags the request with it. Raises UnknownTenantError."""
+        tenant_id = resolve_tenant(tenant_id)
+        tag_request(tenant=tenant_id)
+        return tenant_id
+
+    def get_vectorstore(self, tenant_id: str = DEFAULT_TENANT):
+        index = self._tenant(tenant_id)
+        self._refresh_if_stale(index)
+        if index.vectorstore is None:
+            with index.lock:
+                if index.vectorstore is None:
+                    self._open(index, index.read_generation())
+        return index.vectorstore
+
+    async def aget_vectorstore(self, tenant_id: str = DEFAULT_TENANT):
+        """
+        get_vectorstore for async handlers. Opening a cold tenant and the hot-swap
+        check are blocking I/O, so they run on the pool; concurrent requests for
+        the same tenant share one open instead of queueing on its lock.
+        """
+        index = self._tenant(tenant_id)
+        if index.vectorstore is not None and not self._refresh_due(index):
+            return index.vectorstore
+        opening = self._opening.get(tenant_id)
+        if opening is None:
+            opening = asyncio.ensure_future(self.run_blocking(self.get_vectorstore, tenant_id))
+            self._opening[tenant_id] = opening
+            opening.add_done_callback(lambda _: self._opening.pop(tenant_id, None))
+        # A cancelled request does not cancel the open for the others waiting on it
+        return await asyncio.shield(opening)
+
+    def get_lexical_index(self, tenant_id: str = DEFAULT_TENANT):
+        # Swapped together with the vector store in _open(), so call get_vectorstore() first
+        return self._tenant(tenant_id).lexical_index
+
+    def get_generation(self, tenant_id: str = DEFAULT_TENANT):
+        index = self._tenants.get(tenant_id)
+        return index.generation if index is not None else None
+
+    def get_state(self, tenant_id: str = DEFAULT_TENANT):
+        """The loaded generation's marker (generation, persist_directory, ...), or None."""
+        index = self._tenants.get(tenant_id)
+        return index.state if index is not None else None
+
+    def reload(self, tenant_id: str = DEFAULT_TENANT):
+        """Opens the tenant's currently published generation and swaps it in."""
+        index = self._tenant(tenant_id)
+        with index.lock:
+            self._open(index, index.read_generation())
+        return index.state
+
+    def tenant_stats(self):
+        with self._lock:
+            indexes = list(self._tenants.values())
+            counters = dict(self.counters)
+        now = time.monotonic()
+        loaded = {
+            index.tenant_id: {
+                "generation": index.generation,
+                "chunks": len(index.lexical_index) if index.lexical_index is not None else 0,
+                "approx_mb": round(index.approx_bytes / 1024 / 1024, 2),
+                "open_ms": round(index.open_seconds * 1000, 1),
+                "idle_seconds": round(now - index.last_used, 1),
+            }
+            for index in indexes if index.vectorstore is not None
+        }
+        return {
+            **counters,
+            "loaded": len(loaded),
+            "max_loaded": self.max_loaded,
+            "approx_mb": round(sum(entry["approx_mb"] for entry in loaded.values()), 2),
+            "tenants": loaded,
+        }
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """Runs CPU-bound work on the bounded pool so the event loop stays free."""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+        loop = asyncio.get_running_loop()
+        # Carry the request context (request ID for logs) into the worker thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, functools.partial(context.run, func, *args, **kwargs))
+
+    # --- Internals ---
+    def _tenant(self, tenant_id: str) -> TenantIndex:
+        now = time.monotonic()
+        index = self._tenants.get(tenant_id)
+        if index is not None and now - index.last_used < 1.0:
+            # Hot path: skip the LRU bookkeeping for a tenant touched within the last second
+            return index
+        with self._lock:
+            index = self._tenants.get(tenant_id)
+            if index is None:
+                index = self._tenants[tenant_id] = TenantIndex(tenant_id)
+            self._tenants.move_to_end(tenant_id)
+            index.last_used = now
+            self._evict(now)
+        return index
+
+    def _evict(self, now):
+        """Drops least recently used tenants beyond max_loaded and any idle for idle_seconds."""
+        while self._tenants:
+            tenant_id, index = next(iter(self._tenants.items()))
+            if len(self._tenants) <= max(1, self.max_loaded) and now - index.last_used < self.idle_seconds:
+                break
+            del self._tenants[tenant_id]
+            if index.vectorstore is not None:
+                self.counters["tenant_evictions"] += 1
+                self._retire(index.vectorstore)
+                print(f"INFO: Unloaded tenant '{tenant_id}' (idle {now - index.last_used:.0f}s)")
+        self._close_retired(now)
+
+    def _retire(self, vectorstore):
+        self._retired.append((time.monotonic() + self.close_grace_seconds, vectorstore))
+
+    def _close_retired(self, now):
+        while self._retired and self._retired[0][0] <= now:
+            close_vectorstore(self._retired.pop(0)[1])
+
+    def _open(self, index: TenantIndex, state):
+        persist_directory = state["persist_directory"]
+        if not os.path.exists(persist_directory):
+            raise FileNotFoundError(f"Vector store not found for tenant '{index.tenant_id}'.")
+
+        start = time.perf_counter()
+        with span("open_index"):
+            vectorstore = open_vectorstore(persist_directory, self.get_embeddings())
+            lexical_index = BM25Index.load(persist_directory)
+            if lexical_index is None:
+                # Older databases have no persisted BM25 index; build it from the collection
+                if isinstance(vectorstore, NumpyVectorStore):
+                    raise FileNotFoundError(f"BM25 index missing from {persist_directory}.")
+                lexical_index = BM25Index.from_chroma(vectorstore)
+        previous = index.vectorstore
+        # Single reference assignment: readers see either the old or the new store.
+        index.vectorstore = vectorstore
+        index.lexical_index = lexical_index
+        index.state = state
+        index.marker_mtime = index.generation_mtime()
+        index.open_seconds = time.perf_counter() - start
+        index.approx_bytes = lexical_index.approx_bytes() + len(lexical_index) * vector_bytes(vectorstore)
+        with self._lock:
+            self.counters["tenant_loads"] += 1
+            if previous is not None:
+                self._retire(previous)
+        print(
+            f"INFO: Vector store generation {state['generation']} loaded from {persist_directory} "
+            f"(tenant '{index.tenant_id}', {index.open_seconds * 1000:.0f}ms)"
+        )
+
+    def _refresh_due(self, index: TenantIndex) -> bool:
+        return time.monotonic() - index.last_check >= REGISTRY_REFRESH_SECONDS
+
+    def _refresh_if_stale(self, index: TenantIndex):
+        if index.vectorstore is None or not self._refresh_due(index):
+            return
+        index.last_check = time.monotonic()
+        if index.generation_mtime() == index.marker_mtime:
+            return
+        with index.lock:
+            state = index.read_generation()
+            if state["generation"] != index.generation or state["persist_directory"] != index.state["persist_directory"]:
+                try:
+                    self._open(index, state)
+                except Exception as e:
+                    # Keep serving the previous generation rather than failing requests.
+                    print(f"ERROR: Hot-swap of tenant '{index.tenant_id}' to generation {state['generation']} failed: {e}")
+            index.marker_mtime = index.generation_mtime()
+
+
+registry = ServiceRegistry()
@@ -0,0 +1,130 @@
+# This handles the local rerank-and-prune stage that runs after retrieval
+
+import math
+import time
+from typing import List
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from core.config import RERANK_TIME_BUDGET_MS, RERANK_TOKEN_BUDGET, RETRIEVER_K
+from services.lexical_index import tokenize
+from services.metrics import observe_chunks, observe_tokens, span
+from services.tokens import count_tokens
+
+STOPWORDS = {
+    "a", "an", "and", "are", "about", "as", "at", "be", "by", "can", "did", "do", "does", "for", "from",
+    "has", "have", "he", "his", "how", "i", "in", "is", "it", "me", "my", "of", "on", "or", "s", "she",
+    "tell", "that", "the", "their", "they", "this", "to", "was", "what", "when", "where", "which", "who",
+    "why", "with", "you", "your",
+}
+
+
+def score_candidates(query: str, docs: List[Document], deadline: float):
+    """
+    Cheap CPU-only relevance score per candidate:
+    - coverage: idf-weighted share of distinct query terms found in the chunk
+    - phrase bonus: adjacent query-term pairs that also appear adjacent in the chunk
+    - rank prior: a small bonus for the retriever's own order, to break ties
+    Returns None if the deadline passes before every candidate is scored.
+    """
+    query_terms = [t for t in tokenize(query) if t not in STOPWORDS]
+    if not query_terms:
+        return [1.0 / (rank + 1) for rank in range(len(docs))]
+    doc_terms = [set(tokenize(doc.page_content)) for doc in docs]
+
+    # idf over the candidate set: terms found in every candidate carry little signal
+    n = len(docs)
+    weights = {}
+    for term in set(query_terms):
+        df = sum(1 for terms in doc_terms if term in terms)
+        weights[term] = math.log(1 + (n + 1) / (df + 0.5))
+    total_weight = sum(weights.values())
+    pairs = list(zip(query_terms, query_terms[1:]))
+
+    scores = []
+    for rank, (doc, terms) in enumerate(zip(docs, doc_terms)):
+        if time.perf_counter() > deadline:
+            return None
+        coverage = sum(w for term, w in weights.items() if term in terms) / total_weight
+        text = doc.page_content.lower()
+        phrase = sum(1 for a, b in pairs if f"{a} {b}" in text) / len(pairs) if pairs else 0.0
+        prior = 1.0 / (rank + 1)
+        scores.append(coverage + 0.5 * phrase + 0.1 * prior)
+    return scores
+
+
+def rerank_and_prune(query: str, docs: List[Document], max_docs: int = RETRIEVER_K,
+                     token_budget: int = RERANK_TOKEN_BUDGET, time_budget_ms: float = RERANK_TIME_BUDGET_MS):
+    """
+    Reorders candidates by local score, then keeps as many as fit token_budget
+    (at least one, at most max_docs). Falls back to the retriever's order if
+    scoring exceeds time_budget_ms. Returns (docs, stats).
+    """
+    start = time.perf_counter()
+    scores = score_candidates(query, docs, start + time_budget_ms / 1000)
+    fallback = scores is None
+    ordered = docs if fallback else [doc for _, doc in sorted(zip(scores, docs), key=lambda p: -p[0])]
+
+    token_counts = {id(doc): count_tokens(doc.page_content) for doc in docs}
+    kept, used = [], 0
+    for doc in ordered:
+        if len(kept) >= max_docs:
+            break
+        tokens = token_counts[id(doc)]
+        if kept and used + tokens > token_budget:
+            continue
+        kept.append(doc)
+        used += tokens
+
+    # Baseline: what the old fixed top-k stuffing would have sent
+    baseline = sum(token_counts[id(doc)] for doc in docs[:max_docs])
+    stats = {
+        "candidates": len(docs),
+        "kept": len(kept),
+        "tokens_before": baseline,
+        "tokens_after": used,
+        "fallback": fallback,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+    return kept, stats
+
+
+class RerankingRetriever(BaseRetriever):
+    """Over-fetches from the base retriever, then reranks and prunes to the token budget."""
+
+    base_retriever: BaseRetriever
+    max_docs: int = RETRIEVER_K
+    token_budget: int = RERANK_TOKEN_BUDGET
+    time_budget_ms: float = RERANK_TIME_BUDGET_MS
+
+    def _rerank(self, query, docs):
+        with span("rerank") as fields:
+            kept, stats = rerank_and_prune(query, docs, self.max_docs, self.token_budget, self.time_budget_ms)
+            fields.update(chunks=stats["kept"], context_tokens=stats["tokens_after"])
+        observe_chunks("rerank", stats["kept"])
+        observe_tokens("context", stats["tokens_after"])
+        saved = stats["tokens_before"] - stats["tokens_after"]
+        print(
+            f"Rerank: kept {stats['kept']}/{stats['candidates']} chunks, context tokens "
+            f"{stats['tokens_before']} -> {stats['tokens_after']} ({-saved:+d}) in {stats['elapsed_ms']}ms"
+            + (" [time budget exceeded, retriever order kept]" if stats["fallback"] else "")
+        )
+        return kept
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, query_vector=None
+    ) -> List[Document]:
+        docs = self.base_retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}, query_vector=query_vector
+        )
+        return self._rerank(query, docs)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun, query_vector=None
+    ) -> List[Document]:
+        docs = await self.base_retriever.ainvoke(
+            query, config={"callbacks": run_manager.get_child()}, query_vector=query_vector
+        )
+        return self._rerank(query, docs)
@@ -0,0 +1,396 @@
+# This handles the ingest sources (GitHub repos, directories, PDFs) and the parallel load/split stage
+
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import NamedTuple
+
+from langchain_core.documents import Document
+
+from core.config import (
+    GIT_MAX_FILE_BYTES, GIT_MIRROR_ROOT, INGEST_LOAD_WORKERS, INGEST_PARSE_WORKERS, INGEST_QUEUE_SIZE,
+)
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+GITHUB_EXTENSIONS = (".md", ".py", ".js", ".ts", ".html", ".ipynb")
+TEXT_EXTENSIONS = (".md", ".txt")
+
+# Skip-lists applied to git paths before any file is read
+VENDORED_DIRS = frozenset({
+    "node_modules", "vendor", "vendors", "third_party", "site-packages", ".venv", "venv",
+    "dist", "build", "__pycache__", ".ipynb_checkpoints",
+})
+MINIFIED_SUFFIXES = (".min.js", ".min.css", ".bundle.js", ".chunk.js", "-min.js")
+# Bump when the filters or the way git files are read change, so the next run re-reads everything
+GIT_FILTER_VERSION = 1
+# Code files whose average line is longer than this are treated as minified/generated
+MINIFIED_LINE_LENGTH = 300
+CODE_TYPES = (".js", ".ts", ".css", ".html")
+
+
+class LoadUnit(NamedTuple):
+    """One file to load and split in a worker process. Must stay picklable."""
+    kind: str  # "text", "notebook", "pdf", or "keep" (carry the previous chunks over unread)
+    path: str
+    source: str  # the "source" label stored on every chunk (part of the chunk ID)
+    metadata: dict
+    data: bytes = None  # file contents when they do not come from `path` (git blobs)
+
+
+class SourceContext:
+    """What the live index already holds: per-source state and the labels whose chunks can be carried over."""
+
+    def __init__(self, previous_state: dict = None, known_sources=()):
+        self.previous_state = previous_state or {}
+        self.known_sources = set(known_sources)
+
+
+# --- Sources ---
+class GitHubSource:
+    """
+    A git repository kept as a shallow bare mirror under GIT_MIRROR_ROOT. Each
+    run fetches only the new tip, diffs it against the last ingested commit and
+    reads just the changed files; unchanged files are carried over from the
+    live index. Files are read straight from the object store, no checkout.
+    """
+
+    def __init__(self, url: str, branch: str = "main", extensions=GITHUB_EXTENSIONS,
+                 max_file_bytes: int = GIT_MAX_FILE_BYTES, mirror_path: str = None):
+        self.url = url
+        self.branch = branch
+        self.extensions = tuple(extensions)
+        self.max_file_bytes = max_file_bytes
+        self.repo_name = url.rstrip("/").split("/")[-1].removesuffix(".git")
+        slug = re.sub(r"[^\w.-]+", "_", url.rstrip("/").split("://")[-1].split("github.com/")[-1])
+        self.mirror_path = mirror_path or os.path.join(GIT_MIRROR_ROOT, slug)
+        self.name = f"GitHub {url}"
+        # One label per file, so a file's chunks can be carried over as a whole
+        self.label_prefix = f"GitHub: {self.repo_name}/"
+        self.state = None
+
+    def filter_key(self) -> str:
+        key = [GIT_FILTER_VERSION, self.extensions, self.max_file_bytes, sorted(VENDORED_DIRS), MINIFIED_SUFFIXES]
+        return hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()[:16]
+
+    def wanted(self, path: str, size: int) -> bool:
+        """Path and size filters; decided from the tree entry, before the blob is read."""
+        if not path.endswith(self.extensions) or path.endswith(MINIFIED_SUFFIXES):
+            return False
+        if any(part in VENDORED_DIRS for part in path.split("/")[:-1]):
+            return False
+        return size <= self.max_file_bytes
+
+    def mirror(self):
+        """Opens the local mirror, fetching only the new tip of the branch, or creates it."""
+        from git import Repo
+
+        if os.path.isdir(self.mirror_path):
+            repo = Repo(self.mirror_path)
+            if repo.remotes and repo.remotes.origin.url == self.url:
+                print(f"Fetching new commits from {self.url}...")
+                repo.git.fetch("--depth", "1", "origin", f"+refs/heads/{self.branch}:refs/heads/{self.branch}")
+                return repo
+            shutil.rmtree(self.mirror_path)
+        print(f"Cloning {self.url} into {self.mirror_path}...")
+        os.makedirs(os.path.dirname(os.path.abspath(self.mirror_path)), exist_ok=True)
+        return Repo.clone_from(self.url, self.mirror_path, bare=True, depth=1, branch=self.branch, single_branch=True)
+
+    def changed_paths(self, repo, previous: dict, head: str):
+        """Paths changed since the last ingested commit, or None when everything must be read."""
+        from git import GitCommandError
+
+        if not previous or previous.get("filters") != self.filter_key():
+            return None
+        if previous.get("commit") == head:
+            return set()
+        try:
+            return set(repo.git.diff("--name-only", "--no-renames", previous["commit"], head).splitlines())
+        except GitCommandError:
+            # The old commit is gone from the shallow mirror (e.g. after gc or a force push)
+            return None
+
+    def discover(self, context: SourceContext = None):
+        context = context or SourceContext()
+        previous = context.previous_state.get(self.name)
+        try:
+            repo = self.mirror()
+            head = repo.commit(self.branch)
+        except Exception as e:
+            if not previous:
+                raise
+            # Keep serving what was ingested last time rather than dropping the repository
+            print(f"Warning: could not update {self.url} ({e}). Keeping its previously ingested files.")
+            for label in sorted(context.known_sources):
+                if label.startswith(self.label_prefix):
+                    yield LoadUnit("keep", label, label, {})
+            self.state = previous
+            return
+
+        changed = self.changed_paths(repo, previous, head.hexsha)
+        read = kept = skipped = 0
+        for item in head.tree.traverse():
+            if item.type != "blob":
+                continue
+            if not self.wanted(item.path, item.size):
+                skipped += 1
+                continue
+            label = f"{self.label_prefix}{item.path}"
+            if changed is not None and item.path not in changed and label in context.known_sources:
+                kept += 1
+                yield LoadUnit("keep", item.path, label, {})
+                continue
+            read += 1
+            yield LoadUnit(
+                "notebook" if item.path.endswith(".ipynb") else "text",
+                item.path,
+                label,
+                {
+                    "file_path": item.path,
+                    "file_name": item.name,
+                    "file_type": os.path.splitext(item.name)[1],
+                    "repository": self.url,
+                },
+                item.data_stream.read(),
+            )
+        self.state = {"commit": head.hexsha, "filters": self.filter_key()}
+        print(f"{self.url} @ {head.hexsha[:8]}: {read} files read, {kept} unchanged, {skipped} filtered out.")
+
+
+class DirectorySource:
+    def __init__(self, path: str, extensions=TEXT_EXTENSIONS, recursive: bool = False):
+        self.path = path
+        self.extensions = tuple(extensions)
+        self.recursive = recursive
+        self.name = f"directory {path}"
+
+    def discover(self, context: SourceContext = None):
+        print(f"Checking for local documents in {self.path}...")
+        if not os.path.isdir(self.path):
+            print(f"Notice: Folder '{self.path}' does not exist. Create it to add local text files.")
+            return
+        if self.recursive:
+            paths = (os.path.join(root, f) for root, _, files in os.walk(self.path) for f in sorted(files))
+        else:
+            paths = (os.path.join(self.path, f) for f in sorted(os.listdir(self.path)))
+        for file_path in paths:
+            if os.path.isfile(file_path) and file_path.endswith(self.extensions):
+                # Top-level files keep the plain file name so existing chunk IDs stay valid
+                label = os.path.relpath(file_path, self.path) if self.recursive else os.path.basename(file_path)
+                print(f"   - Loading: {label}")
+                if file_path.endswith(".pdf"):
+                    yield LoadUnit("pdf", file_path, f"Local File: {label}", {})
+                else:
+                    yield LoadUnit("text", file_path, f"Local File: {label}", {})
+
+
+class PDFSource:
+    def __init__(self, path: str, label: str = None):
+        self.path = path
+        self.label = label or f"PDF: {os.path.basename(path)}"
+        self.name = f"PDF {path}"
+
+    def discover(self, context: SourceContext = None):
+        if not os.path.exists(self.path):
+            print(f"Warning: {self.path} not found. Skipping.")
+            return
+        print(f"Loading {self.label} from {self.path}...")
+        yield LoadUnit("pdf", self.path, self.label, {})
+
+
+SOURCE_TYPES = {"github": GitHubSource, "directory": DirectorySource, "pdf": PDFSource}
+
+
+def sources_from_config(specs):
+    """Builds sources from dicts like {"type": "github", "url": "..."}; other keys become arguments."""
+    sources = []
+    for spec in specs:
+        spec = dict(spec)
+        source_type = spec.pop("type")
+        if source_type not in SOURCE_TYPES:
+            raise ValueError(f"Unknown source type '{source_type}'. Expected one of {sorted(SOURCE_TYPES)}.")
+        sources.append(SOURCE_TYPES[source_type](**spec))
+    return sources
+
+
+def load_sources_file(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return sources_from_config(json.load(f))
+
+
+# --- Worker process side ---
+_splitter = None
+
+
+def notebook_to_text(raw: str) -> str:
+    """Markdown and code cells of a Jupyter notebook; output cells (plots, tables, logs) are dropped."""
+    try:
+        notebook = json.loads(raw)
+    except json.JSONDecodeError:
+        return raw
+    language = notebook.get("metadata", {}).get("kernelspec", {}).get("language", "python")
+    parts = []
+    for cell in notebook.get("cells", []):
+        source = cell.get("source", "")
+        source = "".join(source) if isinstance(source, list) else source
+        if not source.strip():
+            continue
+        if cell.get("cell_type") == "code":
+            parts.append(f"```{language}\n{source}\n```")
+        else:
+            parts.append(source)
+    return "\n\n".join(parts)
+
+
+def looks_minified(text: str) -> bool:
+    lines = text.count("\n") + 1
+    return len(text) > CHUNK_SIZE and len(text) / lines > MINIFIED_LINE_LENGTH
+
+
+def load_and_split(unit: LoadUnit):
+    """Parses one file and splits it into chunks. Runs in a worker process."""
+    global _splitter
+    if _splitter is None:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        _splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+    if unit.kind == "pdf":
+        from langchain_community.document_loaders import PyPDFLoader
+        docs = PyPDFLoader(unit.path).load()
+    else:
+        if unit.data is not None:
+            try:
+                text = unit.data.decode("utf-8")
+            except UnicodeDecodeError:
+                return []  # binary file with a text extension
+        else:
+            with open(unit.path, "r", encoding="utf-8") as f:
+                text = f.read()
+        if unit.kind == "notebook":
+            text = notebook_to_text(text)
+        elif unit.metadata.get("file_type") in CODE_TYPES and looks_minified(text):
+            return []
+        docs = [Document(page_content=text, metadata={})]
+
+    for doc in docs:
+        doc.metadata.update(unit.metadata)
+        doc.metadata["source"] = unit.source
+    return _splitter.split_documents(docs)
+
+
+# --- Pipeline ---
+def iter_chunks(sources, context: SourceContext = None, load_workers: int = INGEST_LOAD_WORKERS,
+                parse_workers: int = INGEST_PARSE_WORKERS, max_pending: int = None):
+    """
+    Yields split chunks while sources are still being discovered:
+    - each source lists its files on a thread (cloning is I/O bound)
+    - files are parsed and split on a process pool (PDF parsing is CPU bound)
+    At most max_pending files are queued or in flight, so memory does not grow
+    with the corpus. Chunks arrive in completion order; chunk IDs do not depend on it.
+    "keep" units are yielded as they are: the caller carries their previous chunks over.
+    """
+    max_pending = max_pending or parse_workers * 4
+    units = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+    done_marker = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                units.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def discover(source):
+        try:
+            for unit in source.discover(context):
+                if stop.is_set():
+                    return
+                put(unit)
+        except Exception as e:
+            print(f"Error loading {source.name}: {e}")
+        finally:
+            put(done_marker)
+
+    threads = ThreadPoolExecutor(max_workers=max(1, min(load_workers, len(sources))), thread_name_prefix="ingest-load")
+    # spawn, not fork: forking after Chroma/HTTP threads exist can deadlock the children
+    processes = ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        for source in sources:
+            threads.submit(discover, source)
+
+        remaining = len(sources)
+        pending = {}
+        while remaining or pending:
+            # Keep the process pool fed; only block on the queue when nothing is in flight
+            while remaining and len(pending) < max_pending:
+                try:
+                    unit = units.get() if not pending else units.get_nowait()
+                except queue.Empty:
+                    break
+                if unit is done_marker:
+                    remaining -= 1
+                    continue
+                if unit.kind == "keep":
+                    yield unit
+                    continue
+                pending[processes.submit(load_and_split, unit)] = unit
+            if not pending:
+                continue
+
+            finished, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            for future in finished:
+                unit = pending.pop(future)
+                try:
+                    yield from future.result()
+                except Exception as e:
+                    print(f"   ! Failed to load {unit.path}: {e}")
+    finally:
+        stop.set()
+        threads.shutdown(wait=True)
+        processes.shutdown(wait=True, cancel_futures=True)
+
+
+async def aiter_chunks(sources, buffer_size: int = INGEST_QUEUE_SIZE, **kwargs):
+    """Async view of iter_chunks(): loading runs on a thread, the event loop keeps embedding."""
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue(maxsize=buffer_size)
+    end = object()
+    cancelled = threading.Event()
+
+    def produce():
+        try:
+            for chunk in iter_chunks(sources, **kwargs):
+                if cancelled.is_set():
+                    break
+                # Blocks this thread (not the loop) while the buffer is full
+                asyncio.run_coroutine_threadsafe(chunks.put(chunk), loop).result()
+        except Exception as e:
+            asyncio.run_coroutine_threadsafe(chunks.put(e), loop).result()
+        finally:
+            if not cancelled.is_set():
+                asyncio.run_coroutine_threadsafe(chunks.put(end), loop).result()
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            chunk = await chunks.get()
+            if chunk is end:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        cancelled.set()
+        # Unblock a producer waiting on a full buffer
+        while not chunks.empty():
+            chunks.get_nowait()
+        await producer
@@ -0,0 +1,124 @@
+# This handles the two-phase startup: bind the port on a light app, then import and start the heavy parts in the background
+
+import asyncio
+import importlib
+import time
+
+# Included in this order; importing them pulls in LangChain, the OpenAI SDK, the vector store and python-docx
+ROUTER_MODULES = ("routers.chat", "routers.documents", "routers.batch")
+# Answered while the routers load; everything else waits for them
+LIGHT_PATHS = ("/", "/metrics")
+
+
+def import_routers():
+    return [importlib.import_module(name).router for name in ROUTER_MODULES]
+
+
+class Startup:
+    """
+    main.py imports only FastAPI and light modules, so uvicorn binds the port
+    and "/" answers (503, "starting") almost at once. The routers and their
+    dependencies are then imported on a thread, and the registry, warm-up and
+    batch workers started, while the event loop keeps serving healthchecks.
+
+    `load` is idempotent and also runs on the first API request when no
+    lifespan ran (ASGI test clients, benchmarks); StartupGate holds API
+    requests until it is done, so none of them sees a 404.
+    """
+
+    def __init__(self):
+        self.phase = "starting"  # starting -> loading -> loaded -> started (or failed)
+        self.error = None
+        self.timings = {}
+        self._created = time.perf_counter()
+        self._load_task = None
+        self._start_task = None
+        self._services = []
+
+    @property
+    def loaded(self) -> bool:
+        return self.phase in ("loaded", "started")
+
+    def load(self, app) -> asyncio.Task:
+        if self._load_task is None:
+            self._load_task = asyncio.create_task(self._load(app))
+        return self._load_task
+
+    async def _load(self, app):
+        self.phase = "loading"
+        start = time.perf_counter()
+        try:
+            routers = await asyncio.to_thread(import_routers)
+        except Exception as e:
+            self.phase = "failed"
+            self.error = str(e)
+            print(f"WARNING: Loading the API routers failed: {e}")
+            raise
+        for router in routers:
+            app.include_router(router)
+        self.phase = "loaded"
+        self.timings["import_routers_s"] = round(time.perf_counter() - start, 3)
+        print(f"INFO: Routers loaded in {self.timings['import_routers_s']:.2f}s")
+
+    def begin(self, app):
+        """From the lifespan: load in the background, then start the shared services."""
+        self._start_task = asyncio.create_task(self._start(app))
+
+    async def _start(self, app):
+        await self.load(app)
+        from services.batch_service import batch_queue
+        from services.registry import registry
+        from services.tokens import load_encoding
+        from services.warmup_service import warmup
+
+        start = time.perf_counter()
+        # Set first so shutdown still closes whatever did start
+        self._services = [batch_queue, warmup, registry]
+        try:
+            # Shared clients and the default index (opening it is blocking I/O), and the
+            # tokenizer, which downloads its BPE file on first use
+            await asyncio.gather(asyncio.to_thread(registry.start), asyncio.to_thread(load_encoding))
+            # Index preload, question embeddings and precomputed answers; "/" reports readiness meanwhile
+            warmup.start()
+            # Workers for queued batch document jobs
+            batch_queue.start()
+        except Exception as e:
+            # "/" answers 503 with this error instead of "warming" forever
+            self.phase = "failed"
+            self.error = str(e)
+            print(f"WARNING: Starting the shared services failed: {e}")
+            return
+        self.timings["start_services_s"] = round(time.perf_counter() - start, 3)
+        self.timings["startup_s"] = round(time.perf_counter() - self._created, 3)
+        self.phase = "started"
+
+    async def aclose(self):
+        for task in (self._start_task, self._load_task):
+            if task is not None and not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        for service in self._services:
+            await service.aclose()
+        self._services = []
+
+    def status(self):
+        return {"phase": self.phase, "timings": self.timings, **({"error": self.error} if self.error else {})}
+
+
+startup = Startup()
+
+
+class StartupGate:
+    """ASGI middleware: API requests wait until the routers are loaded (healthchecks do not)."""
+
+    def __init__(self, app, fastapi_app):
+        self.app = app
+        self.fastapi_app = fastapi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not startup.loaded and scope["path"] not in LIGHT_PATHS:
+            try:
+                await asyncio.shield(startup.load(self.fastapi_app))
+            except Exception:
+                pass  # the failure is reported by "/"; the request falls through to a 404
+        await self.app(scope, receive, send)
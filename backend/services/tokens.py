@@ -0,0 +1,38 @@
+# This handles prompt token counting
+
+import threading
+
+_encoding = None
+_encoding_loaded = False
+_lock = threading.Lock()
+
+
+def _get_encoding():
+    """tiktoken's o200k_base if it can be loaded (it downloads once, then caches); otherwise None."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    print(f"WARNING: tiktoken unavailable ({type(e).__name__}); estimating tokens from length.")
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def load_encoding():
+    """Loads the encoding ahead of the first request (services/startup.py runs it on a thread)."""
+    return _get_encoding()
+
+
+def count_tokens(text: str) -> int:
+    if not _encoding_loaded and _lock.locked():
+        # Still loading (possibly downloading) on another thread: estimate rather than block
+        return len(text) // 4 + 1
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,497 @@
+# This handles the vector store backends: Chroma, and a compact NumPy store with memory-mapped quantized vectors
+
+import json
+import mmap
+import os
+import shutil
+import threading
+import uuid
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from core.config import NUMPY_STORE_BLOCK_ROWS, NUMPY_STORE_DTYPE, VECTOR_STORE
+from services.embedding_pipeline import chroma_writer
+
+HEADER_FILE = "numpy_store.json"  # written last by persist(); also marks the directory as a NumPy store
+PENDING_DIR = "numpy_pending"
+CHROMA_FILE = "chroma.sqlite3"
+STORE_FORMAT = 1
+DTYPES = {"float16": np.float16, "int8": np.int8}
+# Metadata keys with more distinct values than this share of rows (hashes, IDs) are stored as strings
+DICTIONARY_MAX_RATIO = 0.5
+
+
+# --- Backend selection ---
+def detect_backend(persist_directory: str) -> Optional[str]:
+    if os.path.exists(os.path.join(persist_directory, HEADER_FILE)) or os.path.isdir(
+        os.path.join(persist_directory, PENDING_DIR)
+    ):
+        return "numpy"
+    if os.path.exists(os.path.join(persist_directory, CHROMA_FILE)):
+        return "chroma"
+    return None
+
+
+def open_vectorstore(persist_directory: str, embeddings, backend: str = None):
+    """
+    The store in persist_directory, opened with the backend it was built with.
+    An empty or new directory gets `backend` (default: VECTOR_STORE).
+    """
+    backend = detect_backend(persist_directory) or backend or VECTOR_STORE
+    if backend == "numpy":
+        return NumpyVectorStore(persist_directory, embeddings)
+    if backend == "chroma":
+        # Imported on first use: chromadb is slow to import and NumPy-only deployments never need it
+        from langchain_chroma import Chroma
+
+        return Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+    raise ValueError(f"Unknown vector store backend '{backend}' (expected 'chroma' or 'numpy').")
+
+
+def backend_name(vectorstore) -> str:
+    return "numpy" if isinstance(vectorstore, NumpyVectorStore) else "chroma"
+
+
+def vector_writer(vectorstore):
+    """write_batch(ids, vectors, documents) for precomputed vectors, as the embedding pipeline calls it."""
+    if isinstance(vectorstore, NumpyVectorStore):
+        return vectorstore.upsert_vectors
+    return chroma_writer(vectorstore)
+
+
+def persist_vectorstore(vectorstore):
+    """Puts writes into their final on-disk layout (Chroma already has)."""
+    if isinstance(vectorstore, NumpyVectorStore):
+        vectorstore.persist()
+
+
+def close_vectorstore(vectorstore):
+    try:
+        if isinstance(vectorstore, NumpyVectorStore):
+            vectorstore.close()
+            return
+        # Releases Chroma's shared system for the directory once no other handle uses it
+        client = getattr(vectorstore, "_client", None)
+        if client is not None and hasattr(client, "close"):
+            client.close()
+    except Exception as e:
+        print(f"WARNING: Could not close vector store: {e}")
+
+
+def vector_bytes(vectorstore) -> int:
+    """Bytes held per stored vector (Chroma keeps float32, read from one record of the collection)."""
+    if isinstance(vectorstore, NumpyVectorStore):
+        return vectorstore.bytes_per_vector
+    try:
+        embeddings = vectorstore._collection.get(limit=1, include=["embeddings"])["embeddings"]
+        return len(embeddings[0]) * 4 if len(embeddings) else 0
+    except Exception:
+        return 0
+
+
+# --- NumPy store ---
+def quantize(vectors: np.ndarray, dtype: str):
+    """L2-normalizes float32 rows and stores them as float16, or int8 with a per-row scale."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors = vectors / norms
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    return np.rint(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def _save_array(path: str, array: np.ndarray):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _load_array(path: str, rows: int) -> np.ndarray:
+    # np.memmap cannot map a zero-length array
+    return np.load(path, mmap_mode="r") if rows else np.load(path)
+
+
+class StringColumn:
+    """Variable-length UTF-8 strings in one file plus an offsets array; a lookup reads only that string."""
+
+    def __init__(self, directory: str, name: str, rows: int):
+        self._offsets = _load_array(os.path.join(directory, f"{name}_offsets.npy"), rows)
+        self._file = open(os.path.join(directory, f"{name}.bin"), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __getitem__(self, row: int) -> str:
+        return self._data[int(self._offsets[row]):int(self._offsets[row + 1])].decode("utf-8")
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    @staticmethod
+    def write(directory: str, name: str, strings: List[str]):
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        path = os.path.join(directory, f"{name}.bin")
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(b"".join(encoded))
+        os.replace(f"{path}.tmp", path)
+        _save_array(os.path.join(directory, f"{name}_offsets.npy"), offsets)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Exact-search vector store sized for a profile corpus:
+    - vectors are L2-normalized and stored quantized (float16, or int8 with a
+      per-row scale) in vectors.npy, which is memory-mapped rather than loaded
+    - search is cosine similarity: a matrix product over blocks of rows upcast
+      to float32, then argpartition for the top k
+    - chunk texts and IDs are string columns, so only the top-k hits are read
+    - metadata is columnar: low-cardinality keys (source, type, page) are
+      dictionary-encoded into an int32 codes matrix, the rest are string columns
+
+    Writes go to one small file per batch under numpy_pending/, so an
+    interrupted ingest resumes where it stopped; persist() compacts them (and
+    applies deletes) into the main files. Opening a store reads the header only.
+    """
+
+    def __init__(self, persist_directory: str = None, embedding=None, dtype: str = NUMPY_STORE_DTYPE):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported NumPy store dtype '{dtype}' (expected one of {sorted(DTYPES)}).")
+        self.persist_directory = persist_directory
+        self._embedding = embedding
+        self.dtype = dtype
+        self.dim = None
+        self._lock = threading.RLock()
+        self._rows = 0
+        self._vectors = None
+        self._scales = None
+        self._ids = None
+        self._texts = None
+        self._metadata_columns = []
+        self._codes = None
+        self._deleted = None  # bool mask over persisted rows, created by the first delete
+        self._pending = []  # (ids, texts, metadatas, vectors, scales) batches not yet persisted
+        self._pending_deleted = set()  # (batch, row) pairs
+        self._pending_matrix = None  # concatenated pending vectors/scales, rebuilt after writes
+        self._id_rows = None  # id -> ("persisted", row) | ("pending", (batch, row)), built for writes
+        self._next_batch = 0
+        if persist_directory:
+            self._load()
+
+    # --- VectorStore interface ---
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def __len__(self):
+        persisted = self._rows - (int(self._deleted.sum()) if self._deleted is not None else 0)
+        return persisted + sum(len(batch[0]) for batch in self._pending) - len(self._pending_deleted)
+
+    @property
+    def bytes_per_vector(self) -> int:
+        if not self.dim:
+            return 0
+        return self.dim * np.dtype(DTYPES[self.dtype]).itemsize + (4 if self.dtype == "int8" else 0)
+
+    def add_texts(self, texts, metadatas=None, *, ids=None, **kwargs) -> List[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        documents = [Document(page_content=t, metadata=m or {}) for t, m in zip(texts, metadatas)]
+        self.upsert_vectors(ids, vectors, documents)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs) -> Optional[bool]:
+        if not ids:
+            return None
+        with self._lock:
+            rows = self._id_index()
+            for doc_id in ids:
+                self._forget(rows.pop(doc_id, None))
+            self._pending_matrix = None
+        return True
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k=k)
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k=k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k)]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4):
+        """[(Document, cosine similarity)] for the top-k rows, best first."""
+        scores = self.scores(embedding)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self._document(int(row)), float(scores[row])) for row in top if scores[row] > -np.inf]
+
+    def _select_relevance_score_fn(self):
+        return lambda similarity: (similarity + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, *, ids=None, persist_directory=None, **kwargs):
+        store = cls(persist_directory, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        if persist_directory:
+            store.persist()
+        return store
+
+    # --- Search ---
+    def scores(self, embedding) -> np.ndarray:
+        """Cosine similarity of the query to every row (persisted rows first); -inf for deleted rows."""
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        pending_vectors, pending_scales, pending_alive = self._pending_arrays()
+        scores = np.empty(self._rows + len(pending_vectors), dtype=np.float32)
+        block = max(1, NUMPY_STORE_BLOCK_ROWS)
+        for start in range(0, self._rows, block):
+            end = min(start + block, self._rows)
+            scores[start:end] = self._vectors[start:end].astype(np.float32) @ query
+        if self._scales is not None and self._rows:
+            scores[:self._rows] *= self._scales
+        if self._deleted is not None:
+            scores[:self._rows][self._deleted] = -np.inf
+        if len(pending_vectors):
+            pending = scores[self._rows:]
+            pending[:] = pending_vectors.astype(np.float32) @ query
+            if pending_scales is not None:
+                pending *= pending_scales
+            pending[~pending_alive] = -np.inf
+        return scores
+
+    def _document(self, row: int) -> Document:
+        if row < self._rows:
+            return Document(id=self._ids[row], page_content=self._texts[row], metadata=self._metadata(row))
+        row -= self._rows
+        for ids, texts, metadatas, _, _ in self._pending:
+            if row < len(ids):
+                return Document(id=ids[row], page_content=texts[row], metadata=dict(metadatas[row]))
+            row -= len(ids)
+        raise IndexError(row)
+
+    def _metadata(self, row: int) -> dict:
+        metadata = {}
+        for column in self._metadata_columns:
+            if column["kind"] == "codes":
+                code = int(self._codes[row, column["column"]])
+                if code >= 0:
+                    metadata[column["key"]] = column["values"][code]
+            else:
+                value = column["strings"][row]
+                if value:
+                    metadata[column["key"]] = json.loads(value)
+        return metadata
+
+    def _pending_arrays(self):
+        matrix = self._pending_matrix
+        if matrix is None:
+            with self._lock:
+                if not self._pending:
+                    matrix = (np.empty((0, self.dim or 0), dtype=DTYPES[self.dtype]), None, np.empty(0, dtype=bool))
+                else:
+                    vectors = np.concatenate([batch[3] for batch in self._pending])
+                    scales = np.concatenate([batch[4] for batch in self._pending]) if self.dtype == "int8" else None
+                    alive = np.ones(len(vectors), dtype=bool)
+                    offset = 0
+                    for number, batch in enumerate(self._pending):
+                        for b, row in self._pending_deleted:
+                            if b == number:
+                                alive[offset + row] = False
+                        offset += len(batch[0])
+                    matrix = (vectors, scales, alive)
+                self._pending_matrix = matrix
+        return matrix
+
+    # --- Writes ---
+    def upsert_vectors(self, ids, vectors, documents):
+        """Adds or replaces rows from precomputed vectors; the batch is on disk before this returns."""
+        if not ids:
+            return
+        array = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = array.shape[1]
+            elif array.shape[1] != self.dim:
+                raise ValueError(f"Vector width {array.shape[1]} does not match the store's {self.dim}.")
+            quantized, scales = quantize(array, self.dtype)
+            batch = (list(ids), [d.page_content for d in documents], [d.metadata or {} for d in documents],
+                     quantized, scales)
+            if self.persist_directory:
+                self._write_pending(batch)
+            self._append(batch)
+
+    def _append(self, batch):
+        rows = self._id_index()
+        number = len(self._pending)
+        self._pending.append(batch)
+        for row, doc_id in enumerate(batch[0]):
+            self._forget(rows.get(doc_id))  # upsert: the newest row for an ID wins
+            rows[doc_id] = ("pending", (number, row))
+        self._pending_matrix = None
+
+    def _forget(self, location):
+        if location is None:
+            return
+        kind, row = location
+        if kind == "pending":
+            self._pending_deleted.add(row)
+            return
+        if self._deleted is None:
+            self._deleted = np.zeros(self._rows, dtype=bool)
+        self._deleted[row] = True
+
+    def _id_index(self):
+        if self._id_rows is None:
+            self._id_rows = {self._ids[row]: ("persisted", row) for row in range(self._rows)}
+            for number, batch in enumerate(self._pending):
+                for row, doc_id in enumerate(batch[0]):
+                    self._id_rows[doc_id] = ("pending", (number, row))
+        return self._id_rows
+
+    def _write_pending(self, batch):
+        ids, texts, metadatas, quantized, scales = batch
+        directory = os.path.join(self.persist_directory, PENDING_DIR)
+        os.makedirs(directory, exist_ok=True)
+        records = json.dumps({"ids": ids, "texts": texts, "metadatas": metadatas}).encode("utf-8")
+        path = os.path.join(directory, f"batch-{self._next_batch:08d}.npz")
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(f, vectors=quantized, scales=scales if scales is not None else np.empty(0, dtype=np.float32),
+                     records=np.frombuffer(records, dtype=np.uint8))
+        os.replace(f"{path}.tmp", path)
+        self._next_batch += 1
+
+    def persist(self):
+        """Compacts persisted rows that are still live plus pending batches into the main files."""
+        if not self.persist_directory:
+            raise ValueError("This NumPy store has no persist_directory.")
+        with self._lock:
+            ids, texts, metadatas, vector_parts, scale_parts = [], [], [], [], []
+            alive = np.ones(self._rows, dtype=bool) if self._deleted is None else ~self._deleted
+            keep = np.flatnonzero(alive)
+            if len(keep):
+                vector_parts.append(np.asarray(self._vectors[keep]))
+                if self._scales is not None:
+                    scale_parts.append(np.asarray(self._scales[keep]))
+            for row in keep:
+                ids.append(self._ids[row])
+                texts.append(self._texts[row])
+                metadatas.append(self._metadata(row))
+            for number, (batch_ids, batch_texts, batch_metadatas, quantized, scales) in enumerate(self._pending):
+                live = [row for row in range(len(batch_ids)) if (number, row) not in self._pending_deleted]
+                ids += [batch_ids[row] for row in live]
+                texts += [batch_texts[row] for row in live]
+                metadatas += [batch_metadatas[row] for row in live]
+                vector_parts.append(quantized[live])
+                if scales is not None:
+                    scale_parts.append(scales[live])
+
+            dtype = DTYPES[self.dtype]
+            vectors = np.concatenate(vector_parts) if vector_parts else np.empty((0, self.dim or 0), dtype=dtype)
+            self._write(ids, texts, metadatas, vectors.astype(dtype, copy=False),
+                        np.concatenate(scale_parts) if scale_parts else np.empty(0, dtype=np.float32))
+            self.close()
+            shutil.rmtree(os.path.join(self.persist_directory, PENDING_DIR), ignore_errors=True)
+            self._load()
+
+    def _write(self, ids, texts, metadatas, vectors, scales):
+        directory = self.persist_directory
+        os.makedirs(directory, exist_ok=True)
+        _save_array(os.path.join(directory, "vectors.npy"), vectors)
+        if self.dtype == "int8":
+            _save_array(os.path.join(directory, "scales.npy"), scales.astype(np.float32))
+        StringColumn.write(directory, "ids", ids)
+        StringColumn.write(directory, "texts", texts)
+
+        rows = len(ids)
+        keys = sorted({key for metadata in metadatas for key in metadata})
+        columns, code_columns = [], []
+        for key in keys:
+            encoded = [json.dumps(m[key]) if key in m else None for m in metadatas]
+            distinct = sorted({value for value in encoded if value is not None})
+            if len(distinct) <= max(16, rows * DICTIONARY_MAX_RATIO):
+                lookup = {value: code for code, value in enumerate(distinct)}
+                code_columns.append([lookup[value] if value is not None else -1 for value in encoded])
+                columns.append({"key": key, "kind": "codes", "column": len(code_columns) - 1,
+                                "values": [json.loads(value) for value in distinct]})
+            else:
+                name = f"meta_{len(columns)}"
+                StringColumn.write(directory, name, [value or "" for value in encoded])
+                columns.append({"key": key, "kind": "strings", "name": name})
+        codes = np.array(code_columns, dtype=np.int32).T if code_columns else np.empty((rows, 0), dtype=np.int32)
+        _save_array(os.path.join(directory, "metadata_codes.npy"), np.ascontiguousarray(codes.reshape(rows, -1)))
+
+        header = {"format": STORE_FORMAT, "dtype": self.dtype, "dim": self.dim, "rows": rows, "metadata": columns}
+        path = os.path.join(directory, HEADER_FILE)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(header, f)
+        os.replace(f"{path}.tmp", path)
+
+    # --- Loading ---
+    def _load(self):
+        directory = self.persist_directory
+        self._rows, self._vectors, self._scales, self._codes = 0, None, None, None
+        self._ids = self._texts = None
+        self._metadata_columns = []
+        self._deleted = None
+        self._pending, self._pending_deleted, self._pending_matrix, self._id_rows = [], set(), None, None
+        self._next_batch = 0
+
+        header_path = os.path.join(directory, HEADER_FILE)
+        if os.path.exists(header_path):
+            with open(header_path, "r", encoding="utf-8") as f:
+                header = json.load(f)
+            if header.get("format") != STORE_FORMAT:
+                raise ValueError(f"Unsupported NumPy store format in {directory}.")
+            # The stored dtype wins over the configured one, so a config change never misreads an index
+            self.dtype, self.dim, self._rows = header["dtype"], header["dim"], header["rows"]
+            self._vectors = _load_array(os.path.join(directory, "vectors.npy"), self._rows)
+            if self.dtype == "int8":
+                self._scales = _load_array(os.path.join(directory, "scales.npy"), self._rows)
+            self._ids = StringColumn(directory, "ids", self._rows)
+            self._texts = StringColumn(directory, "texts", self._rows)
+            self._codes = _load_array(os.path.join(directory, "metadata_codes.npy"), self._rows)
+            for column in header["metadata"]:
+                if column["kind"] == "strings":
+                    column["strings"] = StringColumn(directory, column["name"], self._rows)
+                self._metadata_columns.append(column)
+
+        pending_directory = os.path.join(directory, PENDING_DIR)
+        if os.path.isdir(pending_directory):
+            for name in sorted(os.listdir(pending_directory)):
+                if not name.endswith(".npz"):
+                    continue  # a batch interrupted mid-write was never acknowledged
+                with np.load(os.path.join(pending_directory, name)) as data:
+                    records = json.loads(data["records"].tobytes().decode("utf-8"))
+                    vectors = data["vectors"]
+                    scales = data["scales"] if vectors.dtype == np.int8 else None
+                if self.dim is None:
+                    # Nothing persisted yet: the batches' own width and dtype describe the store
+                    self.dim, self.dtype = vectors.shape[1], np.dtype(vectors.dtype).name
+                self._append((records["ids"], records["texts"], records["metadatas"], vectors, scales))
+                self._next_batch = int(name[len("batch-"):-len(".npz")]) + 1
+
+    def close(self):
+        """Releases the memory maps and file handles."""
+        with self._lock:
+            for column in [self._ids, self._texts] + [c.get("strings") for c in self._metadata_columns]:
+                if column is not None:
+                    column.close()
+            self._ids = self._texts = None
+            self._vectors = self._scales = self._codes = None
+            self._metadata_columns = []
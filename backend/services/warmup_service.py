@@ -0,0 +1,198 @@
+# This handles warm-up: opening indexes, pre-embedding the suggested questions, and precomputed answers
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+
+from langchain_core.output_parsers import StrOutputParser
+
+from core.config import (
+    DEFAULT_CHAT_MODEL,
+    DEFAULT_TENANT,
+    REGISTRY_REFRESH_SECONDS,
+    WARMUP_ENABLED,
+    WARMUP_PRECOMPUTE_ANSWERS,
+    WARMUP_QUESTIONS_FILE,
+    WARMUP_TENANTS,
+)
+from core.prompts import PROFILE_QUERIES, suggested_questions_for
+from core.tenants import get_persona
+from services.admission import background
+from services.cache_service import normalize_question, response_cache
+from services.llm_service import LLMService
+from services.metrics import span
+from services.registry import registry
+
+WARMUP_FILE = "warmup.json"  # precomputed answers, stored in the generation they were built from
+
+
+def suggested_questions(tenant: str = DEFAULT_TENANT):
+    templates = None
+    if os.path.exists(WARMUP_QUESTIONS_FILE):
+        with open(WARMUP_QUESTIONS_FILE, "r", encoding="utf-8") as f:
+            templates = json.load(f)
+    return suggested_questions_for(get_persona(tenant), templates)
+
+
+def warmup_texts(tenant: str = DEFAULT_TENANT):
+    """Every fixed text a request may embed: the suggested questions and the profile queries."""
+    return suggested_questions(tenant) + list(PROFILE_QUERIES.values())
+
+
+def sources_of(docs):
+    return [{"source": doc.metadata.get("source", "Unknown"), "preview": doc.page_content[:200]} for doc in docs]
+
+
+async def precompute_answers(questions, retriever, tenant: str = DEFAULT_TENANT, model: str = DEFAULT_CHAT_MODEL):
+    """Answers each question the way /chat would for a first message; [{question, model, answer, sources}]."""
+    chain = LLMService.get_prompt_template(tenant) | LLMService.get_llm(model) | StrOutputParser()
+    today_str = datetime.now().strftime("%B %d, %Y")
+
+    async def answer(question):
+        docs = await retriever.ainvoke(question)
+        text = await chain.ainvoke({
+            "context": LLMService.format_docs(docs),
+            "chat_history": [],
+            "current_date": today_str,
+            "question": question,
+        })
+        return {"question": question, "model": model, "answer": text, "sources": sources_of(docs)}
+
+    return list(await asyncio.gather(*(answer(q) for q in questions)))
+
+
+def write_warmup_file(directory: str, entries):
+    path = os.path.join(directory, WARMUP_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"created_at": time.time(), "answers": entries}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def read_warmup_file(directory: str):
+    try:
+        with open(os.path.join(directory, WARMUP_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)["answers"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return []
+
+
+class WarmupService:
+    """
+    Takes the cold paths off the first requests after a deploy or re-ingest:
+    - opens each warm tenant's vector store and BM25 index
+    - embeds the suggested questions and profile queries (served from the
+      persistent embedding cache when ingest.py already embedded them)
+    - runs retrieval for each of them, and precomputes the profile contexts
+    - serves the generation's precomputed answers (warmup.json) from the
+      response cache, pinned until the generation changes
+
+    Runs in the background from startup; `ready` turns true once the first
+    pass is over (also when it failed, so a broken warm-up never blocks
+    traffic). A watcher re-warms a tenant when a new generation is published.
+    """
+
+    def __init__(self, tenants=None):
+        self.tenants = tenants or WARMUP_TENANTS
+        self.state = "pending" if WARMUP_ENABLED else "disabled"
+        self.started_at = None
+        self.seconds = None
+        self.results = {}  # tenant -> summary of its last warm-up
+        self._answers = {}  # (tenant, normalized question) -> (generation, precomputed entry)
+        self._tasks = []
+
+    @property
+    def ready(self) -> bool:
+        return self.state in ("ready", "failed", "disabled")
+
+    # --- Lifecycle ---
+    def start(self):
+        if not WARMUP_ENABLED or self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._startup()), asyncio.create_task(self._watch())]
+
+    async def aclose(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _startup(self):
+        self.state = "warming"
+        self.started_at = time.time()
+        start = time.perf_counter()
+        failed = False
+        for tenant in self.tenants:
+            failed |= not await self.warm(tenant)
+        self.seconds = round(time.perf_counter() - start, 3)
+        self.state = "failed" if failed else "ready"
+        print(f"INFO: Warm-up {self.state} in {self.seconds:.2f}s ({', '.join(self.tenants)})")
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(REGISTRY_REFRESH_SECONDS)
+            for tenant, result in list(self.results.items()):
+                try:
+                    # Also triggers the registry's hot-swap check
+                    await registry.aget_vectorstore(tenant)
+                except Exception:
+                    continue
+                if registry.get_generation(tenant) != result.get("generation"):
+                    await self.warm(tenant)
+
+    # --- Warm-up ---
+    async def warm(self, tenant: str = DEFAULT_TENANT) -> bool:
+        start = time.perf_counter()
+        result = {"generation": None}
+        try:
+            with span("warmup") as fields:
+                await registry.aget_vectorstore(tenant)
+                state = registry.get_state(tenant)
+                generation = state["generation"]
+                result["generation"] = generation
+
+                questions = suggested_questions(tenant)
+                embeddings = registry.get_embeddings()
+                vectors = await asyncio.gather(*(embeddings.aembed_query(q) for q in questions))
+                await asyncio.gather(*(embeddings.aembed_query(q) for q in PROFILE_QUERIES.values()))
+
+                retriever = await LLMService.get_retriever(tenant=tenant)
+                await asyncio.gather(*(retriever.ainvoke(q, query_vector=v) for q, v in zip(questions, vectors)))
+                await LLMService.warm_profile_contexts(tenant)
+
+                entries = read_warmup_file(state["persist_directory"])
+                if not entries and WARMUP_PRECOMPUTE_ANSWERS:
+                    with background():
+                        entries = await precompute_answers(questions, retriever, tenant)
+                vector_of = dict(zip(questions, vectors))
+                for entry in entries:
+                    response_cache.put(
+                        entry["question"], entry["model"], generation, entry["answer"],
+                        vector=vector_of.get(entry["question"]), tenant=tenant, pinned=True,
+                        sources=entry["sources"],
+                    )
+                    self._answers[(tenant, normalize_question(entry["question"]))] = (generation, entry)
+                fields.update(tenant=tenant, questions=len(questions), answers=len(entries))
+            result.update(questions=len(questions), answers=len(entries))
+            ok = True
+        except Exception as e:
+            print(f"WARNING: Warm-up of tenant '{tenant}' failed: {e}")
+            result["error"] = str(e)
+            ok = False
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        self.results[tenant] = result
+        return ok
+
+    def precomputed(self, question: str, model: str, tenant: str = DEFAULT_TENANT):
+        """The precomputed {answer, sources} for a suggested question on the live generation, or None."""
+        found = self._answers.get((tenant, normalize_question(question)))
+        if found is None or found[0] != registry.get_generation(tenant) or found[1]["model"] != model:
+            return None
+        return found[1]
+
+    def status(self):
+        return {"state": self.state, "ready": self.ready, "seconds": self.seconds, "tenants": self.results}
+
+
+warmup = WarmupService()
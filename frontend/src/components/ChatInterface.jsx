@@ -12,6 +12,7 @@ const ChatInterface = ({ onBack, isDarkMode, toggleTheme }) => {
   ]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [suggestions, setSuggestions] = useState([]);
   const bottomRef = useRef(null);
 
   // Tools & UI State
@@ -21,15 +22,24 @@ const ChatInterface = ({ onBack, isDarkMode, toggleTheme }) => {
   const [generatingType, setGeneratingType] = useState(null); 
   const [errorMsg, setErrorMsg] = useState('');
 
+  // Starter questions (answered ahead of time by the backend's warm-up)
+  useEffect(() => {
+    fetch(`${API_BASE_URL}/suggested-questions`)
+      .then((res) => (res.ok ? res.json() : { questions: [] }))
+      .then((data) => setSuggestions(data.questions || []))
+      .catch(() => setSuggestions([]));
+  }, []);
+
   // Auto-scroll
   useEffect(() => {
     bottomRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, [messages]);
 
   // --- HANDLERS ---
-  const handleSend = async () => {
-    if (!input.trim()) return;
-    const newHistory = [...messages, { role: "user", content: input }];
+  const handleSend = async (text = input) => {
+    const question = text.trim();
+    if (!question) return;
+    const newHistory = [...messages, { role: "user", content: question }];
     setMessages(newHistory);
     setInput("");
     setIsLoading(true);
@@ -38,7 +48,7 @@ const ChatInterface = ({ onBack, isDarkMode, toggleTheme }) => {
       const response = await fetch(`${API_BASE_URL}/chat`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ question: input, history: newHistory }),
+        body: JSON.stringify({ question, history: newHistory }),
       });
 
       if (!response.ok) throw new Error("Failed to fetch");
@@ -201,6 +211,21 @@ const renderMessage = (text) => {
               )}
             </div>
           ))}
+          {messages.length === 1 && suggestions.length > 0 && (
+            <div className="ml-11 flex flex-wrap gap-2">
+              {suggestions.map((question) => (
+                <button
+                  key={question}
+                  onClick={() => handleSend(question)}
+                  disabled={isLoading}
+                  className={`text-xs md:text-sm px-3 py-2 rounded-full border transition-colors disabled:opacity-50
+                    ${isDarkMode ? 'border-gray-700 text-gray-300 hover:bg-gray-800' : 'border-gray-200 text-gray-700 hover:bg-green-50'}`}
+                >
+                  {question}
+                </button>
+              ))}
+            </div>
+          )}
           {isLoading && <div className="ml-12 text-gray-400 text-sm animate-pulse">Consulting knowledge base...</div>}
           <div ref={bottomRef} />
         </div>
@@ -218,7 +243,7 @@ const renderMessage = (text) => {
                 ${isDarkMode ? 'bg-gray-800 text-white placeholder-gray-500' : 'bg-gray-50 text-gray-900 placeholder-gray-400'}`}
             />
             <button
-              onClick={handleSend}
+              onClick={() => handleSend()}
               disabled={!input.trim() || isLoading}
               className="bg-green-600 hover:bg-green-500 disabled:opacity-50 text-white p-3 rounded-xl transition-colors shadow-lg shadow-green-600/20"
             >